@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.db.models import Count
 from .models import UserProfile
 
 
@@ -16,18 +17,29 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'date_joined', 'get_detection_count')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'date_joined')
     
+    def get_queryset(self, request):
+        # Count detections in the list query instead of once per row
+        return super().get_queryset(request).annotate(detections_total=Count('detections'))
+    
     def get_detection_count(self, obj):
-        return obj.profile.detection_count if hasattr(obj, 'profile') else 0
+        return getattr(obj, 'detections_total', 0)
     get_detection_count.short_description = 'Detections'
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'location', 'detection_count', 'preferred_confidence_threshold', 'created_at')
+    list_display = ('user', 'location', 'get_detection_count', 'preferred_confidence_threshold', 'created_at')
     list_filter = ('email_notifications', 'created_at')
     search_fields = ('user__username', 'user__email', 'location')
     readonly_fields = ('created_at', 'updated_at', 'detection_count')
-
+    list_select_related = ('user',)
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(detections_total=Count('user__detections'))
+    
+    def get_detection_count(self, obj):
+        return getattr(obj, 'detections_total', 0)
+    get_detection_count.short_description = 'Detection count'
 
 # Re-register UserAdmin
 admin.site.unregister(User)
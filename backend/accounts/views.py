@@ -177,24 +177,15 @@ def user_stats(request):
     Get user statistics
     """
     user = request.user
-    from detector.models import Detection
+    from detector.rollups import summarize
     
-    detections = Detection.objects.filter(user=user)
-    total_detections = detections.count()
-    
-    if total_detections > 0:
-        avg_confidence = sum(d.confidence_avg for d in detections) / total_detections
-        avg_processing_time = sum(d.processing_time for d in detections) / total_detections
-        total_signs_detected = sum(d.detections_count for d in detections)
-    else:
-        avg_confidence = 0
-        avg_processing_time = 0
-        total_signs_detected = 0
+    # Read from the incrementally maintained rollups instead of scanning detections
+    stats = summarize(user)
     
     return Response({
-        'total_sessions': total_detections,
-        'total_signs_detected': total_signs_detected,
-        'avg_confidence': round(avg_confidence, 3),
-        'avg_processing_time': round(avg_processing_time, 3),
+        'total_sessions': stats['total_detections'],
+        'total_signs_detected': stats['total_signs_detected'],
+        'avg_confidence': stats['avg_confidence'],
+        'avg_processing_time': stats['avg_processing_time'],
         'member_since': user.date_joined,
     }) 
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Latency-driven input resolution for live streams.
+
+Each WebSocket session can ask for a p95 latency target. The controller
+watches the end-to-end latency of the session's recent frames and steps the
+inference input size down a ladder (640 -> 512 -> 416 -> 320 by default)
+while the p95 is over target. Once the smallest size is reached, a session in
+streaming mode trades keyframe rate instead. It steps back up only when the
+p95, scaled by the extra pixels of the next size, would still fit the target.
+"""
+from collections import deque
+
+
+# Sizes must be multiples of the model stride
+MODEL_STRIDE = 32
+
+
+def size_ladder(sizes, max_size):
+    """
+    Normalize configured sizes to stride multiples no larger than the model's
+    input size, largest first
+    """
+    ladder = {max(MODEL_STRIDE, min(int(size), max_size) // MODEL_STRIDE * MODEL_STRIDE) for size in sizes}
+    ladder.add(max_size)
+    return sorted(ladder, reverse=True)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class AdaptiveResolution:
+    """
+    Keeps one stream's p95 latency (in seconds) under `target`.
+
+    Decisions are made on the last `window` frames, once at least
+    `min_samples` frames have been observed at the current operating point.
+    """
+
+    def __init__(self, target, sizes, max_size, window=30, min_samples=10, tracker=None,
+                 max_keyframe_interval=30, upgrade_margin=0.8):
+        self.target = target
+        self.sizes = size_ladder(sizes, max_size)
+        self.level = 0
+        self.window = window
+        self.min_samples = min(min_samples, window)
+        self.tracker = tracker
+        self.base_keyframe_interval = tracker.keyframe_interval if tracker is not None else None
+        self.max_keyframe_interval = max_keyframe_interval
+        self.upgrade_margin = upgrade_margin
+        self.latencies = deque(maxlen=window)
+        self.last_p95 = 0.0
+        self.adjustments = 0
+
+    @property
+    def imgsz(self):
+        return self.sizes[self.level]
+
+    def p95(self):
+        return percentile(self.latencies, 0.95)
+
+    def observe(self, latency):
+        """
+        Record one frame's latency and adjust the operating point if needed
+        """
+        self.latencies.append(latency)
+        if len(self.latencies) < self.min_samples:
+            return
+        p95 = self.last_p95 = self.p95()
+        if p95 > self.target:
+            self._step_down()
+        elif p95 * self._upgrade_cost() < self.target * self.upgrade_margin:
+            self._step_up()
+
+    def _upgrade_cost(self):
+        """
+        Expected latency factor of the next step up
+        """
+        if self.tracker is not None and self.tracker.keyframe_interval > self.base_keyframe_interval:
+            # More keyframes mean more frames pay full inference
+            return 2.0
+        if self.level == 0:
+            return float('inf')
+        return (self.sizes[self.level - 1] / self.imgsz) ** 2
+
+    def _step_down(self):
+        if self.level < len(self.sizes) - 1:
+            self.level += 1
+        elif self.tracker is not None and self.tracker.keyframe_interval < self.max_keyframe_interval:
+            self.tracker.keyframe_interval = min(self.tracker.keyframe_interval * 2, self.max_keyframe_interval)
+        else:
+            return
+        self._changed()
+
+    def _step_up(self):
+        # Undo the last resort first
+        if self.tracker is not None and self.tracker.keyframe_interval > self.base_keyframe_interval:
+            self.tracker.keyframe_interval = max(self.tracker.keyframe_interval // 2, self.base_keyframe_interval)
+        elif self.level > 0:
+            self.level -= 1
+        else:
+            return
+        self._changed()
+
+    def _changed(self):
+        # Latencies measured at the old operating point no longer apply
+        self.latencies.clear()
+        self.adjustments += 1
+
+    def operating_point(self):
+        point = {
+            'imgsz': self.imgsz,
+            'latency_target_ms': round(self.target * 1000, 1),
+            # Until enough frames are seen at a new operating point, report the last decision's p95
+            'p95_ms': round((self.p95() if len(self.latencies) >= self.min_samples else self.last_p95) * 1000, 1),
+            'adjustments': self.adjustments,
+        }
+        if self.tracker is not None:
+            point['keyframe_interval'] = self.tracker.keyframe_interval
+        return point
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Detection, DetectionResult
+from .models import Detection, DetectionResult, DailyDetectionStats, DailyClassStats, VideoJob, CameraSource
 
 
 class DetectionResultInline(admin.TabularInline):
@@ -23,7 +23,46 @@ class DetectionAdmin(admin.ModelAdmin):
 class DetectionResultAdmin(admin.ModelAdmin):
     list_display = ['detection', 'class_name', 'confidence']
     list_filter = ['class_name', 'detection__timestamp']
+    # Detection.__str__ touches the user, so fetch both in the list query
+    list_select_related = ['detection', 'detection__user']
     readonly_fields = ['detection', 'class_name', 'confidence', 'bbox_x', 'bbox_y', 'bbox_width', 'bbox_height']
     
     def has_add_permission(self, request):
-        return False 
\ No newline at end of file
+        return False 
+
+
+@admin.register(DailyDetectionStats)
+class DailyDetectionStatsAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'detections_total', 'signs_total', 'processing_time_sum', 'confidence_sum']
+    list_filter = ['day']
+    list_select_related = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DailyClassStats)
+class DailyClassStatsAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'class_name', 'count']
+    list_filter = ['day', 'class_name']
+    list_select_related = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(VideoJob)
+class VideoJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'frames_processed', 'signs_detected', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    list_select_related = ['user']
+    readonly_fields = ['total_frames', 'last_frame_index', 'frames_processed', 'signs_detected', 'error',
+                       'created_at', 'started_at', 'finished_at', 'heartbeat_at', 'claimed_by']
+
+
+@admin.register(CameraSource)
+class CameraSourceAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'url', 'enabled', 'max_fps', 'user', 'persist_detections', 'updated_at']
+    list_filter = ['enabled', 'persist_detections']
+    list_editable = ['enabled']
+    list_select_related = ['user']
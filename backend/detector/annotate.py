@@ -0,0 +1,43 @@
+"""
+Small annotated previews of frames for stream viewers.
+"""
+import base64
+
+import cv2
+
+
+BOX_COLOR = (0, 255, 0)
+
+
+def draw_detections(image, detections):
+    """
+    Draw normalized detection boxes and labels onto a BGR image in place
+    """
+    height, width = image.shape[:2]
+    for detection in detections:
+        x1 = int(detection['bbox_x'] * width)
+        y1 = int(detection['bbox_y'] * height)
+        x2 = int((detection['bbox_x'] + detection['bbox_width']) * width)
+        y2 = int((detection['bbox_y'] + detection['bbox_height']) * height)
+        cv2.rectangle(image, (x1, y1), (x2, y2), BOX_COLOR, 1)
+        label = f"{detection['class_name']}: {detection['confidence']:.2f}"
+        cv2.putText(image, label, (x1, max(y1 - 4, 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.35, BOX_COLOR, 1)
+    return image
+
+
+def thumbnail_data_url(image, detections, max_side=320, quality=70):
+    """
+    Downscale a frame to max_side, draw its detections and return a JPEG data URL
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width)))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        image = image.copy()
+    draw_detections(image, detections)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError('Could not encode thumbnail')
+    return 'data:image/jpeg;base64,' + base64.b64encode(encoded.tobytes()).decode('ascii')
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class DetectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'detector' 
\ No newline at end of file
+    name = 'detector'
+
+    def ready(self):
+        from .tiling import parse_regions
+        # Fail at startup rather than on the first tiled request
+        try:
+            parse_regions(settings.DETECT_ROI_REGIONS)
+        except ValueError as e:
+            raise ImproperlyConfigured(f'DETECT_ROI_REGIONS: {e}')
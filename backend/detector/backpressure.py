@@ -0,0 +1,89 @@
+import asyncio
+
+from .metrics import realtime_frames_received, realtime_frames_dropped, fanout_messages_delivered, fanout_messages_dropped
+
+
+class LatestFrameMailbox:
+    """
+    Single-slot mailbox for one WebSocket session.
+
+    A newly received frame replaces any frame that has not started processing
+    yet, so a client sending faster than we can infer only ever waits for the
+    frame currently in flight plus the most recent one.
+    """
+
+    def __init__(self):
+        self._pending = None
+        self._available = asyncio.Event()
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+
+    def put(self, frame):
+        self.frames_received += 1
+        realtime_frames_received.inc()
+        if self._pending is not None:
+            # The older frame never started; the newer one supersedes it
+            self.frames_dropped += 1
+            realtime_frames_dropped.inc()
+        self._pending = frame
+        self._available.set()
+
+    async def get(self):
+        while self._pending is None:
+            self._available.clear()
+            await self._available.wait()
+        frame, self._pending = self._pending, None
+        return frame
+
+    def task_done(self):
+        self.frames_processed += 1
+
+    def stats(self):
+        return {
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'frames_processed': self.frames_processed,
+        }
+
+
+class LatestMessageOutbox:
+    """
+    Single-slot outbox for a socket that watches someone else's stream.
+
+    Group messages are put here instead of being sent inline, and one sender
+    task drains the slot. A message that arrives while the previous one is
+    still being written to a slow viewer replaces any message still waiting,
+    so that viewer falls behind by at most one message and the producer and
+    the channel layer never wait on it.
+    """
+
+    def __init__(self):
+        self._pending = None
+        self._available = asyncio.Event()
+        self.messages_delivered = 0
+        self.messages_dropped = 0
+
+    def put(self, message):
+        if self._pending is not None:
+            self.messages_dropped += 1
+            fanout_messages_dropped.inc()
+        self._pending = message
+        self._available.set()
+
+    async def get(self):
+        while self._pending is None:
+            self._available.clear()
+            await self._available.wait()
+        message, self._pending = self._pending, None
+        return message
+
+    def task_done(self):
+        self.messages_delivered += 1
+        fanout_messages_delivered.inc()
+
+    def stats(self):
+        return {
+            'messages_delivered': self.messages_delivered,
+            'messages_dropped': self.messages_dropped,
+        }
@@ -0,0 +1,306 @@
+import asyncio
+import collections
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .frame_cache import FrameResultCache, content_hash, perceptual_hash
+from .metrics import REGISTRY, Gauge, Histogram
+from .model_registry import registry
+from .timings import set_stage
+
+
+logger = logging.getLogger(__name__)
+
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+
+class BatchScheduler:
+    """
+    Collects frames from every caller in the process and runs them through the
+    detector in batched forward passes.
+
+    A batch is dispatched once it reaches max_batch_size or when the oldest
+    queued frame has waited max_wait seconds, whichever comes first. Frames
+    requested at different input sizes never share a batch: a frame for another
+    size is set aside and starts a later batch. Results are scattered back to
+    each caller's future. Up to `concurrency` batches
+    run at once, which lets a process-pool detector keep every worker busy;
+    while all slots are busy, new frames keep accumulating into the next batch.
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait=0.01, concurrency=1, cache=None):
+        self.detector = detector
+        self.cache = cache
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.concurrency = max(1, concurrency)
+        self._slots = threading.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='inference-batch')
+        self.batch_size_histogram = Histogram('inference_batch_size', BATCH_SIZE_BUCKETS)
+        self.queue_wait_histogram = Histogram('inference_queue_wait_seconds', QUEUE_WAIT_BUCKETS)
+        self.batches_by_imgsz = collections.Counter()
+        self._queue = queue.Queue()
+        # Frames pulled while collecting a batch for another input size; only
+        # touched by the collector thread
+        self._deferred = collections.deque()
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image, imgsz=None):
+        """
+        Queue a BGR image for inference and return a Future with its result dict.
+        imgsz picks a smaller input size than the model's default.
+        """
+        future = Future()
+        self._queue.put((image, future, time.monotonic(), imgsz or self.detector.input_size))
+        return future
+
+    def detect(self, image, imgsz=None):
+        """
+        Blocking helper for synchronous callers such as DRF views
+        """
+        return self.submit(image, imgsz).result()
+
+    async def detect_async(self, image, imgsz=None):
+        """
+        Await a result without tying up an executor thread while queued
+        """
+        return await asyncio.wrap_future(self.submit(image, imgsz))
+
+    def cache_variant(self, imgsz=None):
+        """
+        Everything besides the frame that a cached result depends on
+        """
+        detector = self.detector
+        return (detector.model_path, detector.engine.name, detector.conf, imgsz or detector.input_size)
+
+    def _prepare(self, decode, payload, imgsz=None):
+        """
+        Check the frame cache and decode on a miss.
+        Returns (cached_result, image, digest, phash, decode_time).
+        """
+        digest = None
+        if self.cache is not None:
+            digest = content_hash(payload)
+            cached = self.cache.get_exact(digest, self.cache_variant(imgsz))
+            if cached is not None:
+                return cached, None, digest, None, 0.0
+
+        start_time = time.perf_counter()
+        image = decode(payload)
+        decode_time = time.perf_counter() - start_time
+        if self.cache is None:
+            return None, image, None, None, decode_time
+
+        phash = perceptual_hash(image) if self.cache.phash_distance is not None else None
+        return self.cache.get_similar(phash, self.cache_variant(imgsz)), image, digest, phash, decode_time
+
+    def _remember(self, digest, phash, result, imgsz=None):
+        if self.cache is not None and digest is not None:
+            self.cache.put(digest, phash, result, self.cache_variant(imgsz))
+
+    @staticmethod
+    def _with_decode_time(result, decode_time, cached):
+        # A cached result did not run the model for this frame: only its decode counts
+        if cached:
+            result['timings'] = {}
+        result['decode_time'] = decode_time
+        set_stage(result, 'decode', decode_time)
+        return result
+
+    def detect_encoded(self, decode, payload, imgsz=None):
+        """
+        Decode and detect an encoded frame, serving repeated frames from the cache.
+        The result carries the decode time separately from processing_time and
+        in its per-stage timings.
+        """
+        cached, image, digest, phash, decode_time = self._prepare(decode, payload, imgsz)
+        result = cached if cached is not None else self.detect(image, imgsz)
+        if cached is None:
+            self._remember(digest, phash, result, imgsz)
+        return self._with_decode_time(result, decode_time, cached is not None)
+
+    async def detect_encoded_async(self, decode, payload, imgsz=None):
+        # Hashing and decoding are CPU work, keep them off the event loop
+        cached, image, digest, phash, decode_time = await asyncio.get_event_loop().run_in_executor(
+            None, self._prepare, decode, payload, imgsz
+        )
+        result = cached if cached is not None else await self.detect_async(image, imgsz)
+        if cached is None:
+            self._remember(digest, phash, result, imgsz)
+        return self._with_decode_time(result, decode_time, cached is not None)
+
+    def detect_tiled_encoded(self, decode, payload, options):
+        """
+        Decode a frame at up to options.max_side and run it tiled. The tiles
+        are already one batch, so they bypass the queue and the frame cache.
+        """
+        start_time = time.perf_counter()
+        image = decode(payload, options.max_side)
+        decode_time = time.perf_counter() - start_time
+        result = self.detector.detect_tiled(image, options)
+        return self._with_decode_time(result, decode_time, False)
+
+    async def detect_tiled_encoded_async(self, decode, payload, options):
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self.detect_tiled_encoded, decode, payload, options
+        )
+
+    def queue_depth(self):
+        return self._queue.qsize() + len(self._deferred)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait': self.max_wait,
+            'concurrency': self.concurrency,
+            'queue_depth': self.queue_depth(),
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'queue_wait': self.queue_wait_histogram.snapshot(),
+            'batches_by_imgsz': dict(self.batches_by_imgsz),
+            'frame_cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+    @staticmethod
+    def _claim(item):
+        """
+        Mark a queued frame's future as running so it can no longer be
+        cancelled. Returns False for frames whose caller already gave up.
+        """
+        return item[1].set_running_or_notify_cancel()
+
+    def _collect_batch(self):
+        while True:
+            first = self._deferred.popleft() if self._deferred else self._queue.get()
+            if self._claim(first):
+                break
+        imgsz = first[3]
+        batch = [first]
+        # Frames set aside earlier are older than anything still in the queue
+        deferred = collections.deque()
+        for item in self._deferred:
+            if item[3] == imgsz and len(batch) < self.max_batch_size:
+                if self._claim(item):
+                    batch.append(item)
+            else:
+                deferred.append(item)
+        self._deferred = deferred
+
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item[3] == imgsz:
+                if self._claim(item):
+                    batch.append(item)
+            else:
+                self._deferred.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            batch = self._collect_batch()
+            dispatched_at = time.monotonic()
+            self.batch_size_histogram.observe(len(batch))
+            self.batches_by_imgsz[batch[0][3]] += 1
+            for _, _, enqueued_at, _ in batch:
+                self.queue_wait_histogram.observe(dispatched_at - enqueued_at)
+            self._executor.submit(self._dispatch, batch, dispatched_at)
+
+    def _dispatch(self, batch, dispatched_at):
+        try:
+            try:
+                results = self.detector.detect_batch([image for image, _, _, _ in batch], imgsz=batch[0][3])
+            except Exception as e:
+                logger.exception('Batched inference failed')
+                self.detector.record_error(len(batch))
+                results = [self.detector.error_result(e) for _ in batch]
+
+            for (_, future, enqueued_at, _), result in zip(batch, results):
+                # Report the latency the caller actually saw, queueing included
+                result['processing_time'] = time.monotonic() - enqueued_at
+                if 'error' not in result:
+                    set_stage(result, 'queue_wait', dispatched_at - enqueued_at)
+                future.set_result(result)
+        finally:
+            self._slots.release()
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def _build_frame_cache():
+    if not settings.FRAME_CACHE_ENABLED:
+        return None
+    return FrameResultCache(
+        max_entries=settings.FRAME_CACHE_MAX_ENTRIES,
+        max_bytes=settings.FRAME_CACHE_MAX_BYTES,
+        ttl=settings.FRAME_CACHE_TTL,
+        phash_distance=settings.FRAME_CACHE_PHASH_DISTANCE,
+    )
+
+
+def get_scheduler(model_path=None, engine=None, **config):
+    """
+    Return the process-wide scheduler for a model, creating it on first use.
+    The scheduler holds a registry reference for the lifetime of the process.
+    """
+    if settings.INFERENCE_WORKERS:
+        config.setdefault('workers', settings.INFERENCE_WORKERS)
+        config.setdefault('threads_per_worker', settings.INFERENCE_THREADS_PER_WORKER)
+        config.setdefault('slots_per_worker', settings.INFERENCE_MAX_BATCH_SIZE)
+    key = registry.make_key(model_path, engine, **config)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            detector = registry.acquire(model_path, engine, **config)
+            scheduler = BatchScheduler(
+                detector,
+                max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                max_wait=settings.INFERENCE_MAX_WAIT_MS / 1000.0,
+                concurrency=config.get('workers') or 1,
+                cache=_build_frame_cache(),
+            )
+            _schedulers[key] = scheduler
+        return scheduler
+
+
+def scheduler_stats():
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return [
+        dict(scheduler.stats(), model_path=key[1], engine=key[0])
+        for key, scheduler in schedulers.items()
+    ]
+
+
+def _collect_scheduler_metrics():
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    for key, scheduler in schedulers.items():
+        labels = {'model': scheduler.detector.model_name, 'engine': key[0]}
+        yield Gauge('inference_queue_depth', callback=scheduler.queue_depth), labels
+        yield scheduler.batch_size_histogram, labels
+        yield scheduler.queue_wait_histogram, labels
+        if scheduler.cache is not None:
+            for counter in (scheduler.cache.exact_hits, scheduler.cache.similar_hits,
+                            scheduler.cache.misses, scheduler.cache.evictions):
+                yield counter, labels
+
+
+REGISTRY.register_collector(_collect_scheduler_metrics)
@@ -0,0 +1,83 @@
+"""
+Columnar detection results.
+
+Post-processing keeps a frame's detections as whole numpy columns (boxes,
+confidences, class ids) and only builds per-detection Python dicts at the
+serialization boundary, instead of pulling every field of every box out of
+the model's tensors one scalar at a time.
+"""
+import numpy as np
+
+
+def class_name_array(class_names):
+    """
+    Precompute an id -> name lookup array from a {class_id: name} dict
+    """
+    size = max(class_names) + 1 if class_names else 0
+    names = np.array([f'Unknown ({i})' for i in range(size)], dtype=object)
+    for class_id, name in class_names.items():
+        names[class_id] = name
+    return names
+
+
+class DetectionColumns:
+    """
+    Detections of one frame as columns: normalized xyxy boxes (N x 4),
+    confidences (N) and integer class ids (N).
+    """
+    __slots__ = ('xyxy', 'confidence', 'class_id', 'names')
+
+    FIELDS = ('class_name', 'confidence', 'bbox_x', 'bbox_y', 'bbox_width', 'bbox_height')
+
+    def __init__(self, xyxy, confidence, class_id, names):
+        self.xyxy = xyxy
+        self.confidence = confidence
+        self.class_id = class_id
+        self.names = names
+
+    @classmethod
+    def from_array(cls, array, names):
+        """
+        Wrap a packed N x 6 detection array (x1, y1, x2, y2, confidence, class id)
+        """
+        return cls(array[:, :4], array[:, 4], array[:, 5].astype(np.int64), names)
+
+    def __len__(self):
+        return len(self.confidence)
+
+    def class_names(self):
+        in_range = (self.class_id >= 0) & (self.class_id < len(self.names))
+        if in_range.all():
+            return self.names[self.class_id]
+        # Ids the model knows but the name table does not
+        names = np.empty(len(self.class_id), dtype=object)
+        names[in_range] = self.names[self.class_id[in_range]]
+        names[~in_range] = [f'Unknown ({i})' for i in self.class_id[~in_range]]
+        return names
+
+    def confidence_avg(self):
+        return float(self.confidence.mean(dtype=np.float64)) if len(self) else 0.0
+
+    def to_columns(self):
+        """
+        Compact JSON-ready form: one list per field
+        """
+        # Widths in float64, as if computed from the Python floats
+        xyxy = self.xyxy.astype(np.float64)
+        return {
+            'class_name': self.class_names().tolist(),
+            'confidence': self.confidence.tolist(),
+            'bbox_x': xyxy[:, 0].tolist(),
+            'bbox_y': xyxy[:, 1].tolist(),
+            'bbox_width': (xyxy[:, 2] - xyxy[:, 0]).tolist(),
+            'bbox_height': (xyxy[:, 3] - xyxy[:, 1]).tolist(),
+        }
+
+    def to_dicts(self):
+        """
+        One detection dict per box, as stored and returned by the API
+        """
+        if not len(self):
+            return []
+        columns = self.to_columns()
+        return [dict(zip(self.FIELDS, row)) for row in zip(*(columns[field] for field in self.FIELDS))]
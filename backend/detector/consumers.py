@@ -1,35 +1,199 @@
 import json
 import asyncio
+import re
+import time
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from .yolo_detector import YOLODetector
-from .models import Detection, DetectionResult
+from .adaptive import AdaptiveResolution
+from .annotate import thumbnail_data_url
+from .backpressure import LatestFrameMailbox, LatestMessageOutbox
+from .batching import get_scheduler
+from .ingestion import camera_group
+from .metrics import fanout_messages_published, websocket_latency_seconds, websocket_sessions
+from .models import CameraSource, VideoJob
+from .persistence import get_write_behind
+from .protocol import parse_frame, build_reply
+from .tiling import TilingOptions
+from .timings import set_stage
+from .tracking import StreamTracker
+from .video import job_group, job_snapshot
+
+
+STREAM_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+def stream_group(owner_id, name):
+    """
+    Stream names are per user: two users publishing the same name get separate
+    groups, and a viewer can only ever join the group of the user it watches
+    """
+    return f'stream_{owner_id}_{name}'
 
 
 class DetectionConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.detector = YOLODetector()
+        self.scheduler = None
+        self.mailbox = LatestFrameMailbox()
+        self.workers = []
+        self.tracker = None
+        self.controller = None
+        self.tiling = None
+        self.stream = None
+        self.stream_group = None
+        self.thumbnails = False
+        self.timings = False
+        self.session_gauge = None
+    
+    def query_params(self):
+        return parse_qs(self.scope.get('query_string', b'').decode('utf-8', 'ignore'))
+    
+    def build_tracker(self):
+        """
+        Streaming mode (keyframe inference + tracking) is enabled per connection
+        with ?tracking=1, optionally with &keyframe_interval=N
+        """
+        params = self.query_params()
+        enabled = params.get('tracking', [str(settings.REALTIME_TRACKING_ENABLED)])[0].lower() in ('1', 'true', 'yes')
+        if not enabled:
+            return None
+        try:
+            keyframe_interval = int(params.get('keyframe_interval', [settings.REALTIME_KEYFRAME_INTERVAL])[0])
+        except ValueError:
+            keyframe_interval = settings.REALTIME_KEYFRAME_INTERVAL
+        return StreamTracker(
+            keyframe_interval=keyframe_interval,
+            scene_change_threshold=settings.REALTIME_SCENE_CHANGE_THRESHOLD,
+        )
+    
+    def build_controller(self):
+        """
+        Adaptive input resolution is enabled per connection with
+        ?latency_target_ms=N (p95 target); 0 turns it off. Tiled sessions run
+        at a fixed tile size and are not adapted.
+        """
+        if self.tiling is not None:
+            return None
+        params = self.query_params()
+        try:
+            target_ms = float(params.get('latency_target_ms', [settings.REALTIME_LATENCY_TARGET_MS])[0])
+        except ValueError:
+            target_ms = settings.REALTIME_LATENCY_TARGET_MS
+        if target_ms <= 0:
+            return None
+        return AdaptiveResolution(
+            target=target_ms / 1000.0,
+            sizes=settings.REALTIME_ADAPTIVE_SIZES,
+            max_size=self.scheduler.detector.input_size,
+            window=settings.REALTIME_ADAPTIVE_WINDOW,
+            tracker=self.tracker,
+        )
     
     async def connect(self):
+        # Shared model and batcher; only the first connection in the process pays the load
+        self.scheduler = await sync_to_async(get_scheduler, thread_sensitive=False)()
+        self.tracker = self.build_tracker()
+        try:
+            # ?tiling=1 or ?regions=x,y,w,h;... for high-resolution cameras
+            self.tiling = TilingOptions.from_params({
+                key: values[0] for key, values in self.query_params().items()
+            })
+        except ValueError as e:
+            await self.accept()
+            await self.send_error(str(e))
+            await self.close()
+            return
+        self.controller = self.build_controller()
+        
+        # ?publish=<name> broadcasts this session's results to ws/streams/<name>/,
+        # with &thumbnails=1 an annotated preview of each frame as well
+        params = self.query_params()
+        stream = params.get('publish', [None])[0]
+        user = self.scope.get("user", AnonymousUser())
+        if stream is not None:
+            if not user.is_authenticated or not STREAM_NAME_PATTERN.match(stream):
+                await self.accept()
+                await self.send_error('Publishing needs an authenticated session and a stream name of '
+                                      'letters, digits, "_", "-" or "."')
+                await self.close()
+                return
+            self.stream = stream
+            self.stream_group = stream_group(user.pk, stream)
+            self.thumbnails = params.get('thumbnails', ['0'])[0].lower() in ('1', 'true', 'yes')
+        # ?timings=1 adds the per-stage breakdown and model to every result
+        self.timings = params.get('timings', ['0'])[0].lower() in ('1', 'true', 'yes')
         await self.accept()
+        self.session_gauge = websocket_sessions.labels('detect')
+        self.session_gauge.inc()
+        if self.stream is not None:
+            await self.publish_status(live=True)
+        
+        # Frames are processed by a fixed number of workers so a fast client
+        # can never have more than REALTIME_MAX_IN_FLIGHT inferences running
+        self.workers = [
+            asyncio.ensure_future(self.process_frames())
+            for _ in range(max(1, settings.REALTIME_MAX_IN_FLIGHT))
+        ]
         
         # Check if user is authenticated
-        user = self.scope.get("user", AnonymousUser())
         is_authenticated = user.is_authenticated
         
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': 'Connected to detection service',
             'authenticated': is_authenticated,
-            'username': user.username if is_authenticated else None
+            'username': user.username if is_authenticated else None,
+            'tracking': self.tracker is not None,
+            'tiling': self.tiling.describe() if self.tiling is not None else None,
+            'operating_point': self.controller.operating_point() if self.controller is not None else None,
+            'publishing': self.stream
         }))
     
     async def disconnect(self, close_code):
-        pass
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+        if self.session_gauge is not None:
+            self.session_gauge.dec()
+            self.session_gauge = None
+        if self.stream is not None:
+            await self.publish_status(live=False)
+    
+    async def publish_status(self, live):
+        await self.channel_layer.group_send(self.stream_group, {
+            'type': 'stream.status',
+            'stream': self.stream,
+            'live': live
+        })
     
-    async def receive(self, text_data):
+    async def publish_result(self, message, decode, payload):
+        """
+        Broadcast a result to every viewer of this session's stream. Inference
+        has already happened once here; viewers only receive the result.
+        """
+        event = dict(message, type='stream.result', stream=self.stream)
+        if self.thumbnails:
+            def render():
+                # Reduced-size decode: a preview never needs the full frame
+                image = decode(payload, settings.REALTIME_THUMBNAIL_SIZE)
+                return thumbnail_data_url(image, message['detections'], settings.REALTIME_THUMBNAIL_SIZE)
+            event['thumbnail'] = await asyncio.get_event_loop().run_in_executor(None, render)
+        await self.channel_layer.group_send(self.stream_group, event)
+        fanout_messages_published.inc()
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            try:
+                frame_id, flags, payload = parse_frame(bytes_data)
+            except Exception as e:
+                await self.send_error(str(e), frame_id=0, binary=True)
+                return
+            self.mailbox.put((self.scheduler.detector.decode_bytes, payload, frame_id, True, time.monotonic()))
+            return
+        
         try:
             data = json.loads(text_data)
             message_type = data.get('type')
@@ -37,53 +201,266 @@ class DetectionConsumer(AsyncWebsocketConsumer):
             if message_type == 'detect_frame':
                 base64_image = data.get('image')
                 if base64_image:
-                    # Run detection in a thread to avoid blocking
-                    result = await asyncio.get_event_loop().run_in_executor(
-                        None, self.detector.detect_from_base64, base64_image
-                    )
-                    
-                    # Save to database if there are detections and user is authenticated
-                    user = self.scope.get("user", AnonymousUser())
-                    if result['detections_count'] > 0 and user.is_authenticated:
-                        await self.save_detection(result, user)
-                    
-                    # Send results back to client
-                    await self.send(text_data=json.dumps({
-                        'type': 'detection_result',
-                        'detections': result['detections'],
-                        'processing_time': result['processing_time'],
-                        'detections_count': result['detections_count'],
-                        'confidence_avg': result['confidence_avg'],
-                        'saved': result['detections_count'] > 0 and user.is_authenticated
-                    }))
+                    # Queue the frame; it replaces any older frame still waiting
+                    self.mailbox.put((
+                        self.scheduler.detector.decode_base64, base64_image, data.get('frame_id'), False,
+                        time.monotonic()
+                    ))
                     
         except Exception as e:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': str(e)
-            }))
-    
-    @database_sync_to_async
-    def save_detection(self, result, user):
-        """Save detection results to database"""
-        try:
-            detection = Detection.objects.create(
-                user=user,
-                detections_count=result['detections_count'],
-                confidence_avg=result['confidence_avg'],
-                processing_time=result['processing_time']
-            )
-            
-            for det in result['detections']:
-                DetectionResult.objects.create(
-                    detection=detection,
-                    class_name=det['class_name'],
-                    confidence=det['confidence'],
-                    bbox_x=det['bbox_x'],
-                    bbox_y=det['bbox_y'],
-                    bbox_width=det['bbox_width'],
-                    bbox_height=det['bbox_height']
-                )
+            await self.send_error(str(e))
+    
+    async def process_frames(self):
+        """
+        Worker loop: always take the newest pending frame, run it and reply
+        """
+        while True:
+            decode, payload, frame_id, binary, received_at = await self.mailbox.get()
+            try:
+                message = await self.run_detection(decode, payload)
+                message.update(self.mailbox.stats())
+                if frame_id is not None:
+                    message['frame_id'] = frame_id
+                if self.stream is not None:
+                    await self.publish_result(message, decode, payload)
                 
-        except Exception as e:
-            print(f"Error saving detection: {str(e)}") 
\ No newline at end of file
+                # Send results back to client
+                if binary:
+                    await self.send(bytes_data=build_reply(frame_id, message))
+                else:
+                    await self.send(text_data=json.dumps(message))
+                websocket_latency_seconds.observe(time.monotonic() - received_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self.send_error(str(e), frame_id=frame_id, binary=binary)
+            finally:
+                self.mailbox.task_done()
+    
+    async def send_error(self, message, frame_id=None, binary=False):
+        error = {'type': 'error', 'message': message}
+        if frame_id is not None:
+            error['frame_id'] = frame_id
+        if binary:
+            await self.send(bytes_data=build_reply(frame_id or 0, error, error=True))
+        else:
+            await self.send(text_data=json.dumps(error))
+    
+    async def run_detection(self, decode, encoded_image):
+        """
+        Decode a frame, run it through the batching scheduler and persist the result.
+        Returns the detection_result message for the client.
+        """
+        start_time = time.time()
+        imgsz = self.controller.imgsz if self.controller is not None else None
+        if self.tracker is not None:
+            result = await self.run_tracked_detection(decode, encoded_image, imgsz)
+        elif self.tiling is not None:
+            result = await self.scheduler.detect_tiled_encoded_async(decode, encoded_image, self.tiling)
+        else:
+            # Decoding happens in a thread; repeated frames are served from the
+            # frame cache, the rest join the next batched forward pass
+            result = await self.scheduler.detect_encoded_async(decode, encoded_image, imgsz)
+        result['processing_time'] = time.time() - start_time
+        if self.controller is not None:
+            self.controller.observe(result['processing_time'])
+        
+        # Persist off the hot path if there are detections and user is authenticated.
+        # In streaming mode only keyframes hold real inference results.
+        user = self.scope.get("user", AnonymousUser())
+        saved = False
+        if result['detections_count'] > 0 and user.is_authenticated and result.get('keyframe', True):
+            saved = get_write_behind().enqueue(result, user_id=user.pk)
+        
+        message = {
+            'type': 'detection_result',
+            'detections': result['detections'],
+            'processing_time': result['processing_time'],
+            'decode_time': result.get('decode_time', 0.0),
+            'detections_count': result['detections_count'],
+            'confidence_avg': result['confidence_avg'],
+            'cached': result.get('cached'),
+            'saved': saved
+        }
+        if self.tracker is not None:
+            message['keyframe'] = result['keyframe']
+            message['tracking'] = self.tracker.stats()
+        if self.controller is not None:
+            message['operating_point'] = self.controller.operating_point()
+        if self.timings:
+            message['timings'] = result.get('timings', {})
+            message['model'] = result.get('model')
+        return message
+    
+    async def run_tracked_detection(self, decode, encoded_image, imgsz=None):
+        """
+        Streaming mode: run the model on keyframes only and serve the frames in
+        between from the tracker
+        """
+        def decode_and_check(payload):
+            decode_start = time.perf_counter()
+            image = decode(payload, self.tiling.max_side) if self.tiling is not None else decode(payload)
+            return image, time.perf_counter() - decode_start, self.tracker.needs_keyframe(image)
+        
+        image, decode_time, keyframe = await asyncio.get_event_loop().run_in_executor(
+            None, decode_and_check, encoded_image
+        )
+        if not keyframe:
+            result = self.tracker.propagate()
+        else:
+            if self.tiling is not None:
+                result = await asyncio.get_event_loop().run_in_executor(
+                    None, self.scheduler.detector.detect_tiled, image, self.tiling
+                )
+            else:
+                result = await self.scheduler.detect_async(image, imgsz)
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            result = self.tracker.update(result)
+        result['decode_time'] = decode_time
+        set_stage(result, 'decode', decode_time)
+        return result
+
+
+class VideoJobConsumer(AsyncWebsocketConsumer):
+    """
+    Streams progress and per-frame results of one video job to its owner
+    """
+    async def connect(self):
+        self.job_id = int(self.scope['url_route']['kwargs']['job_id'])
+        user = self.scope.get("user", AnonymousUser())
+        job = await sync_to_async(self.get_job)(user)
+        if job is None:
+            await self.close()
+            return
+        
+        self.group_name = job_group(self.job_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps({'type': 'job_progress', 'job': job_snapshot(job)}))
+    
+    def get_job(self, user):
+        if not user.is_authenticated:
+            return None
+        jobs = VideoJob.objects.all() if user.is_staff else VideoJob.objects.filter(user=user)
+        return jobs.filter(pk=self.job_id).first()
+    
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    
+    async def job_progress(self, event):
+        message = {'type': 'job_progress', 'job': event['job']}
+        if 'results' in event:
+            message['results'] = event['results']
+        await self.send(text_data=json.dumps(message))
+
+
+class SubscriberConsumer(AsyncWebsocketConsumer):
+    """
+    Base for sockets that watch a stream produced elsewhere. Group messages go
+    through a LatestMessageOutbox drained by a single sender task, so a slow
+    viewer skips to the newest result instead of stalling the channel layer.
+    """
+    session_kind = 'subscriber'
+    
+    async def subscribe(self, group_name):
+        self.group_name = group_name
+        self.outbox = LatestMessageOutbox()
+        websocket_sessions.labels(self.session_kind).inc()
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        self.sender = asyncio.ensure_future(self.send_latest())
+    
+    async def send_latest(self):
+        while True:
+            message = await self.outbox.get()
+            try:
+                message['delivery'] = self.outbox.stats()
+                await self.send(text_data=json.dumps(message))
+            finally:
+                self.outbox.task_done()
+    
+    def deliver(self, message):
+        self.outbox.put(message)
+    
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            self.sender.cancel()
+            websocket_sessions.labels(self.session_kind).dec()
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+
+class CameraConsumer(SubscriberConsumer):
+    """
+    Streams the detections of a server-side camera (see ingestion.py)
+    """
+    session_kind = 'camera'
+    
+    async def connect(self):
+        self.camera_id = int(self.scope['url_route']['kwargs']['camera_id'])
+        user = self.scope.get("user", AnonymousUser())
+        source = await sync_to_async(self.get_source)(user)
+        if source is None:
+            await self.close()
+            return
+        
+        await self.accept()
+        await self.subscribe(camera_group(self.camera_id))
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'camera': self.camera_id,
+            'name': source.name,
+            'enabled': source.enabled
+        }))
+    
+    def get_source(self, user):
+        if not user.is_authenticated:
+            return None
+        sources = CameraSource.objects.all() if user.is_staff else CameraSource.objects.filter(user=user)
+        return sources.filter(pk=self.camera_id).first()
+    
+    async def camera_result(self, event):
+        self.deliver(dict(event, type='detection_result'))
+
+
+class StreamConsumer(SubscriberConsumer):
+    """
+    Watches the results of a DetectionConsumer session opened with
+    ?publish=<name>, without running inference again. Users watch their own
+    streams; staff can watch another user's with ?owner=<user id>.
+    """
+    session_kind = 'stream'
+    
+    async def connect(self):
+        self.stream = self.scope['url_route']['kwargs']['stream']
+        user = self.scope.get("user", AnonymousUser())
+        owner_id = self.get_owner_id(user)
+        if owner_id is None:
+            await self.close()
+            return
+        
+        await self.accept()
+        await self.subscribe(stream_group(owner_id, self.stream))
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'stream': self.stream,
+            'owner': owner_id
+        }))
+    
+    def get_owner_id(self, user):
+        if not user.is_authenticated:
+            return None
+        owner = parse_qs(self.scope.get('query_string', b'').decode('utf-8', 'ignore')).get('owner', [None])[0]
+        if owner is None:
+            return user.pk
+        try:
+            owner_id = int(owner)
+        except ValueError:
+            return None
+        return owner_id if owner_id == user.pk or user.is_staff else None
+    
+    async def stream_result(self, event):
+        self.deliver(dict(event, type='detection_result'))
+    
+    async def stream_status(self, event):
+        self.deliver(dict(event, type='stream_status'))
@@ -0,0 +1,125 @@
+"""
+Decode stage: encoded frame bytes straight to a BGR uint8 array.
+
+cv2.imdecode reads directly from the encoded buffer (bytes or a memoryview
+over a WebSocket frame), so no intermediate PIL image or RGB copy is made.
+JPEGs much larger than the model input are decoded at 1/2, 1/4 or 1/8 scale
+by libjpeg itself, which skips most of the IDCT work; the model letterboxes
+to its input size anyway, and boxes are normalized, so results are unchanged.
+Grayscale, palette, alpha and 16-bit images are normalized to 3-channel BGR.
+"""
+import base64
+import time
+
+import cv2
+import numpy as np
+
+from .metrics import REGISTRY, Counter, Histogram
+
+
+MODEL_INPUT_SIZE = 640
+DECODE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5]
+
+# Start-of-frame markers carrying the image dimensions
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+decode_seconds = REGISTRY.register(Histogram('image_decode_seconds', DECODE_BUCKETS), 'Time to decode one uploaded image')
+reduced_decodes = REGISTRY.register(
+    Counter('image_reduced_decodes_total'), 'JPEGs decoded at reduced resolution')
+
+
+def jpeg_size(buffer):
+    """
+    Read (width, height) from a JPEG header without decoding, or None if the
+    buffer is not a JPEG
+    """
+    view = memoryview(buffer)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < len(view):
+        if view[i] != 0xFF:
+            i += 1
+            continue
+        marker = view[i + 1]
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Fill byte, TEM or RST markers have no length field
+            i += 1 if marker == 0xFF else 2
+            continue
+        if marker in SOF_MARKERS:
+            height = (view[i + 5] << 8) | view[i + 6]
+            width = (view[i + 7] << 8) | view[i + 8]
+            return width, height
+        i += 2 + ((view[i + 2] << 8) | view[i + 3])
+    return None
+
+
+def reduction_flag(size, target_size=MODEL_INPUT_SIZE):
+    """
+    Largest reduced-decode flag that still leaves the long side at or above
+    target_size, or IMREAD_COLOR for images that are not much larger
+    """
+    if size is None:
+        return cv2.IMREAD_COLOR
+    long_side = max(size)
+    for factor, flag in REDUCED_FLAGS:
+        if long_side >= target_size * factor:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def normalize_channels(image):
+    """
+    Convert any decoded layout to 3-channel uint8 BGR. Transparent pixels are
+    composited onto white instead of exposing whatever colour they store.
+    """
+    if image.dtype == np.uint16:
+        image = (image >> 8).astype(np.uint8)
+    elif image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image)
+
+    if image.ndim == 2 or image.shape[2] == 1:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 4:
+        alpha = image[:, :, 3]
+        if alpha.min() == 255:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        weight = alpha[:, :, None].astype(np.float32) / 255.0
+        blended = image[:, :, :3] * weight + 255.0 * (1.0 - weight)
+        return blended.astype(np.uint8)
+    return image
+
+
+def decode_image(buffer, target_size=MODEL_INPUT_SIZE):
+    """
+    Decode JPEG/PNG/WebP/BMP bytes (or a memoryview over them) into a BGR array
+    """
+    start_time = time.perf_counter()
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    size = jpeg_size(encoded)
+    if size is not None:
+        # JPEG has no alpha; IMREAD_COLOR and the reduced modes also honour EXIF orientation
+        flag = reduction_flag(size, target_size)
+        image = cv2.imdecode(encoded, flag)
+        if flag != cv2.IMREAD_COLOR:
+            reduced_decodes.inc()
+    else:
+        image = cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError('Could not decode image data')
+    image = normalize_channels(image)
+    decode_seconds.observe(time.perf_counter() - start_time)
+    return image
+
+
+def decode_data_url(data_url, target_size=MODEL_INPUT_SIZE):
+    """
+    Decode a base64 data URL (or bare base64 string) into a BGR array
+    """
+    _, _, encoded = data_url.rpartition(',')
+    return decode_image(base64.b64decode(encoded), target_size)
@@ -0,0 +1,57 @@
+"""
+Fast read path for detection history.
+
+Produces the same payload as DetectionSerializer(many=True) but works on
+plain value rows: one query for the page of detections and one query for all
+of their results, with no model instances or per-field serializer calls.
+"""
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from .models import DetectionResult
+
+
+DETECTION_FIELDS = ('id', 'timestamp', 'image', 'detections_count', 'confidence_avg', 'processing_time')
+RESULT_FIELDS = ('class_name', 'confidence', 'bbox_x', 'bbox_y', 'bbox_width', 'bbox_height')
+
+
+def _format_timestamp(value):
+    # Same representation as DRF's DateTimeField
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def load_results(detection_ids):
+    """
+    Fetch the results of many detections in a single query, grouped by detection id
+    """
+    grouped = defaultdict(list)
+    rows = DetectionResult.objects.filter(detection_id__in=detection_ids).order_by(
+        'detection_id', 'id'
+    ).values_list('detection_id', *RESULT_FIELDS)
+    for detection_id, *values in rows:
+        grouped[detection_id].append(dict(zip(RESULT_FIELDS, values)))
+    return grouped
+
+
+def encode_detections(rows):
+    """
+    Encode detection value rows (dicts with DETECTION_FIELDS) with their results
+    """
+    rows = list(rows)
+    results = load_results([row['id'] for row in rows])
+    return [
+        {
+            'id': row['id'],
+            'timestamp': _format_timestamp(row['timestamp']),
+            'image': default_storage.url(row['image']) if row['image'] else None,
+            'detections_count': row['detections_count'],
+            'confidence_avg': row['confidence_avg'],
+            'processing_time': row['processing_time'],
+            'results': results.get(row['id'], []),
+        }
+        for row in rows
+    ]
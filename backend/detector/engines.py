@@ -0,0 +1,130 @@
+"""
+Inference engines behind YOLODetector.
+
+An engine knows where its model artifact lives next to the trained PyTorch
+weights, how to export it and how to load it. Every engine loads through
+ultralytics, which wraps the runtime (PyTorch, ONNX Runtime, OpenVINO) behind
+the same predictor, so pre/post-processing and the detection dicts built from
+its results are identical whichever engine a deployment selects.
+"""
+import importlib.util
+import os
+
+from ultralytics import YOLO
+
+
+class InferenceEngine:
+    name = None
+    # ultralytics export format; None for the trained weights themselves
+    export_format = None
+    # Python modules the runtime needs at inference time
+    requires = ()
+
+    def artifact_path(self, model_path):
+        return model_path
+
+    def is_available(self):
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+    def load(self, model_path):
+        path = self.artifact_path(model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f'No {self.name} model at {path}; run "python manage.py export_model --engine {self.name}"'
+            )
+        if not self.is_available():
+            raise RuntimeError(f'The {self.name} engine needs: {", ".join(self.requires)}')
+        return YOLO(path, task='detect')
+
+    def export(self, model_path, imgsz=640, **options):
+        """
+        Export the trained weights to this engine's format and return the artifact path
+        """
+        if self.export_format is None:
+            return model_path
+        exported = YOLO(model_path).export(format=self.export_format, imgsz=imgsz, **options)
+        return str(exported)
+
+    def memory_footprint(self, model, model_path):
+        path = self.artifact_path(model_path)
+        if os.path.isdir(path):
+            return sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(path) for name in names
+            )
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class PyTorchEngine(InferenceEngine):
+    name = 'pytorch'
+    requires = ('torch',)
+
+    def memory_footprint(self, model, model_path):
+        try:
+            module = model.model
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        except Exception:
+            return super().memory_footprint(model, model_path)
+
+
+class ONNXRuntimeEngine(InferenceEngine):
+    name = 'onnx'
+    export_format = 'onnx'
+    requires = ('onnxruntime',)
+
+    def artifact_path(self, model_path):
+        stem, ext = os.path.splitext(model_path)
+        return model_path if ext == '.onnx' else stem + '.onnx'
+
+    def export(self, model_path, imgsz=640, **options):
+        # Dynamic axes so the scheduler can send batches of any size
+        options.setdefault('dynamic', True)
+        return super().export(model_path, imgsz=imgsz, **options)
+
+
+class ONNXInt8Engine(ONNXRuntimeEngine):
+    """
+    INT8 model produced by `manage.py quantize_model`; it only exists once the
+    quantized candidate has passed the agreement gate against the FP32 model.
+    """
+    name = 'onnx-int8'
+    export_format = None
+
+    def artifact_path(self, model_path):
+        if model_path.endswith('.int8.onnx'):
+            return model_path
+        return os.path.splitext(model_path)[0] + '.int8.onnx'
+
+    def load(self, model_path):
+        path = self.artifact_path(model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f'No promoted INT8 model at {path}; run "python manage.py quantize_model"'
+            )
+        return super().load(path)
+
+
+class OpenVINOEngine(InferenceEngine):
+    name = 'openvino'
+    export_format = 'openvino'
+    requires = ('openvino',)
+
+    def artifact_path(self, model_path):
+        if model_path.rstrip(os.sep).endswith('_openvino_model'):
+            return model_path
+        return os.path.splitext(model_path)[0] + '_openvino_model'
+
+    def export(self, model_path, imgsz=640, **options):
+        options.setdefault('dynamic', True)
+        return super().export(model_path, imgsz=imgsz, **options)
+
+
+ENGINES = {engine.name: engine for engine in (PyTorchEngine(), ONNXRuntimeEngine(), ONNXInt8Engine(), OpenVINOEngine())}
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f'Unknown inference engine "{name}"; choose one of: {", ".join(ENGINES)}')
@@ -0,0 +1,168 @@
+"""
+Result cache for repeated and near-identical frames.
+
+Fixed-mount cameras send almost the same picture for hours. Frames are looked
+up first by an exact hash of their encoded bytes (before any decoding), then,
+if enabled, by a 64-bit perceptual difference hash of the decoded image, and
+only fall through to inference when neither matches. Every lookup also carries a variant
+(the model, engine, confidence threshold and input size the result was
+computed with), and only entries of the same variant can match.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .metrics import Counter
+
+
+ENTRY_OVERHEAD_BYTES = 256
+DETECTION_BYTES = 512
+
+
+def content_hash(payload):
+    """
+    Exact hash of an encoded frame (bytes, memoryview or base64 string)
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('ascii', 'ignore')
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def perceptual_hash(image):
+    """
+    64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale
+    thumbnail, so it is stable under re-encoding noise and small lighting drift
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _copy_result(result, source):
+    copied = dict(result)
+    copied['detections'] = [dict(det) for det in result['detections']]
+    copied['cached'] = source
+    return copied
+
+
+class FrameResultCache:
+    """
+    LRU cache of detection results with a TTL and an approximate memory cap.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=5.0, phash_distance=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # None (the default) disables near-duplicate matching
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.exact_hits = Counter('frame_cache_exact_hits_total')
+        self.similar_hits = Counter('frame_cache_similar_hits_total')
+        self.misses = Counter('frame_cache_misses_total')
+        self.evictions = Counter('frame_cache_evictions_total')
+
+    @staticmethod
+    def _entry_size(result):
+        return ENTRY_OVERHEAD_BYTES + DETECTION_BYTES * len(result['detections'])
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
+
+    def _expire(self, now):
+        # Entries are roughly in insertion order; hits re-check the TTL themselves
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry['stored_at'] <= self.ttl:
+                break
+            self._drop(key)
+
+    def get_exact(self, digest, variant=None):
+        key = (variant, digest)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry['stored_at'] > self.ttl:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+        self.exact_hits.inc()
+        return _copy_result(entry['result'], 'exact')
+
+    def get_similar(self, phash, variant=None):
+        if self.phash_distance is None:
+            self.misses.inc()
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            # Newest entries first: a live stream most likely matches its last frame
+            for key in reversed(self._entries):
+                entry = self._entries[key]
+                if key[0] != variant or now - entry['stored_at'] > self.ttl:
+                    continue
+                if _hamming(entry['phash'], phash) <= self.phash_distance:
+                    self._entries.move_to_end(key)
+                    result = entry['result']
+                    break
+            else:
+                result = None
+
+        if result is None:
+            self.misses.inc()
+            return None
+        self.similar_hits.inc()
+        return _copy_result(result, 'similar')
+
+    def put(self, digest, phash, result, variant=None):
+        if 'error' in result:
+            return
+        key = (variant, digest)
+        size = self._entry_size(result)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                'result': _copy_result(result, None),
+                'phash': phash,
+                'size': size,
+                'stored_at': time.monotonic(),
+            }
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions.inc()
+
+    def stats(self):
+        exact, similar, misses = self.exact_hits.value, self.similar_hits.value, self.misses.value
+        lookups = exact + similar + misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'phash_distance': self.phash_distance,
+            'exact_hits': exact,
+            'similar_hits': similar,
+            'misses': misses,
+            'evictions': self.evictions.value,
+            'hit_rate': (exact + similar) / lookups if lookups else 0.0,
+        }
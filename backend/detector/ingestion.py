@@ -0,0 +1,273 @@
+"""
+Server-side ingestion of fixed cameras.
+
+Each enabled CameraSource gets a capture thread and an inference thread. The
+capture thread reads the stream as fast as the source delivers it and keeps
+only the newest decoded frame, so a slow detector never builds up a backlog
+of stale frames (and network streams never fall behind real time). The
+inference thread takes the newest frame at most `max_fps` times per second,
+runs it through the shared batching scheduler (so all cameras in the process
+share forward passes) and publishes the result to the camera's channel-layer
+group for CameraConsumer. Browser clients no longer have to re-encode and
+upload frames for cameras the server can reach itself.
+"""
+import logging
+import os
+import threading
+import time
+
+import cv2
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import CameraSource
+from .persistence import get_write_behind
+
+
+logger = logging.getLogger(__name__)
+
+
+def camera_group(camera_id):
+    return f'camera_{camera_id}'
+
+
+def is_local_file(url):
+    return '://' not in url and os.path.exists(url)
+
+
+class LatestFrame:
+    """
+    Thread-safe single slot holding the newest captured frame. A frame that
+    is replaced before anyone took it counts as dropped.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self.frames_dropped = 0
+
+    def put(self, frame):
+        with self._condition:
+            if self._frame is not None:
+                self.frames_dropped += 1
+            self._frame = frame
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def take(self, timeout=None):
+        """
+        Return (sequence number, frame) of the newest frame, waiting up to
+        `timeout` seconds for one, or None
+        """
+        with self._condition:
+            if self._frame is None:
+                self._condition.wait(timeout)
+            if self._frame is None:
+                return None
+            frame, self._frame = self._frame, None
+            return self._sequence, frame
+
+
+class CaptureThread(threading.Thread):
+    """
+    Reads frames from a source into a LatestFrame, reconnecting with
+    exponential backoff when the stream fails. Local files are replayed in a
+    loop at their own frame rate so they behave like a live camera.
+    """
+
+    def __init__(self, url, latest, stop_event, reconnect_delay=1.0, max_reconnect_delay=30.0, name=None):
+        super().__init__(name=name or 'camera-capture', daemon=True)
+        self.url = url
+        self.latest = latest
+        self.stop_event = stop_event
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.frames_captured = 0
+        self.reconnects = 0
+        self.connected = False
+
+    def open(self):
+        capture = cv2.VideoCapture(self.url)
+        # Network streams: do not let the backend queue frames behind our back
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return capture
+
+    def run(self):
+        delay = self.reconnect_delay
+        replay = is_local_file(self.url)
+        while not self.stop_event.is_set():
+            capture = self.open()
+            read_any = False
+            try:
+                if capture.isOpened():
+                    self.connected = True
+                    read_any = self.read_frames(capture, replay)
+                    if read_any:
+                        delay = self.reconnect_delay
+            finally:
+                self.connected = False
+                capture.release()
+
+            if self.stop_event.is_set():
+                break
+            if replay and read_any:
+                # End of file: start over right away, like a looping camera
+                continue
+            # Missing, unreadable or empty files back off like a lost stream
+            self.reconnects += 1
+            logger.warning('Camera stream %s lost, reconnecting in %.0fs', self.url, delay)
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def read_frames(self, capture, replay):
+        """
+        Read until the stream ends or stop is requested. Returns True if at
+        least one frame was read.
+        """
+        interval = 1.0 / capture.get(cv2.CAP_PROP_FPS) if replay and capture.get(cv2.CAP_PROP_FPS) > 0 else 0.0
+        started = time.monotonic()
+        frames = 0
+        while not self.stop_event.is_set():
+            ok, frame = capture.read()
+            if not ok:
+                break
+            self.latest.put(frame)
+            self.frames_captured += 1
+            frames += 1
+            if interval:
+                self.stop_event.wait(max(0.0, started + frames * interval - time.monotonic()))
+        return frames > 0
+
+
+class CameraWorker:
+    """
+    Capture and inference threads for one CameraSource
+    """
+
+    def __init__(self, source, scheduler, reconnect_max_delay=30.0):
+        self.source = source
+        self.scheduler = scheduler
+        self.latest = LatestFrame()
+        self.stop_event = threading.Event()
+        self.capture = CaptureThread(
+            source.url, self.latest, self.stop_event,
+            max_reconnect_delay=reconnect_max_delay, name=f'camera-{source.id}-capture',
+        )
+        self.thread = threading.Thread(target=self._run, name=f'camera-{source.id}-inference', daemon=True)
+        self.frames_processed = 0
+        self.errors = 0
+
+    def start(self):
+        self.capture.start()
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        self.capture.join(timeout)
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            'connected': self.capture.connected,
+            'frames_captured': self.capture.frames_captured,
+            'frames_dropped': self.latest.frames_dropped,
+            'frames_processed': self.frames_processed,
+            'reconnects': self.capture.reconnects,
+            'errors': self.errors,
+        }
+
+    def _run(self):
+        interval = 1.0 / self.source.max_fps if self.source.max_fps > 0 else 0.0
+        while not self.stop_event.is_set():
+            item = self.latest.take(timeout=1.0)
+            if item is None:
+                continue
+            frame_id, frame = item
+            started = time.monotonic()
+            try:
+                result = self.scheduler.detect(frame)
+                if 'error' in result:
+                    raise RuntimeError(result['error'])
+                result['processing_time'] = time.monotonic() - started
+                self.frames_processed += 1
+                self.publish(frame_id, result)
+                self.persist(result)
+            except Exception:
+                self.errors += 1
+                logger.exception('Detection failed for camera %s', self.source.id)
+            if interval:
+                # Frames captured meanwhile replace each other; only the newest is run next
+                self.stop_event.wait(max(0.0, started + interval - time.monotonic()))
+
+    def publish(self, frame_id, result):
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        message = {
+            'type': 'camera.result',
+            'camera': self.source.id,
+            'frame_id': frame_id,
+            'timestamp': timezone.now().isoformat(),
+            'detections': result['detections'],
+            'detections_count': result['detections_count'],
+            'confidence_avg': result['confidence_avg'],
+            'processing_time': result['processing_time'],
+            'capture': self.stats(),
+        }
+        try:
+            async_to_sync(layer.group_send)(camera_group(self.source.id), message)
+        except Exception:
+            logger.warning('Could not publish results of camera %s', self.source.id, exc_info=True)
+
+    def persist(self, result):
+        if self.source.persist_detections and self.source.user_id and result['detections_count'] > 0:
+            get_write_behind().enqueue(result, user_id=self.source.user_id)
+
+
+class IngestionManager:
+    """
+    Keeps one CameraWorker running per enabled CameraSource. sync() starts
+    workers for new sources and restarts or stops workers whose source was
+    edited, disabled or deleted.
+    """
+
+    def __init__(self, scheduler, source_ids=None, reconnect_max_delay=30.0):
+        self.scheduler = scheduler
+        self.source_ids = source_ids
+        self.reconnect_max_delay = reconnect_max_delay
+        self.workers = {}
+
+    def sync(self):
+        close_old_connections()
+        sources = CameraSource.objects.filter(enabled=True)
+        if self.source_ids:
+            sources = sources.filter(pk__in=self.source_ids)
+        wanted = {source.id: source for source in sources}
+
+        for camera_id, worker in list(self.workers.items()):
+            source = wanted.get(camera_id)
+            if source is None or source.updated_at != worker.source.updated_at:
+                worker.stop()
+                del self.workers[camera_id]
+
+        started = []
+        for camera_id, source in wanted.items():
+            if camera_id not in self.workers:
+                worker = CameraWorker(source, self.scheduler, self.reconnect_max_delay)
+                worker.start()
+                self.workers[camera_id] = worker
+                started.append(source)
+        return started
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.stop_event.set()
+        for worker in self.workers.values():
+            worker.stop()
+        self.workers = {}
+
+    def stats(self):
+        return {camera_id: worker.stats() for camera_id, worker in self.workers.items()}
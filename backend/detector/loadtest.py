@@ -0,0 +1,306 @@
+"""
+In-process load generator for the detection endpoints (`manage.py loadtest`).
+
+Clients drive POST /api/detect/ and ws/detect/ through the project's ASGI
+application in this process, with the in-memory channel layer, so a run
+needs neither a server nor Redis. The detector is either the real model or
+StubDetector, which stands in for the forward pass with a fixed latency so
+the serving path (decoding, batching, persistence, WebSocket backpressure) can
+be sized on its own.
+
+With fps=0 every client sends its next frame as soon as the previous result
+arrived. With fps > 0 clients send on a fixed schedule: a REST client whose
+request is still running when a frame is due skips it, and a WebSocket
+client keeps sending while the server's mailbox drops the frames it cannot
+keep up with. Both count as dropped frames in the report.
+"""
+import asyncio
+import base64
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+from channels.routing import URLRouter
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+
+from .columns import class_name_array
+from .engines import InferenceEngine
+from .protocol import HEADER, HEADER_SIZE, PROTOCOL_VERSION, FLAG_ERROR
+from .validation import load_validation_images
+from .yolo_detector import YOLODetector
+
+
+PERCENTILES = (50, 95, 99)
+
+
+class StubEngine(InferenceEngine):
+    name = 'stub'
+
+    def load(self, model_path):
+        return None
+
+    def memory_footprint(self, model, model_path):
+        return 0
+
+
+class StubDetector(YOLODetector):
+    """
+    Detector without a model: a forward pass sleeps batch_latency plus
+    image_latency per image and finds one Stop sign in the middle of every frame
+    """
+
+    def __init__(self, batch_latency=0.02, image_latency=0.002):
+        self.model_path = 'stub'
+        self.conf = 0.25
+        self.engine = StubEngine()
+        self.model = None
+        self.class_names = self.get_gtsrb_class_names()
+        self.class_name_array = class_name_array(self.class_names)
+        self.model_name = 'stub'
+        self.batch_latency = batch_latency
+        self.image_latency = image_latency
+        # Forward passes are serialized like the real detector's
+        self._lock = threading.Lock()
+
+    def predict_timed(self, images, imgsz=None):
+        images = list(images)
+        start_time = time.perf_counter()
+        with self._lock:
+            time.sleep(self.batch_latency + self.image_latency * len(images))
+        per_image = (time.perf_counter() - start_time) / max(1, len(images))
+        box = np.array([[0.4, 0.4, 0.6, 0.6, 0.9, 14]], dtype=np.float32)
+        arrays = [box.copy() for _ in images]
+        timings = [{'preprocess': 0.0, 'inference': per_image, 'postprocess': 0.0} for _ in images]
+        return arrays, timings
+
+
+def synthetic_frames(count, width, height, seed=0):
+    """
+    Smooth random frames; pure noise would compress far worse than camera images
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+        frames.append(cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC))
+    return frames
+
+
+def load_frames(paths=None, count=16, width=1280, height=720, quality=85):
+    """
+    JPEG-encoded frames from image files or directories, or synthetic ones
+    """
+    images = load_validation_images(paths, limit=count) if paths else synthetic_frames(count, width, height)
+    encoded = []
+    for image in images:
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            encoded.append(buffer.tobytes())
+    return encoded
+
+
+def latency_summary(latencies):
+    """
+    Average, percentiles and maximum of a list of seconds, in milliseconds
+    """
+    if not latencies:
+        return None
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    summary = {'avg': round(float(values.mean()), 2)}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f'p{p}'] = round(float(value), 2)
+    summary['max'] = round(float(values.max()), 2)
+    return summary
+
+
+def with_user(application, user):
+    """
+    Authenticate every WebSocket connection as `user`, as a logged-in browser would be
+    """
+    async def authenticated(scope, receive, send):
+        return await application(dict(scope, user=user), receive, send)
+    return authenticated
+
+
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latencies = []
+
+    def report(self, elapsed, **extra):
+        return dict({
+            'frames_sent': self.sent,
+            'results': self.completed,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'duration': round(elapsed, 3),
+            'throughput': round(self.completed / elapsed, 2) if elapsed > 0 else 0.0,
+            'latency_ms': latency_summary(self.latencies),
+        }, **extra)
+
+
+class LoadTest:
+    """
+    Runs `concurrency` clients against one endpoint for `duration` seconds
+    """
+
+    def __init__(self, http_application, websocket_patterns, frames, user, token, concurrency=4, fps=0.0,
+                 duration=10.0, binary=False, timeout=30.0):
+        self.http_application = http_application
+        self.ws_application = with_user(URLRouter(websocket_patterns), user)
+        self.frames = frames
+        self.data_urls = ['data:image/jpeg;base64,' + base64.b64encode(frame).decode('ascii') for frame in frames]
+        self.token = token
+        self.concurrency = max(1, concurrency)
+        self.fps = max(0.0, fps)
+        self.duration = duration
+        self.binary = binary
+        self.timeout = timeout
+        # Mailbox counters the server reported to each WebSocket client
+        self.server_stats = []
+
+    def frame(self, number):
+        return number % len(self.frames)
+
+    async def _run(self, client):
+        stats = ClientStats()
+        start_time = time.monotonic()
+        deadline = start_time + self.duration
+        await asyncio.gather(*(client(index, stats, deadline) for index in range(self.concurrency)))
+        return stats, time.monotonic() - start_time
+
+    async def run_rest(self):
+        stats, elapsed = await self._run(self._rest_client)
+        return stats.report(elapsed)
+
+    async def _rest_client(self, index, stats, deadline):
+        headers = [
+            (b'content-type', b'image/jpeg'),
+            (b'authorization', f'Bearer {self.token}'.encode('ascii')),
+        ]
+        interval = 1.0 / self.fps if self.fps else 0.0
+        due = time.monotonic()
+        number = index
+        while time.monotonic() < deadline:
+            body = self.frames[self.frame(number)]
+            number += self.concurrency
+            start_time = time.perf_counter()
+            communicator = HttpCommunicator(
+                self.http_application, 'POST', '/api/detect/', body=body,
+                headers=headers + [(b'content-length', str(len(body)).encode('ascii'))],
+            )
+            stats.sent += 1
+            try:
+                response = await communicator.get_response(timeout=self.timeout)
+            except asyncio.TimeoutError:
+                stats.errors += 1
+                continue
+            if response['status'] == 200:
+                stats.completed += 1
+                stats.latencies.append(time.perf_counter() - start_time)
+            else:
+                stats.errors += 1
+
+            if interval:
+                due += interval
+                now = time.monotonic()
+                if now > due:
+                    # Frames that came due while the request was running are never sent
+                    missed = int((now - due) / interval) + 1
+                    stats.dropped += missed
+                    due += missed * interval
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+
+    async def run_ws(self):
+        server = {'frames_received': 0, 'frames_dropped': 0, 'frames_processed': 0}
+        self.server_stats = []
+        stats, elapsed = await self._run(self._ws_client)
+        for client_stats in self.server_stats:
+            for key in server:
+                server[key] += client_stats.get(key, 0)
+        return stats.report(elapsed, server=server)
+
+    def _encode_ws_frame(self, frame_id):
+        index = self.frame(frame_id)
+        if self.binary:
+            return {'bytes_data': HEADER.pack(PROTOCOL_VERSION, 0, 0, frame_id) + self.frames[index]}
+        return {'text_data': json.dumps({'type': 'detect_frame', 'image': self.data_urls[index], 'frame_id': frame_id})}
+
+    @staticmethod
+    def _decode_ws_reply(event):
+        if event.get('bytes') is not None:
+            data = event['bytes']
+            _, flags, _, frame_id = HEADER.unpack_from(data)
+            message = json.loads(data[HEADER_SIZE:])
+            return frame_id, message, bool(flags & FLAG_ERROR)
+        message = json.loads(event['text'])
+        return message.get('frame_id'), message, message.get('type') == 'error'
+
+    async def _ws_client(self, index, stats, deadline):
+        communicator = WebsocketCommunicator(self.ws_application, '/ws/detect/')
+        connected, _ = await communicator.connect(timeout=self.timeout)
+        if not connected:
+            stats.errors += 1
+            return
+        await communicator.receive_from(timeout=self.timeout)  # connection_established
+
+        pending = {}
+        replied = asyncio.Event()
+        last_message = {}
+
+        async def receive():
+            while True:
+                event = await communicator.receive_output(timeout=None)
+                if event['type'] != 'websocket.send':
+                    return
+                frame_id, message, error = self._decode_ws_reply(event)
+                sent_at = pending.pop(frame_id, None)
+                if error:
+                    stats.errors += 1
+                elif sent_at is not None:
+                    stats.completed += 1
+                    stats.latencies.append(time.perf_counter() - sent_at)
+                    last_message.update(message)
+                # Frames sent before this one that were never answered were dropped by the server
+                for stale in [sent for sent in pending if sent < (frame_id or 0)]:
+                    del pending[stale]
+                    stats.dropped += 1
+                replied.set()
+
+        receiver = asyncio.ensure_future(receive())
+        interval = 1.0 / self.fps if self.fps else 0.0
+        due = time.monotonic()
+        frame_id = index
+        try:
+            while time.monotonic() < deadline:
+                replied.clear()
+                pending[frame_id] = time.perf_counter()
+                await communicator.send_to(**self._encode_ws_frame(frame_id))
+                stats.sent += 1
+                frame_id += self.concurrency
+                if interval:
+                    due += interval
+                    await asyncio.sleep(max(0.0, due - time.monotonic()))
+                else:
+                    await asyncio.wait_for(replied.wait(), self.timeout)
+            # The newest frame is never superseded, so its reply closes the run
+            drain_deadline = time.monotonic() + self.timeout
+            while pending and time.monotonic() < drain_deadline:
+                replied.clear()
+                try:
+                    await asyncio.wait_for(replied.wait(), max(0.0, drain_deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            stats.errors += len(pending)
+            receiver.cancel()
+            await communicator.disconnect()
+        self.server_stats.append({key: last_message.get(key, 0) for key in
+                                  ('frames_received', 'frames_dropped', 'frames_processed')})
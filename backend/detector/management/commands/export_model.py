@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.engines import ENGINES, get_engine
+from detector.validation import MIN_REFERENCE_BOXES, agreement_failure, compare_detectors, load_validation_images
+from detector.yolo_detector import YOLODetector
+
+
+class Command(BaseCommand):
+    help = 'Export the trained PyTorch model for another inference engine and validate its outputs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', default='onnx',
+                            choices=[name for name, engine in ENGINES.items() if engine.export_format])
+        parser.add_argument('--model', default=None, help='PyTorch weights to export (defaults to MODEL_PATH)')
+        parser.add_argument('--imgsz', type=int, default=640)
+        parser.add_argument('--half', action='store_true', help='Export FP16 weights where the engine supports it')
+        parser.add_argument('--skip-export', action='store_true', help='Only validate an existing export')
+        parser.add_argument('--no-validate', action='store_true')
+        parser.add_argument('--images', nargs='+', default=None,
+                            help='Images or directories with traffic signs to validate on (required unless --no-validate)')
+        parser.add_argument('--limit', type=int, default=32)
+        parser.add_argument('--iou', type=float, default=0.5)
+        parser.add_argument('--min-agreement', type=float, default=0.98)
+        parser.add_argument('--min-reference-boxes', type=int, default=MIN_REFERENCE_BOXES,
+                            help='Boxes the PyTorch model must find on the images for validation to count')
+
+    def handle(self, *args, **options):
+        model_path = options['model'] or settings.MODEL_PATH
+        engine = get_engine(options['engine'])
+        if not engine.is_available():
+            raise CommandError(f'The {engine.name} engine needs: {", ".join(engine.requires)}')
+        if not options['no_validate'] and not options['images']:
+            raise CommandError('Validation needs --images of real traffic scenes (or pass --no-validate)')
+
+        if not options['skip_export']:
+            self.stdout.write(f'Exporting {model_path} to {engine.name}...')
+            artifact = engine.export(model_path, imgsz=options['imgsz'], half=options['half'])
+            self.stdout.write(f'Exported to {artifact}')
+
+        if options['no_validate']:
+            return
+
+        try:
+            images = load_validation_images(options['images'], limit=options['limit'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        reference = YOLODetector(model_path=model_path, engine='pytorch')
+        candidate = YOLODetector(model_path=model_path, engine=engine.name)
+        report = compare_detectors(reference, candidate, images, iou_threshold=options['iou'])
+
+        self.stdout.write(
+            f"{report['images']} images: {report['matched_boxes']} of "
+            f"{max(report['reference_boxes'], report['candidate_boxes'])} boxes agree "
+            f"(agreement {report['agreement']:.3f}, max confidence delta {report['max_confidence_delta']:.4f})"
+        )
+        self.stdout.write(
+            f"Latency per image: pytorch {report['reference_latency'] * 1000:.1f} ms, "
+            f"{engine.name} {report['candidate_latency'] * 1000:.1f} ms"
+        )
+        failure = agreement_failure(report, options['min_agreement'], options['min_reference_boxes'])
+        if failure:
+            raise CommandError(f'{engine.name} export failed validation: {failure}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{engine.name} export matches the PyTorch model; set INFERENCE_ENGINE={engine.name} to use it'
+        ))
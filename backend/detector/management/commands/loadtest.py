@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+
+from channels.layers import channel_layers
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+
+from detector.batching import get_scheduler
+from detector.loadtest import LoadTest, StubDetector, load_frames
+from detector.model_registry import registry
+from detector.persistence import get_write_behind
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive POST /api/detect/ and ws/detect/ in-process (in-memory channel layer) and report '
+        'throughput, p50/p95/p99 latency and dropped frames as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['rest', 'ws'], action='append', dest='targets',
+                            help='Endpoint to load (repeatable; defaults to both, one after the other)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+        parser.add_argument('--fps', type=float, default=0.0,
+                            help='Frames per second per client; 0 sends the next frame once the last one returned')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per target')
+        parser.add_argument('--images', nargs='*', default=None,
+                            help='Image files or directories to send (defaults to synthetic frames)')
+        parser.add_argument('--frames', type=int, default=16, help='Distinct frames to cycle through')
+        parser.add_argument('--width', type=int, default=1280, help='Synthetic frame width')
+        parser.add_argument('--height', type=int, default=720, help='Synthetic frame height')
+        parser.add_argument('--quality', type=int, default=85, help='JPEG quality of the sent frames')
+        parser.add_argument('--frame-cache', action='store_true',
+                            help='Keep the frame cache on; frames cycle, so most of them would be cache hits')
+        parser.add_argument('--binary', action='store_true', help='Use the binary WebSocket protocol')
+        parser.add_argument('--detector', choices=['stub', 'real'], default='stub',
+                            help='stub replaces the forward pass with a fixed latency')
+        parser.add_argument('--stub-batch-ms', type=float, default=20.0, help='Stub latency per forward pass')
+        parser.add_argument('--stub-image-ms', type=float, default=2.0, help='Stub latency per image of a batch')
+        parser.add_argument('--user', default='loadtest',
+                            help='User the clients authenticate as (created if missing)')
+        parser.add_argument('--persist', action='store_true',
+                            help='Save results and rollups in the configured database; by default the run '
+                                 'writes to a throwaway test database that is dropped afterwards')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for one result')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['persist']:
+            report = self.run(options)
+        else:
+            # Persistence is part of the measured path, so it still runs, but
+            # against a fresh copy of the schema instead of real user data
+            database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            self.stderr.write('Writing results to a throwaway test database')
+            try:
+                report = self.run(options)
+                get_write_behind().flush()
+            finally:
+                connection.creation.destroy_test_db(database_name, verbosity=0)
+
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(f'Wrote {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        # Keep the run self-contained: no Redis, no other process sees the traffic
+        settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        channel_layers.backends = {}
+
+        # ultralytics logs every prediction to stdout, which would corrupt the report
+        logging.getLogger('ultralytics').setLevel(logging.WARNING)
+        settings.FRAME_CACHE_ENABLED = options['frame_cache']
+        if options['detector'] == 'stub':
+            # The stub sleeps in-process; worker processes would only load the real model
+            settings.INFERENCE_WORKERS = 0
+            registry.install(StubDetector(options['stub_batch_ms'] / 1000.0, options['stub_image_ms'] / 1000.0))
+        scheduler = get_scheduler()
+
+        try:
+            frames = load_frames(options['images'], options['frames'], options['width'], options['height'],
+                                 options['quality'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not frames:
+            raise CommandError('No frames to send')
+
+        # The first forward pass pays for lazy initialization; keep it out of the numbers
+        scheduler.detect(scheduler.detector.decode_bytes(frames[0]))
+
+        user, created = User.objects.get_or_create(username=options['user'])
+        if created:
+            user.set_unusable_password()
+            user.save()
+
+        from traffic_sign_detector.asgi import application
+        from detector.routing import websocket_urlpatterns
+        load_test = LoadTest(
+            application, websocket_urlpatterns, frames, user, str(AccessToken.for_user(user)),
+            concurrency=options['concurrency'],
+            fps=options['fps'],
+            duration=options['duration'],
+            binary=options['binary'],
+            timeout=options['timeout'],
+        )
+
+        report = {
+            'config': {
+                key: options[key] for key in (
+                    'concurrency', 'fps', 'duration', 'binary', 'frame_cache', 'detector',
+                    'stub_batch_ms', 'stub_image_ms', 'persist',
+                )
+            },
+            'frames': {
+                'count': len(frames),
+                'avg_bytes': sum(len(frame) for frame in frames) // len(frames),
+                'source': 'files' if options['images'] else f"synthetic {options['width']}x{options['height']}",
+            },
+            'model': scheduler.detector.model_info(),
+        }
+        for target in options['targets'] or ['rest', 'ws']:
+            self.stderr.write(f'Loading {target} with {options["concurrency"]} clients for {options["duration"]}s')
+            runner = load_test.run_rest if target == 'rest' else load_test.run_ws
+            report[target] = asyncio.run(runner())
+        report['scheduler'] = {
+            key: value for key, value in scheduler.stats().items()
+            if key in ('batch_size', 'queue_wait', 'batches_by_imgsz', 'frame_cache')
+        }
+        return report
@@ -0,0 +1,87 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.validation import MIN_REFERENCE_BOXES, agreement_failure, compare_detectors, load_validation_images
+from detector.yolo_detector import YOLODetector
+
+
+class Command(BaseCommand):
+    help = (
+        'Quantize the model to INT8 and promote it for the onnx-int8 engine only if its '
+        'detections agree with the FP32 model'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=None, help='PyTorch weights to quantize (defaults to MODEL_PATH)')
+        parser.add_argument('--mode', default='static', choices=['static', 'dynamic'])
+        parser.add_argument('--imgsz', type=int, default=640)
+        parser.add_argument('--calibration', nargs='+', default=None,
+                            help='Calibration images or directories of real traffic scenes (required for static mode)')
+        parser.add_argument('--calibration-limit', type=int, default=64)
+        parser.add_argument('--reference', nargs='+', required=True,
+                            help='Reference images or directories with traffic signs for the agreement gate')
+        parser.add_argument('--reference-limit', type=int, default=32)
+        parser.add_argument('--iou', type=float, default=0.5)
+        parser.add_argument('--min-agreement', type=float, default=None,
+                            help='Defaults to QUANTIZATION_MIN_AGREEMENT')
+        parser.add_argument('--min-reference-boxes', type=int, default=MIN_REFERENCE_BOXES,
+                            help='Boxes the FP32 model must find on the reference set for the gate to count')
+        parser.add_argument('--dry-run', action='store_true', help='Evaluate the candidate but never promote it')
+
+    def handle(self, *args, **options):
+        try:
+            from detector import quantization
+        except ImportError as e:
+            raise CommandError(f'Quantization needs onnx and onnxruntime: {e}')
+
+        model_path = options['model'] or settings.MODEL_PATH
+        min_agreement = options['min_agreement']
+        if min_agreement is None:
+            min_agreement = settings.QUANTIZATION_MIN_AGREEMENT
+
+        try:
+            calibration = None
+            if options['mode'] == 'static':
+                if not options['calibration']:
+                    raise CommandError('Static quantization needs --calibration images of real traffic scenes')
+                calibration = load_validation_images(options['calibration'], limit=options['calibration_limit'])
+                self.stdout.write(f'Calibrating on {len(calibration)} images...')
+            reference_images = load_validation_images(options['reference'], limit=options['reference_limit'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        candidate = quantization.quantize(model_path, calibration, mode=options['mode'], imgsz=options['imgsz'])
+        self.stdout.write(f'Wrote INT8 candidate {candidate}')
+
+        reference = YOLODetector(model_path=model_path, engine='pytorch')
+        quantized = YOLODetector(model_path=candidate, engine='onnx')
+        report = compare_detectors(reference, quantized, reference_images, iou_threshold=options['iou'])
+        report.update(mode=options['mode'], min_agreement=min_agreement)
+
+        self.stdout.write(
+            f"{report['images']} reference images, {report['reference_boxes']} reference boxes: "
+            f"agreement {report['agreement']:.3f} (min {min_agreement}), "
+            f"max confidence delta {report['max_confidence_delta']:.4f}"
+        )
+        self.stdout.write(
+            f"Latency per image: fp32 {report['reference_latency'] * 1000:.1f} ms, "
+            f"int8 {report['candidate_latency'] * 1000:.1f} ms"
+        )
+
+        failure = agreement_failure(report, min_agreement, options['min_reference_boxes'])
+        if failure:
+            os.remove(candidate)
+            raise CommandError(f'INT8 model rejected: {failure}')
+        if options['dry_run']:
+            self.stdout.write(f'Dry run: candidate left at {candidate}')
+            return
+
+        promoted = quantization.promote(model_path)
+        with open(promoted + '.json', 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Promoted {promoted}; set INFERENCE_ENGINE=onnx-int8 to serve it'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from detector import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily detection statistics rollups from the raw detection tables'
+
+    def handle(self, *args, **options):
+        detection_rows, class_rows = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {detection_rows} daily detection rows and {class_rows} daily class rows'
+        ))
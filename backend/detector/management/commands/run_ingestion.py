@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detector.batching import get_scheduler
+from detector.ingestion import IngestionManager
+
+
+class Command(BaseCommand):
+    help = 'Read enabled camera sources server-side and publish their detections on ws/cameras/<id>/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', type=int, action='append', dest='sources',
+                            help='Only ingest this CameraSource id (repeatable)')
+        parser.add_argument('--refresh-interval', type=float, default=settings.INGESTION_REFRESH_SECONDS,
+                            help='Seconds between re-reading the camera sources')
+        parser.add_argument('--duration', type=float, default=None,
+                            help='Stop after this many seconds')
+
+    def handle(self, *args, **options):
+        manager = IngestionManager(
+            get_scheduler(),
+            source_ids=options['sources'],
+            reconnect_max_delay=settings.INGESTION_RECONNECT_MAX_DELAY,
+        )
+        deadline = time.monotonic() + options['duration'] if options['duration'] else None
+        idle = False
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                for source in manager.sync():
+                    self.stdout.write(f'Ingesting camera {source.id} ({source.name}) from {source.url}')
+                if not manager.workers and not idle:
+                    self.stdout.write('No enabled camera sources, waiting')
+                idle = not manager.workers
+                wait = options['refresh_interval']
+                if deadline is not None:
+                    wait = min(wait, max(0.0, deadline - time.monotonic()))
+                time.sleep(wait)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stats = manager.stats()
+            manager.stop()
+            for camera_id, camera_stats in stats.items():
+                self.stdout.write(
+                    f'Camera {camera_id}: {camera_stats["frames_captured"]} frames captured, '
+                    f'{camera_stats["frames_processed"]} processed, {camera_stats["frames_dropped"]} dropped, '
+                    f'{camera_stats["reconnects"]} reconnects'
+                )
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from detector.models import VideoJob
+from detector.model_registry import acquire_detector, release_detector
+from detector.video import claim_next_job, process_job
+
+
+class Command(BaseCommand):
+    help = 'Process uploaded videos from the job queue; interrupted jobs resume where they stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Frames per forward pass (defaults to INFERENCE_MAX_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        detector = acquire_detector()
+        job = None
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'Processing video job {job.id} from frame {job.last_frame_index + 1}')
+                job = process_job(job, detector, batch_size=options['batch_size'])
+                if job.status == job.STATUS_RUNNING:
+                    self.stdout.write(self.style.WARNING(f'Video job {job.id} was taken over by another worker'))
+                    continue
+                style = self.style.SUCCESS if job.status == job.STATUS_COMPLETED else self.style.ERROR
+                self.stdout.write(style(
+                    f'Video job {job.id} {job.status}: {job.frames_processed} frames, '
+                    f'{job.signs_detected} signs'
+                ))
+        except KeyboardInterrupt:
+            if job is not None:
+                # Hand the job back right away instead of waiting for its heartbeat to go stale
+                VideoJob.objects.filter(
+                    pk=job.pk, status=VideoJob.STATUS_RUNNING, claimed_by=job.claimed_by
+                ).update(status=VideoJob.STATUS_QUEUED)
+            self.stdout.write('Stopping; the current job resumes from its last saved frame')
+        finally:
+            release_detector(detector)
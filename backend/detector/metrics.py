@@ -0,0 +1,260 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Metrics are plain thread-safe objects updated inline on the hot path (a lock
+and an addition). Module-level metrics are registered in REGISTRY when they
+are created; components that own per-instance metrics (schedulers, caches,
+the write-behind queue) register a collector that yields them at scrape time.
+GET /metrics renders everything in the Prometheus text format.
+"""
+import bisect
+import threading
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with fixed upper-bound buckets.
+    """
+
+    def __init__(self, name, buckets):
+        self.name = name
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative = 0
+        buckets = []
+        for bound, bucket_count in zip(self.buckets + [float('inf')], counts):
+            cumulative += bucket_count
+            buckets.append({'le': bound if bound != float('inf') else '+Inf', 'count': cumulative})
+
+        return {
+            'name': self.name,
+            'count': count,
+            'sum': total,
+            'avg': total / count if count else 0.0,
+            'buckets': buckets,
+        }
+
+
+class Counter:
+    """
+    Thread-safe monotonically increasing counter.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge:
+    """
+    Thread-safe value that can go up and down. With a callback, the value is
+    read from it at scrape time instead.
+    """
+
+    def __init__(self, name, callback=None):
+        self.name = name
+        self.callback = callback
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        if self.callback is not None:
+            return self.callback()
+        return self._value
+
+
+class Family:
+    """
+    A metric with labels: one child metric per combination of label values,
+    created on first use.
+    """
+
+    def __init__(self, name, labelnames, factory):
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory(self.name))
+        return child
+
+    def children(self):
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+
+def _metric_type(metric):
+    if isinstance(metric, Histogram):
+        return 'histogram'
+    if isinstance(metric, Counter):
+        return 'counter'
+    return 'gauge'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric, documentation=''):
+        with self._lock:
+            self._metrics.append((metric, documentation))
+        return metric
+
+    def register_collector(self, collector):
+        """
+        collector() yields (metric, labels) pairs at scrape time
+        """
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def collect(self):
+        """
+        Yield (metric, labels, documentation) for every sample source
+        """
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        for metric, documentation in metrics:
+            if isinstance(metric, Family):
+                for labels, child in metric.children():
+                    yield child, labels, documentation
+            else:
+                yield metric, {}, documentation
+        for collector in collectors:
+            for metric, labels in collector():
+                yield metric, labels, ''
+
+    def exposition(self):
+        """
+        Render all metrics in the Prometheus text format (version 0.0.4)
+        """
+        families = {}
+        for metric, labels, documentation in self.collect():
+            family = families.setdefault(metric.name, {'type': _metric_type(metric), 'help': '', 'samples': []})
+            family['help'] = family['help'] or documentation
+            family['samples'].append((metric, labels))
+
+        lines = []
+        for name, family in families.items():
+            if family['help']:
+                lines.append(f'# HELP {name} {family["help"]}')
+            lines.append(f'# TYPE {name} {family["type"]}')
+            for metric, labels in family['samples']:
+                if family['type'] == 'histogram':
+                    snapshot = metric.snapshot()
+                    for bucket in snapshot['buckets']:
+                        le = '+Inf' if bucket['le'] == '+Inf' else _format_value(float(bucket['le']))
+                        lines.append(f'{name}_bucket{_format_labels(dict(labels, le=le))} {bucket["count"]}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(float(snapshot["sum"]))}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {snapshot["count"]}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(metric.value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+END_TO_END_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+realtime_frames_received = REGISTRY.register(
+    Counter('realtime_frames_received_total'), 'Frames received on realtime WebSocket sessions')
+realtime_frames_dropped = REGISTRY.register(
+    Counter('realtime_frames_dropped_total'), 'Frames superseded by a newer frame before processing')
+fanout_messages_published = REGISTRY.register(
+    Counter('fanout_messages_published_total'), 'Results broadcast to stream viewers')
+fanout_messages_delivered = REGISTRY.register(
+    Counter('fanout_messages_delivered_total'), 'Results sent to stream viewers')
+fanout_messages_dropped = REGISTRY.register(
+    Counter('fanout_messages_dropped_total'), 'Results skipped for viewers that could not keep up')
+
+# Per-image time of each model stage as measured by the predictor; postprocess
+# includes packing the boxes into arrays
+inference_stage_seconds = REGISTRY.register(
+    Family('inference_stage_seconds', ['stage'], lambda name: Histogram(name, STAGE_BUCKETS)),
+    'Per-image time spent in each inference stage')
+persist_seconds = REGISTRY.register(
+    Histogram('detection_persist_seconds', STAGE_BUCKETS), 'Time to write one batch of detections to the database')
+websocket_latency_seconds = REGISTRY.register(
+    Histogram('websocket_frame_latency_seconds', END_TO_END_BUCKETS),
+    'Time from receiving a frame on a WebSocket to sending its result')
+frames_total = REGISTRY.register(
+    Family('detection_frames_total', ['model', 'engine'], Counter), 'Frames run through the model')
+detection_errors_total = REGISTRY.register(
+    Family('detection_errors_total', ['model', 'engine'], Counter), 'Frames that failed inference')
+detections_total = REGISTRY.register(
+    Family('detections_total', ['model', 'class_name'], Counter), 'Detected signs by class')
+websocket_sessions = REGISTRY.register(
+    Family('websocket_sessions', ['consumer'], Gauge), 'Open WebSocket sessions')
+
+
+def observe_stage_timings(timings):
+    """
+    Record per-image stage timings as returned by YOLODetector.predict_timed
+    """
+    for timing in timings:
+        for stage, seconds in timing.items():
+            inference_stage_seconds.labels(stage).observe(seconds)
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('detector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDetectionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('detections_total', models.IntegerField(default=0)),
+                ('signs_total', models.IntegerField(default=0)),
+                ('processing_time_sum', models.FloatField(default=0.0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_detection_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyClassStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('class_name', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_class_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day', '-count'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailydetectionstats',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='unique_user_daily_detection_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailydetectionstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('day',), name='unique_global_daily_detection_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyclassstats',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'class_name'), name='unique_user_daily_class_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyclassstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('day', 'class_name'), name='unique_global_daily_class_stats'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0002_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='detection',
+            options={'ordering': ['-timestamp', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='detection',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='detection_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detection',
+            index=models.Index(fields=['-timestamp', '-id'], name='detection_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionresult',
+            index=models.Index(fields=['class_name', 'detection'], name='result_class_detection_idx'),
+        ),
+    ]
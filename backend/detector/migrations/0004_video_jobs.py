@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-16 22:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('detector', '0003_detection_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video', models.FileField(upload_to='videos/')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('sample_fps', models.FloatField(default=5.0)),
+                ('total_frames', models.IntegerField(blank=True, null=True)),
+                ('last_frame_index', models.IntegerField(default=-1)),
+                ('frames_processed', models.IntegerField(default=0)),
+                ('signs_detected', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='frame_index',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videojob',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='video_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='detections', to='detector.videojob'),
+        ),
+        migrations.AddIndex(
+            model_name='detection',
+            index=models.Index(fields=['job', 'frame_index'], name='detection_job_frame_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videojob',
+            index=models.Index(fields=['status', 'created_at'], name='videojob_status_idx'),
+        ),
+    ]
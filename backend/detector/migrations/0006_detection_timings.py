@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detector', '0005_camera_sources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='engine',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='model_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
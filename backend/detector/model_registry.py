@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .yolo_detector import YOLODetector
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded detectors.
+
+    Detectors are keyed by (engine, model path, config) and loaded at most once
+    per process; every consumer and view shares the same instance. Callers
+    acquire a detector and release it when done so the registry knows which
+    models are in use.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @staticmethod
+    def make_key(model_path=None, engine=None, **config):
+        engine = engine or settings.INFERENCE_ENGINE
+        model_path = os.path.abspath(model_path or settings.MODEL_PATH)
+        return (engine, model_path, tuple(sorted(config.items())))
+
+    def _get_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {
+                    'key': key,
+                    'detector': None,
+                    'refs': 0,
+                    'loaded_at': None,
+                    'last_used': None,
+                    'load_time': 0.0,
+                    'load_lock': threading.Lock(),
+                }
+                self._entries[key] = entry
+            return entry
+
+    def _load(self, entry):
+        engine, model_path, config = entry['key']
+        start_time = time.time()
+        config = dict(config)
+        if config.get('workers'):
+            # Forward passes run in a pool of worker processes
+            from .process_pool import ProcessPoolDetector
+            detector = ProcessPoolDetector(model_path=model_path, engine=engine, **config)
+        else:
+            config.pop('workers', None)
+            detector = YOLODetector(model_path=model_path, engine=engine, **config)
+        entry['load_time'] = time.time() - start_time
+        entry['loaded_at'] = time.time()
+        return detector
+
+    def acquire(self, model_path=None, engine=None, **config):
+        """
+        Return the shared detector for the given model, loading it on first use.
+        Every call must be paired with release().
+        """
+        key = self.make_key(model_path, engine, **config)
+        entry = self._get_entry(key)
+
+        if entry['detector'] is None:
+            # Per-model lock so a slow load does not block other models
+            with entry['load_lock']:
+                if entry['detector'] is None:
+                    entry['detector'] = self._load(entry)
+
+        with self._lock:
+            entry['refs'] += 1
+            entry['last_used'] = time.time()
+        return entry['detector']
+
+    def install(self, detector, model_path=None, engine=None, **config):
+        """
+        Serve an already-built detector (e.g. the load-test stub) for the given
+        key instead of loading the model
+        """
+        entry = self._get_entry(self.make_key(model_path, engine, **config))
+        with entry['load_lock']:
+            entry['detector'] = detector
+            entry['loaded_at'] = time.time()
+
+    def release(self, detector):
+        with self._lock:
+            for entry in self._entries.values():
+                if entry['detector'] is detector:
+                    entry['refs'] = max(entry['refs'] - 1, 0)
+                    entry['last_used'] = time.time()
+                    return
+
+    def describe(self):
+        """
+        Report resident models, their reference counts and memory footprint.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+
+        report = []
+        for entry in entries:
+            detector = entry['detector']
+            if detector is None:
+                continue
+            engine, model_path, config = entry['key']
+            report.append({
+                'engine': engine,
+                'model_path': model_path,
+                'config': dict(config),
+                'refs': entry['refs'],
+                'loaded_at': entry['loaded_at'],
+                'last_used': entry['last_used'],
+                'load_time': round(entry['load_time'], 3),
+                'memory_bytes': detector.memory_footprint(),
+            })
+        return report
+
+
+registry = ModelRegistry()
+
+
+def acquire_detector(model_path=None, engine=None, **config):
+    return registry.acquire(model_path, engine, **config)
+
+
+def release_detector(detector):
+    registry.release(detector)
@@ -1,8 +1,84 @@
 from django.db import models
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+class VideoJob(models.Model):
+    """
+    An uploaded video processed in the background by `manage.py run_video_worker`.
+    last_frame_index is committed together with each batch of results, so an
+    interrupted job resumes after the last persisted frame. claimed_by is a
+    token that changes on every claim; a worker only writes to the job while
+    the token is still its own.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_jobs', null=True, blank=True)
+    video = models.FileField(upload_to='videos/')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    sample_fps = models.FloatField(default=5.0)  # frames analysed per second of video
+    total_frames = models.IntegerField(null=True, blank=True)
+    last_frame_index = models.IntegerField(default=-1)
+    frames_processed = models.IntegerField(default=0)
+    signs_detected = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='videojob_status_idx'),
+        ]
+    
+    @property
+    def progress(self):
+        if self.status == self.STATUS_COMPLETED:
+            return 1.0
+        if not self.total_frames:
+            return 0.0
+        return min((self.last_frame_index + 1) / self.total_frames, 1.0)
+    
+    def __str__(self):
+        return f"VideoJob {self.id} ({self.status})"
+
+
+class CameraSource(models.Model):
+    """
+    A fixed camera read server-side by `manage.py run_ingestion`: an RTSP or
+    HTTP stream, or a local video file (replayed in a loop at its own frame rate).
+    Results are published on ws/cameras/<id>/.
+    """
+    name = models.CharField(max_length=100)
+    url = models.CharField(max_length=500)  # rtsp://, http(s):// or a local path
+    enabled = models.BooleanField(default=True)
+    max_fps = models.FloatField(default=5.0)  # inference rate; capture follows the source
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='camera_sources', null=True, blank=True)
+    persist_detections = models.BooleanField(default=False)  # saved for `user`
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name', 'id']
+    
+    def __str__(self):
+        return f"{self.name} ({self.url})"
+
+
 class Detection(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='detections', null=True, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
@@ -10,9 +86,22 @@ class Detection(models.Model):
     detections_count = models.IntegerField(default=0)
     confidence_avg = models.FloatField(default=0.0)
     processing_time = models.FloatField(default=0.0)  # in seconds
+    # Set for frames of an uploaded video
+    job = models.ForeignKey(VideoJob, on_delete=models.CASCADE, related_name='detections', null=True, blank=True)
+    frame_index = models.IntegerField(null=True, blank=True)
+    # Per-stage breakdown of processing_time in milliseconds, see detector.timings
+    timings = models.JSONField(null=True, blank=True)
+    model_name = models.CharField(max_length=100, blank=True)
+    engine = models.CharField(max_length=20, blank=True)
     
     class Meta:
-        ordering = ['-timestamp']
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            # History and stats are always read per user, newest first
+            models.Index(fields=['user', '-timestamp', '-id'], name='detection_user_recent_idx'),
+            models.Index(fields=['-timestamp', '-id'], name='detection_recent_idx'),
+            models.Index(fields=['job', 'frame_index'], name='detection_job_frame_idx'),
+        ]
     
     def __str__(self):
         user_info = f" - {self.user.username}" if self.user else ""
@@ -28,5 +117,63 @@ class DetectionResult(models.Model):
     bbox_width = models.FloatField()
     bbox_height = models.FloatField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['class_name', 'detection'], name='result_class_detection_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.class_name} ({self.confidence:.2f})"
+
+class DailyDetectionStats(models.Model):
+    """
+    Per-day detection totals maintained incrementally as detections are saved.
+    Rows with user=None hold the global totals across all users.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_detection_stats', null=True, blank=True)
+    day = models.DateField()
+    detections_total = models.IntegerField(default=0)
+    signs_total = models.IntegerField(default=0)
+    processing_time_sum = models.FloatField(default=0.0)
+    confidence_sum = models.FloatField(default=0.0)
+    
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_user_daily_detection_stats'),
+            models.UniqueConstraint(fields=['day'], condition=models.Q(user__isnull=True),
+                                    name='unique_global_daily_detection_stats'),
+        ]
+    
     def __str__(self):
-        return f"{self.class_name} ({self.confidence:.2f})" 
\ No newline at end of file
+        scope = self.user.username if self.user else 'global'
+        return f"{scope} - {self.day}: {self.detections_total} detections"
+
+
+class DailyClassStats(models.Model):
+    """
+    Per-day count of detected signs by class, maintained alongside DailyDetectionStats.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_class_stats', null=True, blank=True)
+    day = models.DateField()
+    class_name = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-day', '-count']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'class_name'], name='unique_user_daily_class_stats'),
+            models.UniqueConstraint(fields=['day', 'class_name'], condition=models.Q(user__isnull=True),
+                                    name='unique_global_daily_class_stats'),
+        ]
+    
+    def __str__(self):
+        scope = self.user.username if self.user else 'global'
+        return f"{scope} - {self.day} - {self.class_name}: {self.count}"
+
+
+@receiver(pre_delete, sender=Detection)
+def remove_detection_from_rollups(sender, instance, **kwargs):
+    # pre_delete runs before the cascade removes the DetectionResult rows
+    from .rollups import remove_detection
+    remove_detection(instance)
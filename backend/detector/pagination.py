@@ -0,0 +1,50 @@
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, pk):
+    """
+    Opaque cursor pointing just past the given row in (-timestamp, -id) order
+    """
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError
+        return timestamp, int(pk)
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def keyset_page(queryset, cursor=None, limit=50):
+    """
+    Return (items, next_cursor) for a values() queryset ordered by (-timestamp, -id).
+
+    Instead of OFFSET, each page starts strictly after the last row of the
+    previous page, so with the (user, -timestamp, -id) index every page costs
+    the same no matter how far back the client has scrolled.
+    """
+    queryset = queryset.order_by('-timestamp', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+    # Fetch one extra row to know whether another page exists
+    items = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        last = items[limit - 1]
+        next_cursor = encode_cursor(last['timestamp'], last['id'])
+    return items[:limit], next_cursor
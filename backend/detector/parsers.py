@@ -0,0 +1,88 @@
+import json
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser
+
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Image upload is too large.'
+    default_code = 'upload_too_large'
+
+
+def upload_limit_detail(limit):
+    return f'Image upload exceeds the {limit} byte limit'
+
+
+class RawImageParser(BaseParser):
+    """
+    Parses a raw image/jpeg, image/png (or any image/*) request body.
+
+    The body is read in chunks into a single buffer sized from Content-Length
+    and returned as a memoryview under 'image', so the decoder reads the
+    upload without further copies. Bodies over DETECT_MAX_UPLOAD_BYTES are
+    rejected with 413 as soon as the limit is crossed.
+    """
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError('Empty image body')
+
+        limit = settings.DETECT_MAX_UPLOAD_BYTES
+        request = parser_context['request']
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > limit:
+            raise UploadTooLarge(upload_limit_detail(limit))
+
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            end = received + len(chunk)
+            if end > limit:
+                raise UploadTooLarge(upload_limit_detail(limit))
+            if end <= length:
+                view[received:end] = chunk
+            else:
+                # Body longer than announced (or no Content-Length): grow the buffer
+                view.release()
+                buffer[received:] = chunk
+                view = memoryview(buffer)
+            received = end
+
+        if not received:
+            raise ParseError('Empty image body')
+        return {'image': view[:received]}
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON: one object per line, returned as a list.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        items = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f'Line {number}: invalid JSON ({e})')
+        return items
@@ -0,0 +1,213 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .metrics import REGISTRY, Counter, Gauge, Histogram, persist_seconds
+from .models import Detection, DetectionResult
+from .rollups import apply_detections
+from . import timings
+
+
+logger = logging.getLogger(__name__)
+
+FLUSH_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+
+def _build_detection(result, user_id=None, timestamp=None, job_id=None):
+    return Detection(
+        user_id=user_id,
+        timestamp=timestamp or timezone.now(),
+        detections_count=result['detections_count'],
+        confidence_avg=result['confidence_avg'],
+        processing_time=result['processing_time'],
+        job_id=job_id,
+        frame_index=result.get('frame_index'),
+        timings=timings.compact(result.get('timings')),
+        model_name=result.get('model', {}).get('name', ''),
+        engine=result.get('model', {}).get('engine', '')
+    )
+
+
+def _build_results(detection, result):
+    return [
+        DetectionResult(
+            detection=detection,
+            class_name=det['class_name'],
+            confidence=det['confidence'],
+            bbox_x=det['bbox_x'],
+            bbox_y=det['bbox_y'],
+            bbox_width=det['bbox_width'],
+            bbox_height=det['bbox_height']
+        )
+        for det in result['detections']
+    ]
+
+
+def save_detections(items, job_id=None):
+    """
+    Persist many frames at once: one bulk insert for the Detection rows and one
+    for all of their DetectionResult rows, plus the matching rollup updates.
+    `items` is a list of (user_id, result, timestamp) tuples; frames of a video
+    job pass its job_id and carry their frame_index in the result.
+    """
+    if not items:
+        return []
+
+    start_time = time.perf_counter()
+    with transaction.atomic():
+        detections = Detection.objects.bulk_create([
+            _build_detection(result, user_id, timestamp, job_id) for user_id, result, timestamp in items
+        ])
+        rows = []
+        for detection, (_, result, _) in zip(detections, items):
+            rows.extend(_build_results(detection, result))
+        DetectionResult.objects.bulk_create(rows)
+        apply_detections(items)
+    persist_seconds.observe(time.perf_counter() - start_time)
+    return detections
+
+
+def save_detection(result, user=None):
+    """
+    Persist a single frame with one bulk insert for its results
+    """
+    user_id = user.pk if user is not None else None
+    return save_detections([(user_id, result, timezone.now())])[0]
+
+
+class WriteBehindQueue:
+    """
+    Bounded buffer of detection results persisted by a background thread.
+
+    Realtime consumers enqueue results and return immediately; the flusher
+    writes everything buffered in one transaction every `flush_interval`
+    seconds, or sooner once `batch_size` frames are waiting. When the buffer
+    is full new results are rejected rather than blocking the caller.
+    """
+
+    def __init__(self, max_pending=10000, batch_size=500, flush_interval=1.0):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self.enqueued = Counter('detection_write_behind_enqueued_total')
+        self.rejected = Counter('detection_write_behind_rejected_total')
+        self.flushed = Counter('detection_write_behind_flushed_total')
+        self.failed = Counter('detection_write_behind_failed_total')
+        self.flush_latency = Histogram('detection_write_behind_flush_seconds', FLUSH_LATENCY_BUCKETS)
+        self._thread = threading.Thread(target=self._run, name='detection-write-behind', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, result, user_id=None):
+        """
+        Buffer a result for persistence. Returns False if the buffer is full.
+        """
+        if self._stopped:
+            return False
+        try:
+            # Stamp now so rows keep the capture time, not the flush time
+            self._queue.put_nowait((user_id, result, timezone.now()))
+        except queue.Full:
+            self.rejected.inc()
+            return False
+        self.enqueued.inc()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """
+        Write out everything currently buffered. Returns the number of frames written.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                items = []
+                while len(items) < self.batch_size:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not items:
+                    return written
+
+                start_time = time.monotonic()
+                try:
+                    save_detections(items)
+                    self.flushed.inc(len(items))
+                    written += len(items)
+                except Exception:
+                    self.failed.inc(len(items))
+                    logger.exception('Failed to persist %d buffered detections', len(items))
+                finally:
+                    self.flush_latency.observe(time.monotonic() - start_time)
+
+    def close(self):
+        """
+        Stop accepting results and flush what is left; called on shutdown
+        """
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+        close_old_connections()
+
+    def stats(self):
+        return {
+            'queue_depth': self.depth(),
+            'max_pending': self._queue.maxsize,
+            'enqueued': self.enqueued.value,
+            'rejected': self.rejected.value,
+            'flushed': self.flushed.value,
+            'failed': self.failed.value,
+            'flush_latency': self.flush_latency.snapshot(),
+        }
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            # The flusher owns a long-lived thread-local DB connection
+            close_old_connections()
+
+
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind():
+    global _write_behind
+    with _write_behind_lock:
+        if _write_behind is None:
+            _write_behind = WriteBehindQueue(
+                max_pending=settings.DETECTION_WRITE_BEHIND_MAX_PENDING,
+                batch_size=settings.DETECTION_WRITE_BEHIND_BATCH_SIZE,
+                flush_interval=settings.DETECTION_WRITE_BEHIND_FLUSH_INTERVAL,
+            )
+            atexit.register(_write_behind.close)
+        return _write_behind
+
+
+def _collect_write_behind_metrics():
+    # Only report the queue once something has started it
+    write_behind = _write_behind
+    if write_behind is None:
+        return
+    yield Gauge('detection_write_behind_queue_depth', callback=write_behind.depth), {}
+    for metric in (write_behind.enqueued, write_behind.rejected, write_behind.flushed, write_behind.failed,
+                   write_behind.flush_latency):
+        yield metric, {}
+
+
+REGISTRY.register_collector(_collect_write_behind_metrics)
@@ -0,0 +1,276 @@
+"""
+Multi-process inference pool.
+
+Each worker process holds its own copy of the model and owns a shared-memory
+ring of frame slots. The parent copies frames straight into a worker's slots
+and only sends small slot descriptors over the request queue, so frames are
+never pickled. Workers reply with compact float32 detection arrays and
+per-image stage timings.
+
+A worker that dies, times out or loses track of a request is terminated and
+replaced before it serves another batch, so a late reply can never reach the
+next caller and its slots are never rewritten while it may still read them.
+"""
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from .columns import class_name_array
+from .engines import get_engine
+from .yolo_detector import YOLODetector
+
+
+logger = logging.getLogger(__name__)
+
+WORKER_READY_TIMEOUT = 300
+BATCH_TIMEOUT = 120
+
+
+class WorkerFailed(RuntimeError):
+    """
+    The worker is unusable (dead, hung or out of step) and must be replaced
+    """
+
+
+def _worker_main(model_path, conf, engine, threads, shm_name, slot_bytes, requests, replies):
+    """
+    Entry point of a worker process: load the model once, then serve batches
+    of slot descriptors until a None sentinel arrives.
+    """
+    import torch
+    torch.set_num_threads(max(1, threads))
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        try:
+            detector = YOLODetector(model_path=model_path, conf=conf, engine=engine)
+        except Exception as e:
+            replies.put((None, 'error', str(e)))
+            return
+        replies.put((None, 'ready', None))
+
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            request_id, descriptors, imgsz = request
+            try:
+                images = [
+                    np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                    for slot, shape in descriptors
+                ]
+                arrays, timings = detector.predict_timed(images, imgsz)
+                replies.put((request_id, 'ok', ([(len(a), a.tobytes()) for a in arrays], timings)))
+            except Exception as e:
+                replies.put((request_id, 'error', str(e)))
+            finally:
+                images = None
+    finally:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, context, index, model_path, conf, engine, threads, slots, slot_bytes):
+        self.index = index
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._request_ids = itertools.count()
+        self.requests = context.Queue()
+        self.replies = context.Queue()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(model_path, conf, engine, threads, self.shm.name, slot_bytes, self.requests, self.replies),
+            name=f'inference-worker-{index}',
+            daemon=True,
+        )
+        self.process.start()
+
+    def wait_ready(self):
+        deadline = time.monotonic() + WORKER_READY_TIMEOUT
+        while True:
+            try:
+                _, status, error = self.replies.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    self.stop(graceful=False)
+                    raise RuntimeError(f'Inference worker {self.index} failed to start')
+        if status != 'ready':
+            self.stop(graceful=False)
+            raise RuntimeError(f'Inference worker {self.index} failed to start: {error}')
+
+    def write_frame(self, slot, image):
+        view = np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = image
+
+    def run(self, images, imgsz=None):
+        """
+        Run one batch. Raises WorkerFailed when the worker has to be replaced
+        and RuntimeError when only this batch failed.
+        """
+        descriptors = []
+        for slot, image in enumerate(images):
+            self.write_frame(slot, image)
+            descriptors.append((slot, image.shape))
+        request_id = next(self._request_ids)
+        self.requests.put((request_id, descriptors, imgsz))
+
+        deadline = time.monotonic() + BATCH_TIMEOUT
+        while True:
+            try:
+                reply_id, status, payload = self.replies.get(timeout=1.0)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise WorkerFailed(f'Inference worker {self.index} died')
+                if time.monotonic() > deadline:
+                    raise WorkerFailed(f'Inference worker {self.index} timed out')
+                continue
+            except Exception as e:
+                raise WorkerFailed(f'Inference worker {self.index} sent an unreadable reply: {e}')
+            if reply_id == request_id:
+                break
+            # Requests are served one at a time, so any other reply is stale
+            logger.warning('Discarding stale reply %s from inference worker %s', reply_id, self.index)
+
+        if status != 'ok':
+            raise RuntimeError(payload)
+        arrays, timings = payload
+        return [np.frombuffer(data, dtype=np.float32).reshape(count, 6) for count, data in arrays], timings
+
+    def stop(self, graceful=True):
+        if graceful:
+            try:
+                self.requests.put(None)
+                self.process.join(timeout=5)
+            except Exception:
+                pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        # The process is gone, so nothing reads the slots or the queues any more
+        for channel in (self.requests, self.replies):
+            channel.close()
+            channel.cancel_join_thread()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ProcessPoolDetector(YOLODetector):
+    """
+    Drop-in replacement for YOLODetector that runs forward passes in a pool of
+    worker processes. Decoding and result formatting stay in the caller, so
+    only raw pixels cross the process boundary.
+    """
+
+    def __init__(self, model_path=None, conf=0.25, engine='pytorch', workers=2, threads_per_worker=1,
+                 slots_per_worker=8, max_frame_size=(1920, 1080)):
+        # Deliberately skip YOLODetector.__init__: the model lives in the workers
+        from django.conf import settings
+        self.model_path = model_path or settings.MODEL_PATH
+        self.conf = conf
+        self.engine = get_engine(engine)
+        self.model = None
+        self.class_names = self.get_gtsrb_class_names()
+        self.class_name_array = class_name_array(self.class_names)
+        self.model_name = os.path.basename(self.model_path)
+        self.slots_per_worker = slots_per_worker
+        self.max_frame_size = max_frame_size
+
+        width, height = max_frame_size
+        slot_bytes = width * height * 3
+        context = multiprocessing.get_context('spawn')
+        self._worker_args = (context, self.model_path, conf, engine, threads_per_worker, slots_per_worker, slot_bytes)
+        self._workers = [self._spawn(index) for index in range(workers)]
+        for worker in self._workers:
+            worker.wait_ready()
+
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        atexit.register(self.close)
+
+    def _spawn(self, index):
+        context, *args = self._worker_args
+        return _Worker(context, index, *args)
+
+    def _replace(self, worker):
+        """
+        Terminate a failed worker and start a fresh one (new process, queues
+        and slots) in its place. Returns None if the replacement fails to start.
+        """
+        worker.stop(graceful=False)
+        try:
+            replacement = self._spawn(worker.index)
+            replacement.wait_ready()
+        except Exception:
+            logger.exception('Could not restart inference worker %s', worker.index)
+            self._workers = [w for w in self._workers if w is not worker]
+            return None
+        self._workers = [replacement if w is worker else w for w in self._workers]
+        return replacement
+
+    @property
+    def workers(self):
+        return len(self._workers)
+
+    def memory_footprint(self):
+        shared = sum(worker.shm.size for worker in self._workers)
+        weights = super().memory_footprint()
+        return shared + weights * len(self._workers)
+
+    def _fit_frame(self, image):
+        """
+        Shrink frames that exceed the slot size; the model resizes to its own
+        input size anyway, so this only costs detail it would discard.
+        """
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        max_width, max_height = self.max_frame_size
+        height, width = image.shape[:2]
+        if width * height <= max_width * max_height and image.shape[2] == 3:
+            return np.ascontiguousarray(image, dtype=np.uint8)
+        scale = min(max_width * max_height / float(width * height), 1.0) ** 0.5
+        image = cv2.resize(image[:, :, :3], (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(image, dtype=np.uint8)
+
+    def predict_timed(self, images, imgsz=None):
+        images = [self._fit_frame(image) for image in images]
+        try:
+            worker = self._idle.get(timeout=BATCH_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError('No inference worker available')
+        try:
+            arrays, timings = [], []
+            for start in range(0, len(images), self.slots_per_worker):
+                chunk_arrays, chunk_timings = worker.run(images[start:start + self.slots_per_worker], imgsz)
+                arrays.extend(chunk_arrays)
+                timings.extend(chunk_timings)
+            return arrays, timings
+        except WorkerFailed:
+            logger.exception('Restarting inference worker %s', worker.index)
+            worker = self._replace(worker)
+            raise
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
@@ -0,0 +1,52 @@
+"""
+Binary WebSocket frame protocol for realtime detection.
+
+Every binary message starts with a fixed 8-byte big-endian header:
+
+    version   uint8   protocol version, currently 1
+    flags     uint8   FLAG_* bits
+    reserved  uint16  must be 0
+    frame_id  uint32  client-chosen id echoed back in the reply
+
+Client -> server messages carry the raw encoded image (JPEG/PNG) after the
+header. Server -> client replies reuse the header with FLAG_RESULT set and
+carry the UTF-8 JSON detection_result payload.
+"""
+import json
+import struct
+
+
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct('!BBHI')
+HEADER_SIZE = HEADER.size
+
+FLAG_RESULT = 0x01
+FLAG_ERROR = 0x02
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def parse_frame(bytes_data):
+    """
+    Split a binary frame into (frame_id, flags, payload) without copying the payload
+    """
+    if len(bytes_data) < HEADER_SIZE:
+        raise ProtocolError('Frame shorter than header')
+
+    version, flags, _, frame_id = HEADER.unpack_from(bytes_data)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f'Unsupported protocol version {version}')
+
+    payload = memoryview(bytes_data)[HEADER_SIZE:]
+    if not payload:
+        raise ProtocolError('Empty image payload')
+    return frame_id, flags, payload
+
+
+def build_reply(frame_id, message, error=False):
+    flags = FLAG_RESULT | (FLAG_ERROR if error else 0)
+    body = json.dumps(message).encode('utf-8')
+    return HEADER.pack(PROTOCOL_VERSION, flags, 0, frame_id & 0xFFFFFFFF) + body
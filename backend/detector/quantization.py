@@ -0,0 +1,120 @@
+"""
+INT8 post-training quantization of the exported ONNX model.
+
+Static quantization calibrates activation ranges on real frames (the
+--calibration images of `manage.py quantize_model`) and writes a QDQ model that ONNX Runtime runs
+with integer kernels. Dynamic quantization needs no calibration data but only
+quantizes weights, so it gains much less on convolutions. The Detect head is
+kept in float either way: its box decoding and class scores are where INT8
+rounding costs the most agreement.
+"""
+import os
+import re
+
+import cv2
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static,
+)
+
+from .engines import get_engine
+
+
+def preprocess(image, imgsz=640):
+    """
+    Letterbox a BGR frame into the 1x3xHxW float32 RGB tensor the exported
+    model expects, matching the ultralytics predictor
+    """
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(tensor, dtype=np.float32) / 255.0
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """
+    Feeds calibration frames to the quantizer one at a time
+    """
+
+    def __init__(self, input_name, images, imgsz=640):
+        self.input_name = input_name
+        self.images = images
+        self.imgsz = imgsz
+        self._iterator = iter(images)
+
+    def get_next(self):
+        image = next(self._iterator, None)
+        if image is None:
+            return None
+        return {self.input_name: preprocess(image, self.imgsz)}
+
+    def rewind(self):
+        self._iterator = iter(self.images)
+
+
+def head_nodes(model):
+    """
+    Names of the nodes in the last /model.N/ block, i.e. the Detect head
+    """
+    blocks = {}
+    for node in model.graph.node:
+        match = re.match(r'/model\.(\d+)/', node.name)
+        if match:
+            blocks.setdefault(int(match.group(1)), []).append(node.name)
+    return blocks[max(blocks)] if blocks else []
+
+
+def candidate_path(model_path):
+    """
+    Where a quantized model waits until it passes the agreement gate
+    """
+    return get_engine('onnx-int8').artifact_path(model_path).replace('.int8.onnx', '.int8.candidate.onnx')
+
+
+def quantize(model_path, images=None, mode='static', imgsz=640, output_path=None):
+    """
+    Quantize the model at model_path to INT8 and return the written path.
+    The FP32 ONNX export is created first if it does not exist yet.
+    """
+    onnx_engine = get_engine('onnx')
+    fp32_path = onnx_engine.artifact_path(model_path)
+    if not os.path.exists(fp32_path):
+        fp32_path = onnx_engine.export(model_path, imgsz=imgsz)
+    output_path = output_path or candidate_path(model_path)
+
+    model = onnx.load(fp32_path)
+    exclude = head_nodes(model)
+
+    if mode == 'dynamic':
+        quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QUInt8, nodes_to_exclude=exclude)
+    elif mode == 'static':
+        if not images:
+            raise ValueError('Static quantization needs calibration images')
+        reader = FrameCalibrationReader(model.graph.input[0].name, images, imgsz)
+        quantize_static(
+            fp32_path, output_path, reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=exclude,
+        )
+    else:
+        raise ValueError(f'Unknown quantization mode "{mode}"')
+    return output_path
+
+
+def promote(model_path):
+    """
+    Move a quantized candidate that passed the gate to where the onnx-int8
+    engine loads it from
+    """
+    path = get_engine('onnx-int8').artifact_path(model_path)
+    os.replace(candidate_path(model_path), path)
+    return path
@@ -0,0 +1,168 @@
+"""
+Incrementally maintained statistics rollups.
+
+Every persisted frame adds to one DailyDetectionStats row and one
+DailyClassStats row per detected class, both for its user and for the global
+(user=None) scope, and deleting a Detection subtracts it again. The stats endpoints read these rows instead of scanning
+Detection/DetectionResult, so their cost depends on the number of active days
+and classes rather than on the number of stored detections.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Detection, DetectionResult, DailyDetectionStats, DailyClassStats
+
+
+def _increment(model, lookup, deltas):
+    """
+    Add deltas to the row matching lookup, creating it on first use
+    """
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        # Savepoint so a concurrent insert of the same row does not abort
+        # the caller's transaction
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**updates)
+
+
+def apply_detections(items):
+    """
+    Fold persisted frames into the rollups. `items` is a list of
+    (user_id, result, timestamp) tuples, as passed to save_detections.
+    """
+    daily = defaultdict(lambda: defaultdict(float))
+    classes = defaultdict(int)
+
+    for user_id, result, timestamp in items:
+        day = timezone.localdate(timestamp) if timestamp else timezone.localdate()
+        scopes = [None] if user_id is None else [None, user_id]
+        for scope in scopes:
+            totals = daily[(scope, day)]
+            totals['detections_total'] += 1
+            totals['signs_total'] += result['detections_count']
+            totals['processing_time_sum'] += result['processing_time']
+            totals['confidence_sum'] += float(result['confidence_avg'])
+            for det in result['detections']:
+                classes[(scope, day, det['class_name'])] += 1
+
+    with transaction.atomic():
+        for (user_id, day), totals in daily.items():
+            totals['detections_total'] = int(totals['detections_total'])
+            totals['signs_total'] = int(totals['signs_total'])
+            _increment(DailyDetectionStats, {'user_id': user_id, 'day': day}, dict(totals))
+        for (user_id, day, class_name), count in classes.items():
+            _increment(DailyClassStats, {'user_id': user_id, 'day': day, 'class_name': class_name},
+                       {'count': count})
+
+
+def remove_detection(detection):
+    """
+    Subtract a Detection that is about to be deleted from the rollups. Called
+    before the delete so its DetectionResult rows can still be counted.
+    """
+    day = timezone.localdate(detection.timestamp)
+    scopes = [None] if detection.user_id is None else [None, detection.user_id]
+    classes = DetectionResult.objects.filter(detection=detection).values('class_name').annotate(
+        count=Count('id')
+    ).order_by()
+    class_counts = {row['class_name']: row['count'] for row in classes}
+
+    with transaction.atomic():
+        for scope in scopes:
+            DailyDetectionStats.objects.filter(user_id=scope, day=day).update(
+                detections_total=F('detections_total') - 1,
+                signs_total=F('signs_total') - detection.detections_count,
+                processing_time_sum=F('processing_time_sum') - detection.processing_time,
+                confidence_sum=F('confidence_sum') - detection.confidence_avg,
+            )
+            DailyDetectionStats.objects.filter(user_id=scope, day=day, detections_total__lte=0).delete()
+            for class_name, count in class_counts.items():
+                DailyClassStats.objects.filter(user_id=scope, day=day, class_name=class_name).update(
+                    count=F('count') - count
+                )
+            DailyClassStats.objects.filter(user_id=scope, day=day, count__lte=0).delete()
+
+
+def summarize(user=None):
+    """
+    Aggregate the rollups for one user, or globally when user is None, into
+    the payload returned by the stats endpoints.
+    """
+    totals = DailyDetectionStats.objects.filter(user=user).aggregate(
+        detections=Sum('detections_total'),
+        signs=Sum('signs_total'),
+        processing_time=Sum('processing_time_sum'),
+        confidence=Sum('confidence_sum'),
+    )
+    total_detections = totals['detections'] or 0
+    if total_detections == 0:
+        return {
+            'total_detections': 0,
+            'total_signs_detected': 0,
+            'avg_processing_time': 0,
+            'avg_confidence': 0,
+            'most_detected_signs': []
+        }
+
+    most_detected = DailyClassStats.objects.filter(user=user).values('class_name').annotate(
+        count=Sum('count')
+    ).order_by('-count')[:5]
+
+    return {
+        'total_detections': total_detections,
+        'total_signs_detected': totals['signs'] or 0,
+        'avg_processing_time': round(totals['processing_time'] / total_detections, 3),
+        'avg_confidence': round(totals['confidence'] / total_detections, 3),
+        'most_detected_signs': list(most_detected)
+    }
+
+
+def rebuild():
+    """
+    Recompute every rollup row from the raw Detection/DetectionResult tables
+    """
+    with transaction.atomic():
+        DailyDetectionStats.objects.all().delete()
+        DailyClassStats.objects.all().delete()
+
+        detection_groups = {
+            'detections_total': Count('id'),
+            'signs_total': Sum('detections_count'),
+            'processing_time_sum': Sum('processing_time'),
+            'confidence_sum': Sum('confidence_avg'),
+        }
+        per_user = Detection.objects.filter(user__isnull=False).annotate(
+            day=TruncDate('timestamp')
+        ).values('user_id', 'day').annotate(**detection_groups).order_by()
+        global_rows = Detection.objects.annotate(
+            day=TruncDate('timestamp')
+        ).values('day').annotate(**detection_groups).order_by()
+
+        DailyDetectionStats.objects.bulk_create(
+            [DailyDetectionStats(**row) for row in per_user] +
+            [DailyDetectionStats(user_id=None, **row) for row in global_rows],
+            batch_size=1000
+        )
+
+        per_user_classes = DetectionResult.objects.filter(detection__user__isnull=False).annotate(
+            day=TruncDate('detection__timestamp')
+        ).values('detection__user_id', 'day', 'class_name').annotate(count=Count('id')).order_by()
+        global_classes = DetectionResult.objects.annotate(
+            day=TruncDate('detection__timestamp')
+        ).values('day', 'class_name').annotate(count=Count('id')).order_by()
+
+        DailyClassStats.objects.bulk_create(
+            [DailyClassStats(user_id=row.pop('detection__user_id'), **row) for row in per_user_classes] +
+            [DailyClassStats(user_id=None, **row) for row in global_classes],
+            batch_size=1000
+        )
+
+    return DailyDetectionStats.objects.count(), DailyClassStats.objects.count()
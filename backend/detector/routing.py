@@ -3,4 +3,7 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/detect/$', consumers.DetectionConsumer.as_asgi()),
+    re_path(r'ws/videos/(?P<job_id>\d+)/$', consumers.VideoJobConsumer.as_asgi()),
+    re_path(r'ws/cameras/(?P<camera_id>\d+)/$', consumers.CameraConsumer.as_asgi()),
+    re_path(r'ws/streams/(?P<stream>[A-Za-z0-9_.-]{1,64})/$', consumers.StreamConsumer.as_asgi()),
 ] 
\ No newline at end of file
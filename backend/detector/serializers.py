@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Detection, DetectionResult
+from .models import CameraSource, Detection, DetectionResult, VideoJob
 
 
 class DetectionResultSerializer(serializers.ModelSerializer):
@@ -13,4 +13,20 @@ class DetectionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Detection
-        fields = ['id', 'timestamp', 'image', 'detections_count', 'confidence_avg', 'processing_time', 'results'] 
\ No newline at end of file
+        fields = ['id', 'timestamp', 'image', 'detections_count', 'confidence_avg', 'processing_time', 'results'] 
+
+
+class VideoJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = VideoJob
+        fields = ['id', 'status', 'sample_fps', 'total_frames', 'last_frame_index', 'frames_processed',
+                  'signs_detected', 'progress', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = [field for field in fields if field != 'sample_fps']
+
+
+class CameraSourceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CameraSource
+        fields = ['id', 'name', 'enabled', 'max_fps', 'persist_detections', 'created_at', 'updated_at']
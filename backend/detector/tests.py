@@ -0,0 +1,895 @@
+import asyncio
+import io
+import json
+import itertools
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .adaptive import AdaptiveResolution, size_ladder
+from .backpressure import LatestFrameMailbox, LatestMessageOutbox
+from .batching import BatchScheduler
+from .consumers import stream_group
+from .frame_cache import FrameResultCache
+from .ingestion import CaptureThread, LatestFrame
+from .tiling import TilingOptions, merge_tiles, plan_windows
+from .tracking import StreamTracker
+from .loadtest import StubDetector, load_frames
+from .models import DailyClassStats, DailyDetectionStats, Detection, DetectionResult, VideoJob
+from .parsers import NDJSONParser, RawImageParser, UploadTooLarge
+from .persistence import save_detections
+from .protocol import FLAG_ERROR, FLAG_RESULT, HEADER, HEADER_SIZE, PROTOCOL_VERSION, ProtocolError, build_reply, parse_frame
+from .process_pool import ProcessPoolDetector, WorkerFailed, _Worker
+from .rollups import summarize
+from .routing import websocket_urlpatterns
+from .video import claim_next_job, process_job
+from .validation import agreement_failure, compare_detectors, load_validation_images
+
+
+class HistoryQueryCountTests(TestCase):
+    """
+    History pages load all of their results in one query, so the number of
+    queries must not grow with the page size
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('history', password='unused')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_detections(self, count, results_per_detection=3):
+        detections = Detection.objects.bulk_create([
+            Detection(user=self.user, detections_count=results_per_detection, confidence_avg=0.9)
+            for _ in range(count)
+        ])
+        DetectionResult.objects.bulk_create([
+            DetectionResult(detection=detection, class_name='Stop', confidence=0.9,
+                            bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2)
+            for detection in detections for _ in range(results_per_detection)
+        ])
+
+    def test_recent_detections_query_count(self):
+        self.create_detections(5)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/detections/')
+        self.assertEqual(len(response.json()), 5)
+
+        self.create_detections(40)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/detections/')
+        self.assertEqual(len(response.json()), 45)
+
+    def test_history_query_count_per_page_size(self):
+        self.create_detections(120)
+        for limit in (5, 50):
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/detections/history/', {'limit': limit})
+            page = response.json()
+            self.assertEqual(len(page['results']), limit)
+            self.assertEqual(len(page['results'][0]['results']), 3)
+
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/detections/history/', {
+                    'limit': limit, 'cursor': page['next_cursor'],
+                })
+            self.assertEqual(len(response.json()['results']), limit)
+
+
+def as_user(application, user):
+    async def authenticated(scope, receive, send):
+        return await application(dict(scope, user=user), receive, send)
+    return authenticated
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class StreamAccessTests(TestCase):
+    """
+    Published streams are scoped to their owner
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='unused')
+        self.other = User.objects.create_user('other', password='unused')
+        self.staff = User.objects.create_user('staff', password='unused', is_staff=True)
+
+    async def connect(self, user, path):
+        communicator = WebsocketCommunicator(as_user(URLRouter(websocket_urlpatterns), user), path)
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def publish(self, owner_id, name):
+        await get_channel_layer().group_send(stream_group(owner_id, name), {
+            'type': 'stream.result', 'stream': name, 'detections': [],
+        })
+
+    async def test_viewer_only_receives_own_streams(self):
+        owner, connected = await self.connect(self.owner, '/ws/streams/cam/')
+        self.assertTrue(connected)
+        await owner.receive_json_from()
+        other, connected = await self.connect(self.other, '/ws/streams/cam/')
+        self.assertTrue(connected)
+        await other.receive_json_from()
+
+        await self.publish(self.owner.pk, 'cam')
+        self.assertEqual((await owner.receive_json_from())['type'], 'detection_result')
+        self.assertTrue(await other.receive_nothing())
+        await owner.disconnect()
+        await other.disconnect()
+
+    async def test_owner_param_needs_staff(self):
+        _, connected = await self.connect(self.other, f'/ws/streams/cam/?owner={self.owner.pk}')
+        self.assertFalse(connected)
+
+        staff, connected = await self.connect(self.staff, f'/ws/streams/cam/?owner={self.owner.pk}')
+        self.assertTrue(connected)
+        self.assertEqual((await staff.receive_json_from())['owner'], self.owner.pk)
+        await self.publish(self.owner.pk, 'cam')
+        self.assertEqual((await staff.receive_json_from())['type'], 'detection_result')
+        await staff.disconnect()
+
+
+class FixedDetector:
+    def __init__(self, detections):
+        self.detections = detections
+
+    def detect_batch(self, images):
+        return [{'detections': list(self.detections)} for _ in images]
+
+
+class AgreementGateTests(SimpleTestCase):
+    """
+    The export and quantization gates must not pass on images where nothing is detected
+    """
+    sign = {'class_name': 'Stop', 'confidence': 0.9, 'bbox_x': 0.1, 'bbox_y': 0.1,
+            'bbox_width': 0.2, 'bbox_height': 0.2}
+
+    def test_no_boxes_is_not_agreement(self):
+        report = compare_detectors(FixedDetector([]), FixedDetector([]), [None] * 4)
+        self.assertEqual(report['agreement'], 0.0)
+        self.assertIn('found only 0 boxes', agreement_failure(report, 0.95))
+
+    def test_too_few_reference_boxes_fail(self):
+        report = compare_detectors(FixedDetector([self.sign]), FixedDetector([self.sign]), [None] * 3)
+        self.assertEqual(report['agreement'], 1.0)
+        self.assertIsNotNone(agreement_failure(report, 0.95, min_reference_boxes=10))
+        self.assertIsNone(agreement_failure(report, 0.95, min_reference_boxes=3))
+
+    def test_disagreement_fails(self):
+        report = compare_detectors(FixedDetector([self.sign]), FixedDetector([]), [None] * 10)
+        self.assertIn('agreement 0.000', agreement_failure(report, 0.95))
+
+    def test_no_images_raises(self):
+        with self.assertRaises(ValueError):
+            load_validation_images(None)
+        with self.assertRaises(ValueError):
+            load_validation_images(['/nonexistent/validation/images'])
+
+
+class RollupDeletionTests(TestCase):
+    """
+    Deleting detections, directly or with their account, takes them out of the rollups
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('rollups', password='unused')
+        self.other = User.objects.create_user('bystander', password='unused')
+
+    def save(self, user, class_names):
+        result = {
+            'detections_count': len(class_names),
+            'confidence_avg': 0.8,
+            'processing_time': 0.05,
+            'detections': [
+                {'class_name': name, 'confidence': 0.8, 'bbox_x': 0.1, 'bbox_y': 0.1,
+                 'bbox_width': 0.2, 'bbox_height': 0.2}
+                for name in class_names
+            ],
+        }
+        return save_detections([(user.pk, result, None)])[0]
+
+    def test_delete_detection(self):
+        first = self.save(self.user, ['Stop', 'Yield'])
+        self.save(self.user, ['Stop'])
+
+        first.delete()
+        stats = summarize(self.user)
+        self.assertEqual(stats['total_detections'], 1)
+        self.assertEqual(stats['total_signs_detected'], 1)
+        self.assertEqual(stats['most_detected_signs'], [{'class_name': 'Stop', 'count': 1}])
+        self.assertEqual(summarize(None)['total_detections'], 1)
+
+        Detection.objects.all().delete()
+        self.assertEqual(summarize(None)['total_detections'], 0)
+        self.assertFalse(DailyDetectionStats.objects.exists())
+        self.assertFalse(DailyClassStats.objects.exists())
+
+    def test_delete_account(self):
+        self.save(self.user, ['Stop', 'Yield'])
+        self.save(self.other, ['Yield'])
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.delete('/api/auth/delete-account/')
+        self.assertEqual(response.status_code, 200)
+
+        stats = summarize(None)
+        self.assertEqual(stats['total_detections'], 1)
+        self.assertEqual(stats['most_detected_signs'], [{'class_name': 'Yield', 'count': 1}])
+        self.assertEqual(summarize(self.other)['total_detections'], 1)
+
+
+class FrameCacheVariantTests(SimpleTestCase):
+    """
+    A cached result is only reused for the detector settings it was computed with
+    """
+
+    def setUp(self):
+        self.detector = StubDetector(batch_latency=0.0, image_latency=0.0)
+        self.scheduler = BatchScheduler(self.detector, cache=FrameResultCache())
+        self.frame = load_frames(count=1, width=320, height=240)[0]
+
+    def detect(self, imgsz=None):
+        return self.scheduler.detect_encoded(self.detector.decode_bytes, self.frame, imgsz)
+
+    def test_input_size_is_part_of_the_key(self):
+        self.assertIsNone(self.detect(640).get('cached'))
+        self.assertEqual(self.detect(640)['cached'], 'exact')
+        self.assertIsNone(self.detect(320).get('cached'))
+
+    def test_detector_settings_are_part_of_the_key(self):
+        self.detect()
+        self.detector.conf = 0.5
+        self.assertIsNone(self.detect().get('cached'))
+        self.detector.model_path = 'other.pt'
+        self.assertIsNone(self.detect().get('cached'))
+        self.assertEqual(self.detect()['cached'], 'exact')
+
+    def test_near_duplicates_only_match_when_enabled(self):
+        image = self.detector.decode_bytes(self.frame)
+        reencoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 60])[1].tobytes()
+        self.detect()
+        result = self.scheduler.detect_encoded(self.detector.decode_bytes, reencoded)
+        self.assertIsNone(result.get('cached'))
+
+        scheduler = BatchScheduler(self.detector, cache=FrameResultCache(phash_distance=2))
+        scheduler.detect_encoded(self.detector.decode_bytes, self.frame)
+        result = scheduler.detect_encoded(self.detector.decode_bytes, reencoded)
+        self.assertEqual(result['cached'], 'similar')
+
+
+@override_settings(INFERENCE_MAX_BATCH_SIZE=2)
+class BatchStreamTests(TestCase):
+    """
+    /api/detect/batch/ streams under WSGI and ASGI and saves results while streaming
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('batch', password='unused')
+        detector = StubDetector(batch_latency=0.0, image_latency=0.0)
+        patcher = mock.patch('detector.views.get_scheduler', return_value=BatchScheduler(detector))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.frames = load_frames(count=5, width=320, height=240)
+
+    def uploads(self):
+        return {f'image{i}': SimpleUploadedFile(f'{i}.jpg', frame, 'image/jpeg') for i, frame in enumerate(self.frames)}
+
+    def check_lines(self, lines):
+        summary = lines[-1]
+        self.assertEqual([line['type'] for line in lines[:-1]], ['detection_result'] * 5)
+        self.assertEqual(summary['saved'], 5)
+        self.assertEqual(Detection.objects.filter(user=self.user).count(), 5)
+
+    def test_wsgi_stream(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/detect/batch/', self.uploads())
+        self.assertFalse(response.is_async)
+        self.check_lines([json.loads(line) for line in b''.join(response.streaming_content).splitlines()])
+
+    def test_disconnect_keeps_sent_results(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/detect/batch/', self.uploads())
+        lines = iter(response.streaming_content)
+        next(lines)
+        response.close()
+        self.assertEqual(Detection.objects.filter(user=self.user).count(), 1)
+
+    async def test_asgi_stream(self):
+        client = AsyncClient()
+        response = await client.post('/api/detect/batch/', self.uploads(),
+                                     headers={'authorization': f'Bearer {AccessToken.for_user(self.user)}'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(lines[-1]['saved'], 5)
+        self.assertEqual(await Detection.objects.filter(user=self.user).acount(), 5)
+
+    def test_invalid_content_length(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/detect/batch/', self.uploads(), CONTENT_LENGTH='many')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class VideoJobClaimTests(TestCase):
+    """
+    A worker whose job was re-claimed stops instead of saving frames a second time
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        os.makedirs(os.path.join(media.name, 'videos'))
+        writer = cv2.VideoWriter(os.path.join(media.name, 'videos', 'clip.avi'),
+                                 cv2.VideoWriter_fourcc(*'MJPG'), 5.0, (320, 240))
+        for frame in load_frames(count=6, width=320, height=240):
+            writer.write(cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR))
+        writer.release()
+
+        self.user = User.objects.create_user('video', password='unused')
+        VideoJob.objects.create(user=self.user, video='videos/clip.avi', sample_fps=5.0)
+        self.detector = StubDetector(batch_latency=0.0, image_latency=0.0)
+
+    def test_reclaimed_job_stops_the_slow_worker(self):
+        slow = claim_next_job()
+        VideoJob.objects.filter(pk=slow.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        current = claim_next_job()
+        self.assertEqual(current.pk, slow.pk)
+        self.assertNotEqual(current.claimed_by, slow.claimed_by)
+
+        process_job(slow, self.detector, batch_size=2)
+        self.assertEqual(Detection.objects.filter(job=current).count(), 0)
+        self.assertEqual(VideoJob.objects.get(pk=current.pk).status, VideoJob.STATUS_RUNNING)
+
+        process_job(current, self.detector, batch_size=2)
+        job = VideoJob.objects.get(pk=current.pk)
+        self.assertEqual(job.status, VideoJob.STATUS_COMPLETED)
+        self.assertEqual(job.frames_processed, 6)
+        self.assertEqual(Detection.objects.filter(job=job).count(), 6)
+
+    def test_upload_rejects_invalid_content_length(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/videos/', {'video': SimpleUploadedFile('clip.avi', b'avi')},
+                               CONTENT_LENGTH='many')
+        self.assertEqual(response.status_code, 400)
+
+
+class GatedDetector(StubDetector):
+    """
+    Stub detector whose forward passes wait until the test opens the gate
+    """
+
+    def __init__(self):
+        super().__init__(batch_latency=0.0, image_latency=0.0)
+        self.gate = threading.Event()
+        self.batch_sizes = []
+
+    def predict_timed(self, images, imgsz=None):
+        self.gate.wait(5)
+        self.batch_sizes.append(len(images))
+        return super().predict_timed(images, imgsz)
+
+
+class BatchCancellationTests(SimpleTestCase):
+    """
+    A caller that gives up must not stall the other frames of its batch
+    """
+
+    def test_cancelled_frame_is_dropped_from_its_batch(self):
+        detector = GatedDetector()
+        scheduler = BatchScheduler(detector, max_batch_size=8, max_wait=0.05, concurrency=1)
+        image = np.zeros((240, 320, 3), dtype=np.uint8)
+
+        # Occupies the only inference slot, so the next frames stay queued
+        blocking = scheduler.submit(image)
+        time.sleep(0.1)
+        cancelled = scheduler.submit(image)
+        waiting = scheduler.submit(image)
+        self.assertTrue(cancelled.cancel())
+
+        detector.gate.set()
+        self.assertEqual(blocking.result(timeout=5)['detections_count'], 1)
+        self.assertEqual(waiting.result(timeout=5)['detections_count'], 1)
+        self.assertEqual(detector.batch_sizes, [1, 1])
+
+    def test_cancelled_async_caller(self):
+        detector = GatedDetector()
+        scheduler = BatchScheduler(detector, max_batch_size=8, max_wait=0.05, concurrency=1)
+        image = np.zeros((240, 320, 3), dtype=np.uint8)
+        blocking = scheduler.submit(image)
+
+        async def run():
+            await asyncio.sleep(0.1)
+            cancelled = asyncio.ensure_future(scheduler.detect_async(image))
+            waiting = asyncio.ensure_future(scheduler.detect_async(image))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            detector.gate.set()
+            return await asyncio.wait_for(waiting, 5)
+
+        self.assertEqual(async_to_sync(run)()['detections_count'], 1)
+        self.assertEqual(blocking.result(timeout=5)['detections_count'], 1)
+
+
+class CaptureReplayTests(SimpleTestCase):
+    """
+    A local file that yields no frames backs off instead of reopening in a busy loop
+    """
+
+    def test_empty_file_backs_off(self):
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as empty:
+            stop = threading.Event()
+            capture = CaptureThread(empty.name, LatestFrame(), stop, reconnect_delay=0.05, max_reconnect_delay=0.05)
+            opened = []
+            original_open = capture.open
+            capture.open = lambda: opened.append(1) or original_open()
+            capture.start()
+            time.sleep(0.5)
+            stop.set()
+            capture.join(5)
+        self.assertGreater(capture.reconnects, 0)
+        self.assertLess(len(opened), 20)
+
+
+class MetricsAccessTests(SimpleTestCase):
+    """
+    /metrics is off by default and only served to trusted scrapers
+    """
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='', METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-secret')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE', response.content)
+
+
+class TilingOptionsTests(SimpleTestCase):
+    """
+    DETECT_ROI_REGIONS only shapes tiled requests
+    """
+
+    @override_settings(DETECT_ROI_REGIONS='0,0.2,0.3,0.5')
+    def test_roi_setting_needs_tiling(self):
+        self.assertIsNone(TilingOptions.from_params({}))
+        self.assertEqual(TilingOptions.from_params({'tiling': '1'}).regions, [(0.0, 0.2, 0.3, 0.5)])
+        self.assertEqual(TilingOptions.from_params({'regions': '0.5,0,0.5,1'}).regions, [(0.5, 0.0, 0.5, 1.0)])
+
+    @override_settings(DETECT_ROI_REGIONS='not-a-region')
+    def test_untiled_requests_ignore_the_setting(self):
+        self.assertIsNone(TilingOptions.from_params({'tiling': '0'}))
+
+
+class TilingTests(SimpleTestCase):
+    """
+    Window planning and merging boxes across tile seams
+    """
+
+    def test_whole_frame_windows(self):
+        options = TilingOptions(tile_size=640, overlap=0.2)
+        windows = plan_windows((1080, 1920, 3), options)
+        # One downscaled full-frame pass plus tiles that cover the frame edge to edge
+        self.assertEqual(windows[0], (0, 0, 1920, 1080))
+        tiles = windows[1:]
+        self.assertTrue(all(x1 - x0 == 640 and y1 - y0 == 640 for x0, y0, x1, y1 in tiles))
+        self.assertEqual(max(x1 for _, _, x1, _ in tiles), 1920)
+        self.assertEqual(max(y1 for _, _, _, y1 in tiles), 1080)
+        self.assertEqual(plan_windows((480, 640, 3), options), [(0, 0, 640, 480)])
+
+    def test_roi_windows(self):
+        options = TilingOptions(tile_size=640, overlap=0.2, regions=[(0.0, 0.25, 0.5, 0.5)])
+        windows = plan_windows((1080, 1920, 3), options)
+        self.assertEqual(windows, [(0, 270, 640, 810), (320, 270, 960, 810)])
+
+    def test_seam_duplicates_are_merged(self):
+        windows = [(0, 0, 640, 640), (512, 0, 1152, 640)]
+        # The same sign straddles the seam: whole in the left tile, cut off in the right one
+        left = np.array([[500 / 640, 0.5, 600 / 640, 0.6, 0.9, 14]], dtype=np.float32)
+        right = np.array([[0.0, 0.5, 88 / 640, 0.6, 0.7, 14]], dtype=np.float32)
+        other_class = np.array([[0.0, 0.5, 88 / 640, 0.6, 0.8, 3]], dtype=np.float32)
+        merged = merge_tiles([left, np.concatenate([right, other_class])], windows, (640, 1152, 3), 0.6)
+
+        self.assertEqual(len(merged), 2)
+        stop = merged[merged[:, 5] == 14][0]
+        np.testing.assert_allclose(stop[:4], [500 / 1152, 0.5, 600 / 1152, 0.6], rtol=1e-5)
+        self.assertAlmostEqual(float(stop[4]), 0.9, places=5)
+
+    def test_no_detections(self):
+        empty = np.zeros((0, 6), dtype=np.float32)
+        self.assertEqual(merge_tiles([empty, empty], [(0, 0, 10, 10), (5, 0, 15, 10)], (10, 15, 3), 0.6).shape, (0, 6))
+
+
+class FakeProcess:
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeWorker:
+    def __init__(self, index, fail=False):
+        self.index = index
+        self.fail = fail
+        self.stopped = False
+
+    def run(self, images, imgsz=None):
+        if self.fail:
+            raise WorkerFailed(f'Inference worker {self.index} died')
+        return [np.zeros((0, 6), dtype=np.float32) for _ in images], [{} for _ in images]
+
+    def stop(self, graceful=True):
+        self.stopped = True
+
+
+def pool_without_workers(max_frame_size=(640, 480)):
+    # The model and worker processes are never started; tests attach fake workers
+    pool = ProcessPoolDetector.__new__(ProcessPoolDetector)
+    pool.max_frame_size = max_frame_size
+    pool.slots_per_worker = 4
+    pool._workers = []
+    pool._idle = queue.Queue()
+    return pool
+
+
+class ProcessPoolTests(SimpleTestCase):
+    """
+    Frame fitting, reply matching and replacement of failed workers
+    """
+
+    def test_fit_frame(self):
+        pool = pool_without_workers()
+        small = np.zeros((240, 320, 3), dtype=np.uint8)
+        self.assertEqual(pool._fit_frame(small).shape, (240, 320, 3))
+
+        large = pool._fit_frame(np.zeros((1080, 1920, 3), dtype=np.uint8))
+        self.assertLessEqual(large.shape[0] * large.shape[1], 640 * 480)
+        self.assertAlmostEqual(large.shape[1] / large.shape[0], 1920 / 1080, places=2)
+
+        gray = pool._fit_frame(np.zeros((100, 200), dtype=np.uint8))
+        self.assertEqual(gray.shape, (100, 200, 3))
+        self.assertTrue(gray.flags['C_CONTIGUOUS'])
+
+    def test_stale_replies_are_discarded(self):
+        worker = _Worker.__new__(_Worker)
+        worker.index = 0
+        worker.slot_bytes = 64 * 64 * 3
+        worker.shm = mock.Mock(buf=bytearray(2 * worker.slot_bytes))
+        worker._request_ids = itertools.count(1)
+        worker.requests = queue.Queue()
+        worker.replies = queue.Queue()
+        worker.process = FakeProcess()
+
+        box = np.array([[0.1, 0.1, 0.2, 0.2, 0.9, 14]], dtype=np.float32)
+        # A late reply to an earlier request is still waiting in the queue
+        worker.replies.put((0, 'ok', ([(0, b'')], [{}])))
+        worker.replies.put((1, 'ok', ([(1, box.tobytes())], [{'inference': 0.01}])))
+        arrays, timings = worker.run([np.zeros((64, 64, 3), dtype=np.uint8)])
+        np.testing.assert_array_equal(arrays[0], box)
+        self.assertEqual(timings, [{'inference': 0.01}])
+
+        request_id, descriptors, _ = worker.requests.get_nowait()
+        self.assertEqual((request_id, descriptors), (1, [(0, (64, 64, 3))]))
+
+    def test_failed_worker_is_replaced(self):
+        pool = pool_without_workers()
+        failing, replacement = FakeWorker(0, fail=True), FakeWorker(0)
+        pool._workers = [failing]
+        pool._idle.put(failing)
+        pool._spawn = mock.Mock(return_value=replacement)
+        replacement.wait_ready = mock.Mock()
+
+        with self.assertRaises(WorkerFailed):
+            pool.predict_timed([np.zeros((32, 32, 3), dtype=np.uint8)])
+        self.assertTrue(failing.stopped)
+        self.assertEqual(pool._workers, [replacement])
+        self.assertIs(pool._idle.get_nowait(), replacement)
+
+    def test_batch_errors_keep_the_worker(self):
+        pool = pool_without_workers()
+        worker = FakeWorker(0)
+        worker.run = mock.Mock(side_effect=RuntimeError('bad frame'))
+        pool._workers = [worker]
+        pool._idle.put(worker)
+
+        with self.assertRaises(RuntimeError):
+            pool.predict_timed([np.zeros((32, 32, 3), dtype=np.uint8)])
+        self.assertFalse(worker.stopped)
+        self.assertIs(pool._idle.get_nowait(), worker)
+
+
+class BinaryProtocolTests(SimpleTestCase):
+    """
+    The binary WebSocket header round-trips and malformed frames are rejected
+    """
+
+    def test_frame_round_trip(self):
+        frame = HEADER.pack(PROTOCOL_VERSION, 0, 0, 4242) + b'jpeg bytes'
+        frame_id, flags, payload = parse_frame(frame)
+        self.assertEqual((frame_id, flags, bytes(payload)), (4242, 0, b'jpeg bytes'))
+        self.assertIsInstance(payload, memoryview)
+
+    def test_reply(self):
+        reply = build_reply(2 ** 32 + 7, {'type': 'detection_result', 'detections': []})
+        version, flags, reserved, frame_id = HEADER.unpack_from(reply)
+        self.assertEqual((version, flags, reserved, frame_id), (PROTOCOL_VERSION, FLAG_RESULT, 0, 7))
+        self.assertEqual(json.loads(reply[HEADER_SIZE:])['type'], 'detection_result')
+
+        _, flags, _, _ = HEADER.unpack_from(build_reply(1, {'error': 'bad'}, error=True))
+        self.assertEqual(flags, FLAG_RESULT | FLAG_ERROR)
+
+    def test_malformed_frames(self):
+        for frame in (b'\x01\x00', HEADER.pack(2, 0, 0, 1) + b'x', HEADER.pack(PROTOCOL_VERSION, 0, 0, 1)):
+            with self.assertRaises(ProtocolError):
+                parse_frame(frame)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BinaryDetectionTests(TestCase):
+    """
+    ws/detect/ answers a binary frame with a binary reply for the same frame id
+    """
+
+    def setUp(self):
+        detector = StubDetector(batch_latency=0.0, image_latency=0.0)
+        patcher = mock.patch('detector.consumers.get_scheduler', return_value=BatchScheduler(detector))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.frame = load_frames(count=1, width=320, height=240)[0]
+
+    async def test_binary_frame(self):
+        communicator = WebsocketCommunicator(as_user(URLRouter(websocket_urlpatterns), AnonymousUser()), '/ws/detect/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_from()  # connection_established
+
+        await communicator.send_to(bytes_data=HEADER.pack(PROTOCOL_VERSION, 0, 0, 99) + self.frame)
+        reply = await communicator.receive_from(timeout=5)
+        _, flags, _, frame_id = HEADER.unpack_from(reply)
+        self.assertEqual((flags, frame_id), (FLAG_RESULT, 99))
+        self.assertEqual(json.loads(reply[HEADER_SIZE:])['detections'][0]['class_name'], 'Stop')
+
+        await communicator.send_to(bytes_data=HEADER.pack(9, 0, 0, 100) + self.frame)
+        _, flags, _, _ = HEADER.unpack_from(await communicator.receive_from(timeout=5))
+        self.assertTrue(flags & FLAG_ERROR)
+        await communicator.disconnect()
+
+
+class LatestFrameMailboxTests(SimpleTestCase):
+    """
+    A realtime session keeps only its newest unprocessed frame
+    """
+
+    async def test_keeps_only_the_latest_frame(self):
+        mailbox = LatestFrameMailbox()
+        for frame in ('first', 'second', 'third'):
+            mailbox.put(frame)
+        self.assertEqual(await mailbox.get(), 'third')
+        mailbox.task_done()
+        self.assertEqual(mailbox.stats(), {'frames_received': 3, 'frames_dropped': 2, 'frames_processed': 1})
+
+    async def test_get_waits_for_the_next_frame(self):
+        mailbox = LatestFrameMailbox()
+        waiter = asyncio.ensure_future(mailbox.get())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        mailbox.put('frame')
+        self.assertEqual(await asyncio.wait_for(waiter, 1), 'frame')
+        self.assertEqual(mailbox.frames_dropped, 0)
+
+
+class LatestMessageOutboxTests(SimpleTestCase):
+    """
+    A slow stream viewer falls behind by at most one message
+    """
+
+    async def test_slow_viewer_gets_the_newest_message(self):
+        outbox = LatestMessageOutbox()
+        outbox.put({'frame': 1})
+        self.assertEqual(await outbox.get(), {'frame': 1})
+        # Published while the first message was still being written
+        outbox.put({'frame': 2})
+        outbox.put({'frame': 3})
+        outbox.task_done()
+        self.assertEqual(await outbox.get(), {'frame': 3})
+        outbox.task_done()
+        self.assertEqual(outbox.stats(), {'messages_delivered': 2, 'messages_dropped': 1})
+
+
+def sign(x, y, class_name='Stop', confidence=0.9):
+    return {'class_name': class_name, 'confidence': confidence, 'bbox_x': x, 'bbox_y': y,
+            'bbox_width': 0.1, 'bbox_height': 0.1}
+
+
+def keyframe_result(*detections):
+    return {'detections': list(detections), 'processing_time': 0.05}
+
+
+class StreamTrackerTests(SimpleTestCase):
+    """
+    Keyframe scheduling, persistent track ids and motion between keyframes
+    """
+
+    def test_keyframe_interval_and_scene_change(self):
+        tracker = StreamTracker(keyframe_interval=3, scene_change_threshold=12.0)
+        still = np.full((240, 320, 3), 100, dtype=np.uint8)
+        decisions = []
+        for _ in range(6):
+            keyframe = tracker.needs_keyframe(still)
+            decisions.append(keyframe)
+            if keyframe:
+                tracker.update(keyframe_result())
+            else:
+                tracker.propagate()
+        self.assertEqual(decisions, [True, False, False, True, False, False])
+
+        tracker.propagate()
+        self.assertTrue(tracker.needs_keyframe(np.full((240, 320, 3), 200, dtype=np.uint8)))
+
+    def test_tracks_keep_their_id_and_move_between_keyframes(self):
+        tracker = StreamTracker(keyframe_interval=3, confidence_decay=0.5)
+        first = tracker.update(keyframe_result(sign(0.10, 0.5)))
+        track_id = first['detections'][0]['track_id']
+        self.assertTrue(first['keyframe'])
+
+        tracker.propagate()
+        second = tracker.update(keyframe_result(sign(0.12, 0.5)))
+        self.assertEqual(second['detections'][0]['track_id'], track_id)
+
+        # Two frames since the last sighting moved 0.02, so 0.01 per frame
+        tracked = tracker.propagate()
+        self.assertFalse(tracked['keyframe'])
+        detection = tracked['detections'][0]
+        self.assertEqual(detection['track_id'], track_id)
+        self.assertAlmostEqual(detection['bbox_x'], 0.13)
+        self.assertAlmostEqual(detection['confidence'], 0.45)
+
+    def test_lost_signs_expire(self):
+        tracker = StreamTracker(max_misses=1)
+        tracker.update(keyframe_result(sign(0.1, 0.1), sign(0.6, 0.6, 'Yield')))
+        result = tracker.update(keyframe_result(sign(0.1, 0.1)))
+        self.assertEqual([d['class_name'] for d in result['detections']], ['Stop'])
+        self.assertEqual(tracker.stats()['active_tracks'], 2)
+
+        stop_id = tracker.update(keyframe_result(sign(0.1, 0.1)))['detections'][0]['track_id']
+        self.assertEqual(tracker.stats()['active_tracks'], 1)
+        # A different class at the same place starts a new track
+        result = tracker.update(keyframe_result(sign(0.1, 0.1, 'Yield')))
+        self.assertEqual([d['class_name'] for d in result['detections']], ['Yield'])
+        self.assertNotEqual(result['detections'][0]['track_id'], stop_id)
+
+
+class AdaptiveResolutionTests(SimpleTestCase):
+    """
+    The input size steps down while the p95 is over target and back up once it fits
+    """
+
+    def test_ladder_is_stride_aligned_and_capped(self):
+        self.assertEqual(size_ladder([640, 500, 320, 1024, 10], 640), [640, 480, 320, 32])
+
+    def test_steps_down_to_the_smallest_size_then_back_up(self):
+        controller = AdaptiveResolution(0.1, [512, 320], 640, window=5, min_samples=5)
+        for _ in range(5):
+            controller.observe(0.2)
+        self.assertEqual(controller.imgsz, 512)
+        # Old samples are discarded, so a decision needs a full new window
+        for _ in range(4):
+            controller.observe(0.2)
+        self.assertEqual(controller.imgsz, 512)
+        controller.observe(0.2)
+        self.assertEqual(controller.imgsz, 320)
+        for _ in range(5):
+            controller.observe(0.2)
+        self.assertEqual(controller.imgsz, 320)
+
+        # 0.04s at 320 scales to ~0.1s at 512: over the margin, so stay
+        for _ in range(5):
+            controller.observe(0.04)
+        self.assertEqual(controller.imgsz, 320)
+        for _ in range(5):
+            controller.observe(0.02)
+        self.assertEqual(controller.imgsz, 512)
+        self.assertEqual(controller.operating_point()['adjustments'], 3)
+
+    def test_keyframe_interval_is_the_last_resort(self):
+        tracker = StreamTracker(keyframe_interval=5)
+        controller = AdaptiveResolution(0.1, [320], 640, window=2, min_samples=2, tracker=tracker,
+                                        max_keyframe_interval=20)
+        for _ in range(8):
+            controller.observe(0.5)
+        self.assertEqual(controller.imgsz, 320)
+        self.assertEqual(tracker.keyframe_interval, 20)
+        self.assertEqual(controller.operating_point()['keyframe_interval'], 20)
+
+        # Recovering restores the keyframe rate before the resolution
+        for _ in range(4):
+            controller.observe(0.01)
+        self.assertEqual(tracker.keyframe_interval, 5)
+        self.assertEqual(controller.imgsz, 320)
+        for _ in range(2):
+            controller.observe(0.01)
+        self.assertEqual(controller.imgsz, 640)
+
+
+def parse_raw(body, content_length=None):
+    request = mock.Mock(META={'CONTENT_LENGTH': str(len(body) if content_length is None else content_length)})
+    return RawImageParser().parse(io.BytesIO(body), 'image/jpeg', {'request': request})
+
+
+@override_settings(DETECT_MAX_UPLOAD_BYTES=200 * 1024)
+class RawImageParserTests(SimpleTestCase):
+    """
+    Raw image bodies are read into one buffer and capped at DETECT_MAX_UPLOAD_BYTES
+    """
+
+    def test_body_is_returned_whole(self):
+        body = os.urandom(150 * 1024)
+        self.assertEqual(bytes(parse_raw(body)['image']), body)
+
+    def test_body_without_or_with_a_wrong_content_length(self):
+        body = os.urandom(100 * 1024)
+        self.assertEqual(bytes(parse_raw(body, content_length='')['image']), body)
+        self.assertEqual(bytes(parse_raw(body, content_length=10)['image']), body)
+        self.assertEqual(bytes(parse_raw(body, content_length=len(body) * 2)['image']), body)
+
+    def test_oversized_bodies_are_rejected(self):
+        with self.assertRaises(UploadTooLarge):
+            parse_raw(b'x', content_length=201 * 1024)
+        # A body longer than its Content-Length is cut off once past the limit
+        with self.assertRaises(UploadTooLarge):
+            parse_raw(os.urandom(201 * 1024), content_length=1024)
+
+    def test_empty_body_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            parse_raw(b'')
+
+
+class NDJSONParserTests(SimpleTestCase):
+    """
+    One JSON object per line; blank lines are skipped
+    """
+
+    def test_lines_are_parsed_in_order(self):
+        body = b'{"id": 1}\n\n  {"id": 2}  \r\n{"id": 3}'
+        self.assertEqual(NDJSONParser().parse(io.BytesIO(body)), [{'id': 1}, {'id': 2}, {'id': 3}])
+
+    def test_invalid_line_is_reported_by_number(self):
+        with self.assertRaisesMessage(ParseError, 'Line 2'):
+            NDJSONParser().parse(io.BytesIO(b'{"id": 1}\n{"id": \n'))
@@ -0,0 +1,176 @@
+"""
+Tiled and region-of-interest inference for high-resolution frames.
+
+Downscaling a 4K frame to the model's input size shrinks distant signs to a
+few pixels. Instead, the frame is cut into overlapping tiles of the model's
+input size (optionally only inside configured regions such as the roadside
+bands), all tiles run as one batched forward pass, and the boxes are mapped
+back to normalized full-frame coordinates and merged across tiles.
+
+Tiles overlap, so a sign near a tile edge is usually seen whole in one tile
+and cut off in its neighbour. Merging therefore compares boxes by
+intersection over the smaller box rather than IoU, so the partial box is
+suppressed by the whole one.
+"""
+import numpy as np
+from django.conf import settings
+
+
+class TilingOptions:
+    """
+    How to cut a frame: tile_size and overlap (fraction of a tile shared with
+    its neighbour), optional normalized (x, y, width, height) regions, the long
+    side frames are decoded to, and the merge threshold.
+    """
+
+    def __init__(self, tile_size, overlap=0.2, regions=None, max_side=1920, match_threshold=0.6):
+        if not 0 <= overlap < 1:
+            raise ValueError('overlap must be in [0, 1)')
+        self.tile_size = max(32, int(tile_size))
+        self.overlap = overlap
+        self.regions = regions or []
+        self.max_side = max(self.tile_size, int(max_side))
+        self.match_threshold = match_threshold
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Build options from request parameters (`tiling=1`, `regions=x,y,w,h;...`,
+        `tile_size`, `overlap`), or return None if tiling was not requested
+        """
+        tiling = str(params.get('tiling', '')).lower() in ('1', 'true', 'yes')
+        if not tiling and not params.get('regions'):
+            return None
+        # DETECT_ROI_REGIONS only applies to tiled requests; it was validated at startup
+        regions = parse_regions(params.get('regions') or settings.DETECT_ROI_REGIONS)
+        try:
+            tile_size = int(params.get('tile_size') or settings.DETECT_TILE_SIZE)
+            overlap = float(params.get('overlap') or settings.DETECT_TILE_OVERLAP)
+        except ValueError:
+            raise ValueError('tile_size and overlap must be numbers')
+        return cls(
+            tile_size=tile_size,
+            overlap=overlap,
+            regions=regions,
+            max_side=settings.DETECT_TILING_MAX_SIDE,
+            match_threshold=settings.DETECT_TILE_MATCH_THRESHOLD,
+        )
+
+    def describe(self):
+        return {
+            'tile_size': self.tile_size,
+            'overlap': self.overlap,
+            'regions': [list(region) for region in self.regions],
+        }
+
+
+def parse_regions(spec):
+    """
+    Parse 'x,y,w,h;x,y,w,h' (normalized to the frame) into a list of tuples
+    """
+    regions = []
+    for part in (spec or '').split(';'):
+        if not part.strip():
+            continue
+        try:
+            x, y, w, h = (float(value) for value in part.split(','))
+        except ValueError:
+            raise ValueError(f'Invalid region {part.strip()!r}, expected x,y,width,height')
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > 1.0001 or y + h > 1.0001:
+            raise ValueError(f'Region {part.strip()!r} is outside the frame')
+        regions.append((x, y, w, h))
+    return regions
+
+
+def _axis_starts(start, length, tile, stride):
+    if length <= tile:
+        return [start]
+    starts = list(range(start, start + length - tile, stride))
+    # The last tile is aligned to the far edge instead of running past it
+    starts.append(start + length - tile)
+    return starts
+
+
+def tile_windows(x0, y0, width, height, tile_size, overlap):
+    """
+    Pixel windows (x0, y0, x1, y1) of size tile_size covering the given area
+    with at least `overlap` of a tile shared between neighbours
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, x + min(tile_size, width), y + min(tile_size, height))
+        for y in _axis_starts(y0, height, tile_size, stride)
+        for x in _axis_starts(x0, width, tile_size, stride)
+    ]
+
+
+def plan_windows(frame_shape, options):
+    """
+    Windows to run for a frame. Without regions the whole frame is tiled and
+    also run once downscaled, so signs larger than a tile are still found.
+    """
+    height, width = frame_shape[:2]
+    if not options.regions:
+        windows = [(0, 0, width, height)]
+        if max(width, height) > options.tile_size:
+            windows += tile_windows(0, 0, width, height, options.tile_size, options.overlap)
+        return windows
+
+    windows = []
+    for x, y, w, h in options.regions:
+        left, top = int(x * width), int(y * height)
+        right, bottom = min(width, int(round((x + w) * width))), min(height, int(round((y + h) * height)))
+        if right > left and bottom > top:
+            windows += tile_windows(left, top, right - left, bottom - top, options.tile_size, options.overlap)
+    return windows
+
+
+def map_to_frame(array, window, frame_width, frame_height):
+    """
+    Convert a detection array normalized to a window into full-frame
+    normalized coordinates
+    """
+    x0, y0, x1, y1 = window
+    mapped = array.copy()
+    mapped[:, [0, 2]] = (array[:, [0, 2]] * (x1 - x0) + x0) / frame_width
+    mapped[:, [1, 3]] = (array[:, [1, 3]] * (y1 - y0) + y0) / frame_height
+    return mapped
+
+
+def suppress_overlaps(array, threshold):
+    """
+    Greedy class-aware suppression: keep the most confident box and drop boxes
+    of the same class whose intersection covers more than `threshold` of the
+    smaller of the two boxes
+    """
+    if len(array) < 2:
+        return array
+    order = np.argsort(-array[:, 4], kind='stable')
+    array = array[order]
+    x1, y1, x2, y2 = array[:, 0], array[:, 1], array[:, 2], array[:, 3]
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    keep = np.ones(len(array), dtype=bool)
+    for i in range(len(array)):
+        if not keep[i]:
+            continue
+        rest = np.flatnonzero(keep[i + 1:]) + i + 1
+        if not len(rest):
+            break
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        smaller = np.minimum(areas[i], areas[rest])
+        overlap = np.divide(inter_w * inter_h, smaller, out=np.zeros_like(smaller), where=smaller > 0)
+        same_class = array[rest, 5] == array[i, 5]
+        keep[rest[same_class & (overlap > threshold)]] = False
+    return array[keep]
+
+
+def merge_tiles(arrays, windows, frame_shape, threshold):
+    """
+    Map per-window detection arrays to the full frame and merge duplicates
+    """
+    height, width = frame_shape[:2]
+    mapped = [map_to_frame(array, window, width, height) for array, window in zip(arrays, windows) if len(array)]
+    if not mapped:
+        return np.zeros((0, 6), dtype=np.float32)
+    return suppress_overlaps(np.concatenate(mapped), threshold)
@@ -0,0 +1,104 @@
+"""
+Per-stage timing breakdown of a detection.
+
+Every result carries a `timings` dict of {stage: seconds} next to its total
+processing_time: decode (encoded bytes to BGR array), queue_wait (time spent
+in the batching scheduler before the forward pass), and preprocess,
+inference and postprocess as reported by ultralytics for that image (box
+packing included in postprocess). Tiled frames sum the stages over their
+tiles. Results served from the frame cache or from a tracker carry only
+their decode time.
+
+Stored rows keep the breakdown in milliseconds rounded to 0.01 ms, which is a
+few dozen bytes per detection, so stats can report per-stage averages and
+percentiles over time.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+
+STAGES = ('decode', 'queue_wait', 'preprocess', 'inference', 'postprocess')
+PERCENTILES = (50, 95, 99)
+
+
+def set_stage(result, stage, seconds):
+    """
+    Record one stage on a result without touching a timings dict it may
+    share with the frame cache
+    """
+    result['timings'] = dict(result.get('timings') or {}, **{stage: seconds})
+
+
+def sum_timings(timings):
+    """
+    Add up per-image timings, e.g. of the tiles of one frame
+    """
+    total = defaultdict(float)
+    for timing in timings:
+        for stage, seconds in timing.items():
+            total[stage] += seconds
+    return dict(total)
+
+
+def compact(timings):
+    """
+    Storage form of a timings dict: milliseconds rounded to 0.01
+    """
+    if not timings:
+        return None
+    return {stage: round(seconds * 1000.0, 2) for stage, seconds in timings.items()}
+
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def summarize(detections, days=7, max_samples=5000):
+    """
+    Per-stage average and percentiles (milliseconds) over the newest
+    `max_samples` stored detections of the last `days` days, plus per-day
+    averages and the models and engines that produced them
+    """
+    since = timezone.now() - timedelta(days=days)
+    rows = list(detections.filter(timestamp__gte=since, timings__isnull=False).order_by(
+        '-timestamp', '-id'
+    ).values_list('timestamp', 'timings', 'model_name', 'engine')[:max_samples])
+
+    samples = defaultdict(list)
+    by_day = defaultdict(lambda: defaultdict(list))
+    models = defaultdict(int)
+    for timestamp, timings, model_name, engine in rows:
+        day = timezone.localtime(timestamp).date().isoformat()
+        for stage, value in timings.items():
+            samples[stage].append(value)
+            by_day[day][stage].append(value)
+        if model_name:
+            models[f'{model_name} ({engine})'] += 1
+
+    stages = {}
+    for stage in sorted(samples, key=_stage_order):
+        values = np.asarray(samples[stage], dtype=np.float64)
+        stages[stage] = dict(
+            {'avg': round(float(values.mean()), 2), 'samples': len(values)},
+            **{f'p{p}': round(float(value), 2) for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+        )
+
+    return {
+        'window_days': days,
+        'samples': len(rows),
+        'stages': stages,
+        'by_day': [
+            {
+                'day': day,
+                'stages': {
+                    stage: round(float(np.mean(by_day[day][stage])), 2)
+                    for stage in sorted(by_day[day], key=_stage_order)
+                },
+            }
+            for day in sorted(by_day)
+        ],
+        'models': dict(models),
+    }
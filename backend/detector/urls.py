@@ -3,7 +3,15 @@ from . import views
 
 urlpatterns = [
     path('detect/', views.detect_image, name='detect_image'),
+    path('detect/batch/', views.detect_batch, name='detect_batch'),
     path('detections/', views.get_detections, name='get_detections'),
+    path('detections/history/', views.get_detection_history, name='get_detection_history'),
     path('stats/', views.get_detection_stats, name='get_detection_stats'),
     path('global-stats/', views.get_global_stats, name='get_global_stats'),
+    path('models/', views.get_model_status, name='get_model_status'),
+    path('videos/', views.video_jobs, name='video_jobs'),
+    path('videos/<int:job_id>/', views.video_job_detail, name='video_job_detail'),
+    path('videos/<int:job_id>/detections/', views.video_job_detections, name='video_job_detections'),
+    path('cameras/', views.camera_sources, name='camera_sources'),
+    path('inference-stats/', views.get_inference_stats, name='get_inference_stats'),
 ] 
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Output agreement checks between two detectors, e.g. an exported engine
+against the PyTorch reference it was exported from.
+"""
+import glob
+import os
+import time
+
+import cv2
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+# Fewest reference boxes for an agreement score to count
+MIN_REFERENCE_BOXES = 10
+
+
+def box_iou(a, b):
+    """
+    IoU of two detection dicts with normalized x, y, width, height boxes
+    """
+    ax2, ay2 = a['bbox_x'] + a['bbox_width'], a['bbox_y'] + a['bbox_height']
+    bx2, by2 = b['bbox_x'] + b['bbox_width'], b['bbox_y'] + b['bbox_height']
+    inter_w = max(0.0, min(ax2, bx2) - max(a['bbox_x'], b['bbox_x']))
+    inter_h = max(0.0, min(ay2, by2) - max(a['bbox_y'], b['bbox_y']))
+    inter = inter_w * inter_h
+    union = a['bbox_width'] * a['bbox_height'] + b['bbox_width'] * b['bbox_height'] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def load_validation_images(paths, limit=32):
+    """
+    Load up to `limit` BGR images from the given files/directories. Raises
+    ValueError if none can be read: agreement on synthetic frames proves
+    nothing, since neither model detects anything on them.
+    """
+    files = []
+    for path in paths or []:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                name for name in glob.glob(os.path.join(path, '**', '*'), recursive=True)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            ))
+        elif os.path.isfile(path):
+            files.append(path)
+
+    images = []
+    for name in files:
+        image = cv2.imread(name, cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+
+    if not images:
+        raise ValueError(f'No readable images in {", ".join(paths) if paths else "(no paths given)"}')
+    return images
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Greedily pair same-class boxes with IoU >= iou_threshold.
+    Returns the matched (reference, candidate) pairs.
+    """
+    pairs = sorted(
+        (
+            (box_iou(ref, cand), r, c)
+            for r, ref in enumerate(reference)
+            for c, cand in enumerate(candidate)
+            if ref['class_name'] == cand['class_name']
+        ),
+        key=lambda pair: pair[0],
+        reverse=True,
+    )
+    used_reference, used_candidate, matches = set(), set(), []
+    for iou, r, c in pairs:
+        if iou < iou_threshold:
+            break
+        if r in used_reference or c in used_candidate:
+            continue
+        used_reference.add(r)
+        used_candidate.add(c)
+        matches.append((reference[r], candidate[c]))
+    return matches
+
+
+def compare_detectors(reference, candidate, images, iou_threshold=0.5):
+    """
+    Run both detectors over the same images and report how well the candidate
+    reproduces the reference: boxes matched by class and IoU, confidence drift
+    and per-image latency of each.
+    """
+    matched = reference_boxes = candidate_boxes = 0
+    confidence_deltas = []
+    reference_time = candidate_time = 0.0
+
+    for image in images:
+        start_time = time.perf_counter()
+        expected = reference.detect_batch([image])[0]['detections']
+        reference_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        actual = candidate.detect_batch([image])[0]['detections']
+        candidate_time += time.perf_counter() - start_time
+
+        matches = match_detections(expected, actual, iou_threshold)
+        matched += len(matches)
+        reference_boxes += len(expected)
+        candidate_boxes += len(actual)
+        confidence_deltas.extend(abs(ref['confidence'] - cand['confidence']) for ref, cand in matches)
+
+    total = max(reference_boxes, candidate_boxes)
+    count = max(len(images), 1)
+    return {
+        'images': len(images),
+        'reference_boxes': reference_boxes,
+        'candidate_boxes': candidate_boxes,
+        'matched_boxes': matched,
+        # Share of boxes both detectors agree on; nothing found means nothing was checked
+        'agreement': matched / total if total else 0.0,
+        'max_confidence_delta': max(confidence_deltas) if confidence_deltas else 0.0,
+        'reference_latency': reference_time / count,
+        'candidate_latency': candidate_time / count,
+    }
+
+
+def agreement_failure(report, min_agreement, min_reference_boxes=MIN_REFERENCE_BOXES):
+    """
+    Why a compare_detectors report fails the gate, or None if it passes. The
+    reference model must find enough boxes for the agreement to mean anything.
+    """
+    if report['reference_boxes'] < min_reference_boxes:
+        return (
+            f"the reference model found only {report['reference_boxes']} boxes in {report['images']} images "
+            f"(at least {min_reference_boxes} needed); validate on images that contain traffic signs"
+        )
+    if report['agreement'] < min_agreement:
+        return f"agreement {report['agreement']:.3f} is below {min_agreement}"
+    return None
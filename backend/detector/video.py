@@ -0,0 +1,225 @@
+"""
+Background processing of uploaded videos.
+
+Frames are pulled from cv2.VideoCapture one at a time, so a video is never
+held in memory; frames between samples are only grabbed, not decoded into
+arrays. Sampled frames go through the detector in batches, and every batch
+of results is persisted together with the job's resume point in a single
+transaction. Progress and per-frame results are published to the job's
+channel-layer group for VideoJobConsumer.
+
+Every claim gives the job a new claimed_by token, and every write a worker
+makes to the job is conditional on that token. A worker that was only slow
+and whose job was re-claimed by another one finds its update matching no row,
+rolls back the batch and stops, so frames are never saved twice.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+import cv2
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import VideoJob
+from .persistence import save_detections
+from .serializers import VideoJobSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobLost(Exception):
+    """
+    The job was claimed by another worker (or deleted) since this one took it
+    """
+
+
+def job_group(job_id):
+    return f'video_job_{job_id}'
+
+
+def job_snapshot(job):
+    return dict(VideoJobSerializer(job).data)
+
+
+def publish(job, results=None):
+    """
+    Push the job's progress (and the frames with detections of the last
+    batch) to everyone watching it
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    message = {'type': 'job.progress', 'job': job_snapshot(job)}
+    if results:
+        message['results'] = results
+    try:
+        async_to_sync(layer.group_send)(job_group(job.id), message)
+    except Exception:
+        # Progress is best effort; the job state in the database is authoritative
+        logger.warning('Could not publish progress for video job %s', job.id, exc_info=True)
+
+
+def claim_next_job():
+    """
+    Atomically take the oldest queued job, or a running job whose worker has
+    stopped sending heartbeats, and mark it as running
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.VIDEO_JOB_STALE_SECONDS)
+    with transaction.atomic():
+        job = VideoJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=VideoJob.STATUS_QUEUED) |
+            Q(status=VideoJob.STATUS_RUNNING, heartbeat_at__lt=stale_before)
+        ).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = VideoJob.STATUS_RUNNING
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.claimed_by = uuid.uuid4().hex
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'claimed_by'])
+    return job
+
+
+def update_claimed(job, **fields):
+    """
+    Update the job only while this worker's claim on it still holds
+    """
+    if not VideoJob.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update(**fields):
+        raise JobLost(f'Video job {job.id} was claimed by another worker')
+
+
+def frame_step(fps, sample_fps):
+    """
+    Analyse every Nth frame so that about sample_fps frames per second are kept
+    """
+    if not fps or fps <= 0 or not sample_fps or sample_fps <= 0:
+        return 1
+    return max(1, round(fps / sample_fps))
+
+
+def iter_sampled_frames(capture, start, step):
+    """
+    Yield (frame_index, BGR frame) for every step-th frame from `start` on.
+    Skipped frames are grabbed without being decoded into arrays.
+    """
+    index = 0
+    if start > 0 and capture.set(cv2.CAP_PROP_POS_FRAMES, start):
+        index = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+    while index < start:
+        if not capture.grab():
+            return
+        index += 1
+
+    while True:
+        if index % step == 0:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield index, frame
+        elif not capture.grab():
+            return
+        index += 1
+
+
+def _persist_batch(job, batch, results, last_frame_index):
+    """
+    Save the frames of one batch that have detections and advance the job's
+    resume point in the same transaction
+    """
+    items, published, now = [], [], timezone.now()
+    for (frame_index, _), result in zip(batch, results):
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        if result['detections_count'] > 0:
+            result['frame_index'] = frame_index
+            items.append((job.user_id, result, now))
+            published.append({
+                'frame_index': frame_index,
+                'detections': result['detections'],
+                'detections_count': result['detections_count'],
+            })
+    signs = sum(result['detections_count'] for result in results)
+
+    with transaction.atomic():
+        # Advancing the job first locks its row, so a worker that lost the
+        # claim fails here before saving anything
+        update_claimed(
+            job,
+            last_frame_index=last_frame_index,
+            frames_processed=F('frames_processed') + len(batch),
+            signs_detected=F('signs_detected') + signs,
+            heartbeat_at=now,
+        )
+        save_detections(items, job_id=job.id)
+    job.refresh_from_db()
+    return published
+
+
+def _run_batch(job, detector, batch, last_frame_index):
+    start_time = time.time()
+    results = detector.detect_batch([frame for _, frame in batch])
+    per_frame = (time.time() - start_time) / len(batch)
+    for result in results:
+        result['processing_time'] = per_frame
+    publish(job, _persist_batch(job, batch, results, last_frame_index))
+
+
+def process_job(job, detector, batch_size=None):
+    """
+    Run a claimed job to completion, resuming after job.last_frame_index
+    """
+    batch_size = batch_size or settings.INFERENCE_MAX_BATCH_SIZE
+    capture = cv2.VideoCapture(job.video.path)
+    try:
+        if not capture.isOpened():
+            raise ValueError('Could not open video')
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        if total_frames != job.total_frames:
+            update_claimed(job, total_frames=total_frames)
+            job.total_frames = total_frames
+        step = frame_step(fps, job.sample_fps)
+        publish(job)
+
+        batch = []
+        last_index = job.last_frame_index
+        for frame_index, frame in iter_sampled_frames(capture, job.last_frame_index + 1, step):
+            batch.append((frame_index, frame))
+            last_index = frame_index
+            if len(batch) >= batch_size:
+                _run_batch(job, detector, batch, last_index)
+                batch = []
+        if batch:
+            _run_batch(job, detector, batch, last_index)
+    except JobLost:
+        logger.warning('Video job %s was claimed by another worker; stopping', job.id)
+        return job
+    except Exception as e:
+        logger.exception('Video job %s failed', job.id)
+        return _finish(job, VideoJob.STATUS_FAILED, str(e))
+    finally:
+        capture.release()
+
+    return _finish(job, VideoJob.STATUS_COMPLETED)
+
+
+def _finish(job, status, error=''):
+    now = timezone.now()
+    try:
+        update_claimed(job, status=status, error=error, finished_at=now)
+    except JobLost:
+        logger.warning('Video job %s was claimed by another worker; not marking it %s', job.id, status)
+        return job
+    job.status = status
+    job.error = error
+    job.finished_at = now
+    publish(job)
+    return job
@@ -1,128 +1,545 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIRequest
 from django.core.files.storage import default_storage
-from .models import Detection, DetectionResult
-from .serializers import DetectionSerializer
-from .yolo_detector import YOLODetector
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from .models import CameraSource, Detection, DetectionResult, VideoJob
+from .serializers import CameraSourceSerializer, DetectionSerializer, VideoJobSerializer
+from .model_registry import registry
+from .batching import get_scheduler, scheduler_stats
+from .metrics import REGISTRY, realtime_frames_received, realtime_frames_dropped
+from .decoding import decode_seconds, reduced_decodes
+from .persistence import save_detection, save_detections, get_write_behind
+from .pagination import keyset_page, InvalidCursor
+from .encoders import encode_detections, DETECTION_FIELDS
+from .renderers import FastJSONRenderer
+from .parsers import NDJSONParser, RawImageParser, UploadTooLarge, upload_limit_detail
+from .tiling import TilingOptions
+from . import rollups, timings
+import asyncio
 import base64
+import hmac
 import io
 from PIL import Image
 import json
-from django.db import models
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from asgiref.sync import sync_to_async
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 
-# Initialize detector instance
-detector = YOLODetector()
+MAX_HISTORY_PAGE_SIZE = 200
+# Multipart and JSON bodies carry some framing on top of the image itself
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+
+def _upload_buffer(upload):
+    """
+    Bytes of an uploaded file; in-memory uploads are exposed without a copy
+    """
+    if isinstance(upload.file, io.BytesIO):
+        return upload.file.getbuffer()
+    return upload.read()
+
+
+def _timings_requested(request):
+    return request.query_params.get('timings', '').lower() in ('1', 'true', 'yes')
+
+
+def _content_length(request):
+    """
+    The request's Content-Length, 0 when absent, or None when the header is malformed
+    """
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_image_payload(request, detector):
+    """
+    Return (decode, payload) for the image in a raw image/*, multipart or JSON
+    (base64 data URL) request, or None if the request carries no image
+    """
+    limit = settings.DETECT_MAX_UPLOAD_BYTES
+    content_type = request.content_type.split(';')[0].strip().lower()
+    content_length = _content_length(request) or 0
+
+    if content_type.startswith('image/'):
+        return detector.decode_bytes, request.data['image']
+
+    if content_type == 'multipart/form-data':
+        # Refuse before Django spools the upload to memory or disk
+        if content_length > limit + UPLOAD_OVERHEAD_BYTES:
+            raise UploadTooLarge(upload_limit_detail(limit))
+        upload = request.FILES.get('image')
+        if upload is not None:
+            if upload.size > limit:
+                raise UploadTooLarge(upload_limit_detail(limit))
+            return detector.decode_bytes, _upload_buffer(upload)
+        data = request.data
+    else:
+        # base64 inflates the image by a third
+        if content_length > limit * 4 // 3 + UPLOAD_OVERHEAD_BYTES:
+            raise UploadTooLarge(upload_limit_detail(limit))
+        # Older clients post JSON without a JSON content type
+        if content_type == 'application/json':
+            data = request.data
+        else:
+            data = json.loads(request.body) if request.body else {}
+
+    base64_image = data.get('image')
+    if not base64_image:
+        return None
+    return detector.decode_base64, base64_image
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticatedOrReadOnly])
+@parser_classes([JSONParser, MultiPartParser, RawImageParser])
 def detect_image(request):
     """
-    API endpoint for single image detection
+    API endpoint for single image detection. Accepts a raw image/jpeg or
+    image/png body, a multipart upload with an 'image' file, or JSON with a
+    base64 data URL in 'image'.
+    
+    High-resolution frames can be run tiled with ?tiling=1, or only inside
+    regions with ?regions=x,y,w,h;... (normalized); see tiling.TilingOptions.
+    ?timings=1 adds the per-stage breakdown (seconds) and the model that ran.
     """
     try:
-        data = json.loads(request.body)
-        base64_image = data.get('image')
+        scheduler = get_scheduler()
+        try:
+            image_payload = _read_image_payload(request, scheduler.detector)
+            tiling = TilingOptions.from_params(request.query_params)
+        except APIException as e:
+            return Response({'error': str(e.detail)}, status=e.status_code)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        if not base64_image:
+        if image_payload is None:
             return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Run detection
-        result = detector.detect_from_base64(base64_image)
+        # Run detection through the shared batching scheduler
+        start_time = time.time()
+        try:
+            if tiling is not None:
+                result = scheduler.detect_tiled_encoded(*image_payload, tiling)
+            else:
+                result = scheduler.detect_encoded(*image_payload)
+        except Exception as e:
+            return Response({'error': f'Invalid image: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        result['processing_time'] = time.time() - start_time
         
         if 'error' in result:
             return Response({'error': result['error']}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Save detection to database (only if user is authenticated)
         user = request.user if request.user.is_authenticated else None
-        detection = Detection.objects.create(
-            user=user,
-            detections_count=result['detections_count'],
-            confidence_avg=result['confidence_avg'],
-            processing_time=result['processing_time']
-        )
-        
-        # Save detection results
-        for det in result['detections']:
-            DetectionResult.objects.create(
-                detection=detection,
-                class_name=det['class_name'],
-                confidence=det['confidence'],
-                bbox_x=det['bbox_x'],
-                bbox_y=det['bbox_y'],
-                bbox_width=det['bbox_width'],
-                bbox_height=det['bbox_height']
-            )
+        detection = save_detection(result, user)
         
         # Serialize and return
         serializer = DetectionSerializer(detection)
-        return Response({
+        response = {
             'detection': serializer.data,
             'detections': result['detections'],
-            'processing_time': result['processing_time']
-        })
+            'processing_time': result['processing_time'],
+            'decode_time': result['decode_time'],
+            'tiles': result.get('tiles')
+        }
+        if _timings_requested(request):
+            response['timings'] = result.get('timings', {})
+            response['model'] = result.get('model')
+        return Response(response)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _read_batch_items(request, detector):
+    """
+    Return [(client_id, decode, payload or None, error or None)] for every image
+    of a multipart or NDJSON batch request
+    """
+    limit = settings.DETECT_MAX_UPLOAD_BYTES
+    items = []
+    if request.content_type.split(';')[0].strip().lower() == 'multipart/form-data':
+        for field in request.FILES:
+            for upload in request.FILES.getlist(field):
+                if upload.size > limit:
+                    items.append((upload.name, None, None, upload_limit_detail(limit)))
+                else:
+                    items.append((upload.name, detector.decode_bytes, _upload_buffer(upload), None))
+        return items
+
+    for number, line in enumerate(request.data):
+        client_id = line.get('id') if isinstance(line, dict) else None
+        if not isinstance(line, dict) or not line.get('image'):
+            items.append((client_id, None, None, f'Line {number + 1}: no image provided'))
+            continue
+        if len(line['image']) > limit * 4 // 3 + UPLOAD_OVERHEAD_BYTES:
+            items.append((client_id, None, None, upload_limit_detail(limit)))
+        else:
+            items.append((client_id, detector.decode_base64, line['image'], None))
+    return items
+
+
+class _BatchResults:
+    """
+    Formats the NDJSON lines of a streamed batch and saves its successful
+    results in chunks while streaming, so a client that disconnects halfway
+    keeps every result it was already sent
+    """
+
+    def __init__(self, user_id, include_timings=False):
+        self.user_id = user_id
+        self.include_timings = include_timings
+        # One chunk per scheduler batch keeps the transactions short
+        self.chunk_size = settings.INFERENCE_MAX_BATCH_SIZE
+        self.pending = []
+        self.detection_ids = {}
+        self.errors = 0
+
+    @property
+    def chunk_full(self):
+        return len(self.pending) >= self.chunk_size
+
+    def error_line(self, index, client_id, error):
+        self.errors += 1
+        return json.dumps({'type': 'error', 'index': index, 'id': client_id, 'error': error}) + '\n'
+
+    def result_line(self, index, client_id, result):
+        if 'error' in result:
+            return self.error_line(index, client_id, result['error'])
+        self.pending.append((index, result))
+        line = {
+            'type': 'detection_result',
+            'index': index,
+            'id': client_id,
+            'detections': result['detections'],
+            'detections_count': result['detections_count'],
+            'confidence_avg': result['confidence_avg'],
+            'processing_time': result['processing_time'],
+            'decode_time': result['decode_time'],
+            'cached': result.get('cached'),
+        }
+        if self.include_timings:
+            line['timings'] = result.get('timings', {})
+            line['model'] = result.get('model')
+        return json.dumps(line) + '\n'
+
+    def save(self):
+        pending, self.pending = sorted(self.pending, key=lambda item: item[0]), []
+        if not pending:
+            return
+        now = timezone.now()
+        detections = save_detections([(self.user_id, result, now) for _, result in pending])
+        for (index, _), detection in zip(pending, detections):
+            self.detection_ids[index] = detection.pk
+
+    def summary_line(self, images):
+        return json.dumps({
+            'type': 'summary',
+            'images': images,
+            'errors': self.errors,
+            'saved': len(self.detection_ids),
+            'detection_ids': dict(sorted(self.detection_ids.items())),
+        }) + '\n'
+
+
+def _stream_batch_results(scheduler, items, user_id, include_timings=False):
+    """
+    Yield one NDJSON line per image as soon as its result is ready, saving
+    results chunk by chunk, and finish with a summary line. Used under WSGI.
+    """
+    def run(decode, payload):
+        start_time = time.time()
+        result = scheduler.detect_encoded(decode, payload)
+        result['processing_time'] = time.time() - start_time
+        return result
+
+    results = _BatchResults(user_id, include_timings)
+    try:
+        # Enough requests in flight for the scheduler to fill whole batches
+        with ThreadPoolExecutor(max_workers=settings.INFERENCE_MAX_BATCH_SIZE * 2) as executor:
+            futures = {}
+            for index, (client_id, decode, payload, error) in enumerate(items):
+                if error is not None:
+                    yield results.error_line(index, client_id, error)
+                    continue
+                futures[executor.submit(run, decode, payload)] = (index, client_id)
+
+            for future in as_completed(futures):
+                index, client_id = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'error': f'Invalid image: {e}'}
+                yield results.result_line(index, client_id, result)
+                if results.chunk_full:
+                    results.save()
+        results.save()
+        yield results.summary_line(len(items))
+    finally:
+        # Also runs when the client disconnects and the server closes the generator
+        results.save()
+
+
+async def _stream_batch_results_async(scheduler, items, user_id, include_timings=False):
+    """
+    Async twin of _stream_batch_results for ASGI servers, which buffer
+    synchronous streaming responses instead of sending them line by line
+    """
+    in_flight = asyncio.Semaphore(settings.INFERENCE_MAX_BATCH_SIZE * 2)
+
+    async def run(index, client_id, decode, payload):
+        async with in_flight:
+            start_time = time.time()
+            try:
+                result = await scheduler.detect_encoded_async(decode, payload)
+                result['processing_time'] = time.time() - start_time
+            except Exception as e:
+                result = {'error': f'Invalid image: {e}'}
+        return index, client_id, result
+
+    results = _BatchResults(user_id, include_timings)
+    save = sync_to_async(results.save)
+    tasks = []
+    try:
+        for index, (client_id, decode, payload, error) in enumerate(items):
+            if error is not None:
+                yield results.error_line(index, client_id, error)
+                continue
+            tasks.append(asyncio.ensure_future(run(index, client_id, decode, payload)))
+
+        for next_result in asyncio.as_completed(tasks):
+            index, client_id, result = await next_result
+            yield results.result_line(index, client_id, result)
+            if results.chunk_full:
+                await save()
+        await save()
+        yield results.summary_line(len(items))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await save()
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+@parser_classes([MultiPartParser, NDJSONParser])
+def detect_batch(request):
+    """
+    Detect many images in one request: a multipart upload with any number of
+    files, or NDJSON with one {"id": ..., "image": "<base64 data URL>"} per line.
+    Responds with NDJSON, one line per image in completion order, then a summary.
+    ?timings=1 adds the per-stage breakdown to every line.
+    """
+    max_images = settings.DETECT_BATCH_MAX_IMAGES
+    content_length = _content_length(request)
+    if content_length is None:
+        return Response({'error': 'Invalid Content-Length header'}, status=status.HTTP_400_BAD_REQUEST)
+    if content_length > max_images * (settings.DETECT_MAX_UPLOAD_BYTES * 4 // 3 + UPLOAD_OVERHEAD_BYTES):
+        return Response({'error': 'Batch upload is too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    scheduler = get_scheduler()
+    try:
+        items = _read_batch_items(request, scheduler.detector)
+    except APIException as e:
+        return Response({'error': str(e.detail)}, status=e.status_code)
+
+    if not items:
+        return Response({'error': 'No images provided'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > max_images:
+        return Response({'error': f'At most {max_images} images per batch'},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    user_id = request.user.pk if request.user.is_authenticated else None
+    stream = _stream_batch_results_async if isinstance(request._request, ASGIRequest) else _stream_batch_results
+    return StreamingHttpResponse(
+        stream(scheduler, items, user_id, _timings_requested(request)),
+        content_type='application/x-ndjson'
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer])
 def get_detections(request):
     """
     Get user's detection history
     """
-    detections = Detection.objects.filter(user=request.user)[:50]  # Last 50 detections
-    serializer = DetectionSerializer(detections, many=True)
-    return Response(serializer.data)
+    detections = Detection.objects.filter(user=request.user).values(*DETECTION_FIELDS)[:50]  # Last 50 detections
+    return Response(encode_detections(detections))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer])
+def get_detection_history(request):
+    """
+    Cursor-paginated detection history with optional time-range and class filters.
+    
+    Query parameters: cursor, limit (max 200), since, until (ISO 8601), class_name
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    detections = Detection.objects.filter(user=request.user).values(*DETECTION_FIELDS)
+    
+    for param, lookup in (('since', 'timestamp__gte'), ('until', 'timestamp__lt')):
+        value = request.query_params.get(param)
+        if value:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                return Response({'error': f'Invalid {param} timestamp'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            detections = detections.filter(**{lookup: parsed})
+    
+    class_name = request.query_params.get('class_name')
+    if class_name:
+        # EXISTS keeps one row per detection without a DISTINCT over the join
+        detections = detections.filter(Exists(
+            DetectionResult.objects.filter(detection=OuterRef('pk'), class_name=class_name)
+        ))
+    
+    try:
+        page, next_cursor = keyset_page(detections, request.query_params.get('cursor'), limit)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'results': encode_detections(page),
+        'next_cursor': next_cursor
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def camera_sources(request):
+    """
+    Server-side cameras the user can watch on ws/cameras/<id>/
+    """
+    sources = CameraSource.objects.all() if request.user.is_staff else CameraSource.objects.filter(user=request.user)
+    return Response(CameraSourceSerializer(sources, many=True).data)
+
+
+def _user_video_jobs(user):
+    return VideoJob.objects.all() if user.is_staff else VideoJob.objects.filter(user=user)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def video_jobs(request):
+    """
+    GET lists the user's video jobs. POST uploads a video (multipart 'video'
+    file, optional 'sample_fps') and queues it for `manage.py run_video_worker`;
+    progress is streamed on ws/videos/<id>/.
+    """
+    if request.method == 'GET':
+        return Response(VideoJobSerializer(_user_video_jobs(request.user)[:100], many=True).data)
+
+    limit = settings.VIDEO_MAX_UPLOAD_BYTES
+    content_length = _content_length(request)
+    if content_length is None:
+        return Response({'error': 'Invalid Content-Length header'}, status=status.HTTP_400_BAD_REQUEST)
+    if content_length > limit + UPLOAD_OVERHEAD_BYTES:
+        return Response({'error': f'Video upload exceeds the {limit} byte limit'},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    video = request.FILES.get('video')
+    if video is None:
+        return Response({'error': 'No video provided'}, status=status.HTTP_400_BAD_REQUEST)
+    if video.size > limit:
+        return Response({'error': f'Video upload exceeds the {limit} byte limit'},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    try:
+        sample_fps = float(request.data.get('sample_fps') or settings.VIDEO_DEFAULT_SAMPLE_FPS)
+    except ValueError:
+        return Response({'error': 'sample_fps must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    if sample_fps <= 0:
+        return Response({'error': 'sample_fps must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # FileField.save copies the upload to storage in chunks
+    job = VideoJob.objects.create(user=request.user, video=video, sample_fps=sample_fps)
+    return Response(VideoJobSerializer(job).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def video_job_detail(request, job_id):
+    """
+    Status and progress of one video job
+    """
+    job = _user_video_jobs(request.user).filter(pk=job_id).first()
+    if job is None:
+        return Response({'error': 'Video job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(VideoJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer])
+def video_job_detections(request, job_id):
+    """
+    Frames of a video job with detections, in frame order.
+
+    Query parameters: after_frame (frame index to continue after), limit (max 200)
+    """
+    job = _user_video_jobs(request.user).filter(pk=job_id).first()
+    if job is None:
+        return Response({'error': 'Video job not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), MAX_HISTORY_PAGE_SIZE)
+        after_frame = int(request.query_params.get('after_frame', -1))
+    except ValueError:
+        return Response({'error': 'limit and after_frame must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = list(job.detections.filter(frame_index__gt=after_frame).order_by('frame_index', 'id').values(
+        *DETECTION_FIELDS, 'frame_index'
+    )[:limit + 1])
+    page = rows[:limit]
+    results = encode_detections(page)
+    for row, encoded in zip(page, results):
+        encoded['frame_index'] = row['frame_index']
+
+    return Response({
+        'job': VideoJobSerializer(job).data,
+        'results': results,
+        'next_after_frame': page[-1]['frame_index'] if len(rows) > limit else None
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_detection_stats(request):
     """
-    Get user's detection statistics
+    Get user's detection statistics, with per-stage timing averages and
+    percentiles (milliseconds) over the last ?timing_days=N days
     """
     try:
-        user_detections = Detection.objects.filter(user=request.user)
-        total_detections = user_detections.count()
-        
-        if total_detections == 0:
-            return Response({
-                'total_detections': 0,
-                'avg_processing_time': 0,
-                'avg_confidence': 0,
-                'most_detected_signs': []
-            })
-        
-        # Calculate average processing time
-        avg_processing_time = user_detections.aggregate(
-            avg_time=models.Avg('processing_time')
-        )['avg_time'] or 0
-        
-        # Calculate average confidence
-        avg_confidence = user_detections.aggregate(
-            avg_conf=models.Avg('confidence_avg')
-        )['avg_conf'] or 0
-        
-        # Get most detected signs for this user
-        from django.db.models import Count
-        most_detected = DetectionResult.objects.filter(
-            detection__user=request.user
-        ).values('class_name').annotate(
-            count=Count('class_name')
-        ).order_by('-count')[:5]
-        
-        return Response({
-            'total_detections': total_detections,
-            'avg_processing_time': round(avg_processing_time, 3),
-            'avg_confidence': round(avg_confidence, 3),
-            'most_detected_signs': list(most_detected)
-        })
+        try:
+            days = max(1, int(request.query_params.get('timing_days', settings.STATS_TIMING_WINDOW_DAYS)))
+        except ValueError:
+            return Response({'error': 'timing_days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        stats = rollups.summarize(request.user)
+        stats['stage_timings'] = timings.summarize(
+            Detection.objects.filter(user=request.user), days, settings.STATS_TIMING_MAX_SAMPLES
+        )
+        return Response(stats)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -137,40 +554,62 @@ def get_global_stats(request):
     try:
         if request.user.is_authenticated:
             # Return user-specific stats if authenticated
-            return get_detection_stats(request)
+            return Response(rollups.summarize(request.user))
         else:
             # Return limited global stats for anonymous users
-            total_detections = Detection.objects.count()
-            
-            if total_detections == 0:
-                return Response({
-                    'total_detections': 0,
-                    'avg_processing_time': 0,
-                    'avg_confidence': 0,
-                    'most_detected_signs': []
-                })
-            
-            # Calculate global averages
-            avg_processing_time = Detection.objects.aggregate(
-                avg_time=models.Avg('processing_time')
-            )['avg_time'] or 0
-            
-            avg_confidence = Detection.objects.aggregate(
-                avg_conf=models.Avg('confidence_avg')
-            )['avg_conf'] or 0
-            
-            # Get most detected signs globally
-            from django.db.models import Count
-            most_detected = DetectionResult.objects.values('class_name').annotate(
-                count=Count('class_name')
-            ).order_by('-count')[:5]
-            
-            return Response({
-                'total_detections': total_detections,
-                'avg_processing_time': round(avg_processing_time, 3),
-                'avg_confidence': round(avg_confidence, 3),
-                'most_detected_signs': list(most_detected)
-            })
+            return Response(rollups.summarize(None))
         
     except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_model_status(request):
+    """
+    List models resident in this process with reference counts and memory usage
+    """
+    models_info = registry.describe()
+    return Response({
+        'models': models_info,
+        'total_memory_bytes': sum(m['memory_bytes'] for m in models_info)
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_inference_stats(request):
+    """
+    Batch-size and queue-wait histograms for the inference schedulers
+    """
+    return Response({
+        'schedulers': scheduler_stats(),
+        'realtime': {
+            'frames_received': realtime_frames_received.value,
+            'frames_dropped': realtime_frames_dropped.value,
+        },
+        'persistence': get_write_behind().stats(),
+        'decoding': {
+            'decode_time': decode_seconds.snapshot(),
+            'reduced_decodes': reduced_decodes.value,
+        }
+    })
+
+
+def _metrics_allowed(request):
+    if settings.METRICS_TOKEN:
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {settings.METRICS_TOKEN}')
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint (GET /metrics). Plain Django view so scrapes skip
+    DRF authentication and content negotiation. Off unless METRICS_ENABLED, and
+    restricted to METRICS_TOKEN or METRICS_ALLOWED_IPS.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    if not _metrics_allowed(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(REGISTRY.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,17 +1,43 @@
 import cv2
+import logging
 import numpy as np
-from ultralytics import YOLO
+import os
 from django.conf import settings
-import base64
-import io
-from PIL import Image
+import threading
 import time
 
+from .columns import DetectionColumns, class_name_array
+from .decoding import MODEL_INPUT_SIZE, decode_data_url, decode_image
+from .engines import get_engine
+from .metrics import detection_errors_total, detections_total, frames_total, observe_stage_timings
+from .tiling import merge_tiles, plan_windows
+from .timings import set_stage, sum_timings
+
+
+logger = logging.getLogger(__name__)
+
 
 class YOLODetector:
-    def __init__(self):
-        self.model = YOLO(settings.MODEL_PATH)
+    # Long side the model letterboxes frames to; larger uploads are downscaled while decoding
+    input_size = MODEL_INPUT_SIZE
+    
+    def __init__(self, model_path=None, conf=0.25, engine='pytorch'):
+        self.model_path = model_path or settings.MODEL_PATH
+        self.conf = conf
+        self.engine = get_engine(engine)
+        self.model = self.engine.load(self.model_path)
         self.class_names = self.get_gtsrb_class_names()
+        self.class_name_array = class_name_array(self.class_names)
+        self.model_name = os.path.basename(self.model_path)
+        # The ultralytics predictor keeps per-call state, so a detector shared
+        # between threads must serialize its forward passes.
+        self._lock = threading.Lock()
+    
+    def memory_footprint(self):
+        """
+        Approximate resident size of the model weights in bytes
+        """
+        return self.engine.memory_footprint(self.model, self.model_path)
     
     def get_gtsrb_class_names(self):
         """
@@ -63,6 +89,162 @@ class YOLODetector:
             42: 'End no passing veh > 3.5 tons'
         }
     
+    def decode_base64(self, base64_image, target_size=None):
+        """
+        Decode a base64 data URL into a BGR numpy array
+        """
+        return decode_data_url(base64_image, target_size or self.input_size)
+    
+    def decode_bytes(self, buffer, target_size=None):
+        """
+        Decode raw JPEG/PNG bytes (or a memoryview over them) into a BGR numpy array
+        """
+        return decode_image(buffer, target_size or self.input_size)
+    
+    def extract_detections(self, result):
+        """
+        Convert one ultralytics result into detection dicts with normalized boxes
+        """
+        return self.detections_from_array(self.result_to_array(result))
+    
+    @staticmethod
+    def result_to_array(result):
+        """
+        Pack one ultralytics result into a compact float32 array with one row
+        per box: x1, y1, x2, y2 (normalized), confidence, class id
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+        return np.concatenate([
+            boxes.xyxyn.cpu().numpy(),
+            boxes.conf.cpu().numpy()[:, None],
+            boxes.cls.cpu().numpy()[:, None],
+        ], axis=1).astype(np.float32)
+    
+    def predict_timed(self, images, imgsz=None):
+        """
+        Batched forward pass returning (arrays, timings): one compact detection
+        array and one {stage: seconds} dict per image. imgsz overrides the
+        input size the frames are letterboxed to.
+        """
+        options = {'imgsz': imgsz} if imgsz else {}
+        with self._lock:
+            results = self.model(list(images), conf=self.conf, **options)
+        arrays, timings = [], []
+        for result in results:
+            start_time = time.perf_counter()
+            arrays.append(self.result_to_array(result))
+            pack_time = time.perf_counter() - start_time
+            # ultralytics reports per-image milliseconds for each stage
+            speed = getattr(result, 'speed', None) or {}
+            timings.append({
+                'preprocess': (speed.get('preprocess') or 0.0) / 1000.0,
+                'inference': (speed.get('inference') or 0.0) / 1000.0,
+                'postprocess': (speed.get('postprocess') or 0.0) / 1000.0 + pack_time,
+            })
+        return arrays, timings
+    
+    def predict_arrays(self, images, imgsz=None):
+        """
+        Batched forward pass returning one compact detection array per image
+        """
+        arrays, timings = self.predict_timed(images, imgsz)
+        observe_stage_timings(timings)
+        return arrays
+    
+    def model_info(self):
+        return {'name': self.model_name, 'engine': self.engine.name}
+    
+    def record_frames(self, arrays):
+        """
+        Count frames and detected signs per class for /metrics
+        """
+        frames_total.labels(self.model_name, self.engine.name).inc(len(arrays))
+        class_ids = np.concatenate([array[:, 5] for array in arrays]).astype(np.int64) if arrays else []
+        if len(class_ids):
+            ids, counts = np.unique(class_ids, return_counts=True)
+            names = self.class_name_array
+            for class_id, count in zip(ids.tolist(), counts.tolist()):
+                name = names[class_id] if 0 <= class_id < len(names) else f'Unknown ({class_id})'
+                detections_total.labels(self.model_name, name).inc(count)
+    
+    def record_error(self, count=1):
+        detection_errors_total.labels(self.model_name, self.engine.name).inc(count)
+    
+    def columns_from_array(self, array):
+        return DetectionColumns.from_array(array, self.class_name_array)
+    
+    def detections_from_array(self, array):
+        return self.columns_from_array(array).to_dicts()
+    
+    def build_result(self, detections, processing_time):
+        """
+        Result dict for one frame; detections may be a list of dicts or DetectionColumns
+        """
+        if isinstance(detections, DetectionColumns):
+            confidence_avg = detections.confidence_avg()
+        else:
+            confidence_avg = float(np.mean([d['confidence'] for d in detections])) if detections else 0.0
+        return {
+            'detections': detections,
+            'processing_time': processing_time,
+            'detections_count': len(detections),
+            'confidence_avg': confidence_avg
+        }
+    
+    def error_result(self, error):
+        return {
+            'detections': [],
+            'processing_time': 0.0,
+            'detections_count': 0,
+            'confidence_avg': 0.0,
+            'error': str(error)
+        }
+    
+    def detect_batch(self, images, columnar=False, imgsz=None):
+        """
+        Run a single batched forward pass over several BGR images.
+        Returns one result dict per image, in order. With columnar=True the
+        detections stay DetectionColumns until the caller serializes them.
+        """
+        start_time = time.time()
+        arrays, timings = self.predict_timed(images, imgsz)
+        processing_time = time.time() - start_time
+        observe_stage_timings(timings)
+        self.record_frames(arrays)
+        results = []
+        for array, timing in zip(arrays, timings):
+            columns = self.columns_from_array(array)
+            result = self.build_result(columns if columnar else columns.to_dicts(), processing_time)
+            result['timings'] = timing
+            result['model'] = self.model_info()
+            results.append(result)
+        return results
+    
+    def detect_tiled(self, image, options, columnar=False):
+        """
+        Run a high-resolution frame as overlapping tiles (or only the tiles of
+        the configured regions) in one batched forward pass and merge the boxes
+        into full-frame normalized coordinates. See tiling.TilingOptions.
+        """
+        start_time = time.time()
+        windows = plan_windows(image.shape, options)
+        crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        arrays, timings = self.predict_timed(crops, options.tile_size)
+        observe_stage_timings(timings)
+        merge_start = time.perf_counter()
+        merged = merge_tiles(arrays, windows, image.shape, options.match_threshold)
+        self.record_frames([merged])
+        columns = self.columns_from_array(merged)
+        result = self.build_result(columns if columnar else columns.to_dicts(), time.time() - start_time)
+        result['timings'] = sum_timings(timings)
+        # Mapping and merging the tiles' boxes is postprocessing of the frame
+        set_stage(result, 'postprocess', result['timings'].get('postprocess', 0.0) + time.perf_counter() - merge_start)
+        result['tiles'] = len(windows)
+        result['model'] = self.model_info()
+        return result
+    
     def detect_from_base64(self, base64_image):
         """
         Detect traffic signs from base64 encoded image
@@ -70,58 +252,24 @@ class YOLODetector:
         try:
             start_time = time.time()
             
-            # Decode base64 image
-            image_data = base64.b64decode(base64_image.split(',')[1])
-            image = Image.open(io.BytesIO(image_data))
-            image_np = np.array(image)
-            
-            # Convert RGB to BGR for OpenCV
-            if len(image_np.shape) == 3:
-                image_np = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+            image_np = self.decode_base64(base64_image)
+            decode_time = time.time() - start_time
             
             # Run inference
-            results = self.model(image_np, conf=0.25)
+            arrays, timings = self.predict_timed([image_np])
+            observe_stage_timings(timings)
+            self.record_frames(arrays)
             
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get bounding box coordinates (normalized)
-                        x1, y1, x2, y2 = box.xyxyn[0].tolist()
-                        confidence = box.conf[0].item()
-                        class_id = int(box.cls[0].item())
-                        
-                        # Get class name
-                        class_name = self.class_names.get(class_id, f"Unknown ({class_id})")
-                        
-                        detections.append({
-                            'class_name': class_name,
-                            'confidence': confidence,
-                            'bbox_x': x1,
-                            'bbox_y': y1,
-                            'bbox_width': x2 - x1,
-                            'bbox_height': y2 - y1
-                        })
-            
-            processing_time = time.time() - start_time
-            
-            return {
-                'detections': detections,
-                'processing_time': processing_time,
-                'detections_count': len(detections),
-                'confidence_avg': np.mean([d['confidence'] for d in detections]) if detections else 0.0
-            }
+            result = self.build_result(self.detections_from_array(arrays[0]), time.time() - start_time)
+            result['timings'] = timings[0]
+            set_stage(result, 'decode', decode_time)
+            result['model'] = self.model_info()
+            return result
             
         except Exception as e:
-            print(f"Detection error: {str(e)}")
-            return {
-                'detections': [],
-                'processing_time': 0.0,
-                'detections_count': 0,
-                'confidence_avg': 0.0,
-                'error': str(e)
-            }
+            logger.exception('Detection error')
+            self.record_error()
+            return self.error_result(e)
     
     def detect_from_cv2_frame(self, frame):
         """
@@ -131,39 +279,20 @@ class YOLODetector:
             start_time = time.time()
             
             # Run inference
-            results = self.model(frame, conf=0.25)
-            
-            detections = []
+            array = self.predict_arrays([frame])[0]
+            self.record_frames([array])
+            columns = self.columns_from_array(array)
+            detections = columns.to_dicts()
             annotated_frame = frame.copy()
             
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get bounding box coordinates
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        confidence = box.conf[0].item()
-                        class_id = int(box.cls[0].item())
-                        
-                        # Get class name
-                        class_name = self.class_names.get(class_id, f"Unknown ({class_id})")
-                        
-                        # Draw bounding box and label
-                        cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                        label = f"{class_name}: {confidence:.2f}"
-                        cv2.putText(annotated_frame, label, (int(x1), int(y1-10)), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                        
-                        # Normalize coordinates for storage
-                        h, w = frame.shape[:2]
-                        detections.append({
-                            'class_name': class_name,
-                            'confidence': confidence,
-                            'bbox_x': x1 / w,
-                            'bbox_y': y1 / h,
-                            'bbox_width': (x2 - x1) / w,
-                            'bbox_height': (y2 - y1) / h
-                        })
+            # Draw bounding boxes and labels in pixel coordinates
+            h, w = frame.shape[:2]
+            pixel_boxes = (columns.xyxy * np.array([w, h, w, h], dtype=np.float32)).astype(int).tolist()
+            for (x1, y1, x2, y2), detection in zip(pixel_boxes, detections):
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                label = f"{detection['class_name']}: {detection['confidence']:.2f}"
+                cv2.putText(annotated_frame, label, (x1, y1 - 10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
             
             processing_time = time.time() - start_time
             
@@ -172,11 +301,12 @@ class YOLODetector:
                 'annotated_frame': annotated_frame,
                 'processing_time': processing_time,
                 'detections_count': len(detections),
-                'confidence_avg': np.mean([d['confidence'] for d in detections]) if detections else 0.0
+                'confidence_avg': columns.confidence_avg()
             }
             
         except Exception as e:
-            print(f"Detection error: {str(e)}")
+            logger.exception('Detection error')
+            self.record_error()
             return {
                 'detections': [],
                 'annotated_frame': frame,
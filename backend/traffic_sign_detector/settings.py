@@ -180,7 +180,109 @@ CHANNEL_LAYERS = {
 }
 
 # Model path
-MODEL_PATH = os.path.join(BASE_DIR.parent, 'yolov8-gtsrb-trained.pt')
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(BASE_DIR.parent, 'yolov8-gtsrb-trained.pt'))
+
+# Inference engine: pytorch, onnx (ONNX Runtime) or openvino. Exported engines load
+# the artifact next to MODEL_PATH; create it with `manage.py export_model --engine <name>`
+INFERENCE_ENGINE = os.environ.get('INFERENCE_ENGINE', 'pytorch')
+
+# `manage.py quantize_model` only promotes an INT8 model (INFERENCE_ENGINE=onnx-int8)
+# whose boxes agree with the FP32 model at least this often on the reference set
+QUANTIZATION_MIN_AGREEMENT = float(os.environ.get('QUANTIZATION_MIN_AGREEMENT', 0.95))
+
+# Largest image accepted by POST /api/detect/ (raw, multipart or base64 JSON), in bytes
+DETECT_MAX_UPLOAD_BYTES = int(os.environ.get('DETECT_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+# Most images accepted by one POST /api/detect/batch/ request
+DETECT_BATCH_MAX_IMAGES = int(os.environ.get('DETECT_BATCH_MAX_IMAGES', 64))
+
+# Tiled inference (POST /api/detect/?tiling=1, ws/detect/?tiling=1): frames are
+# decoded to at most TILING_MAX_SIDE and cut into TILE_SIZE tiles that share
+# TILE_OVERLAP of their width; boxes from different tiles covering more than
+# TILE_MATCH_THRESHOLD of the smaller box are merged. ROI_REGIONS restricts
+# tiling to normalized 'x,y,w,h;...' regions (e.g. the roadside bands); it only
+# applies to tiled requests and is checked when the app starts
+DETECT_TILE_SIZE = int(os.environ.get('DETECT_TILE_SIZE', 640))
+DETECT_TILE_OVERLAP = float(os.environ.get('DETECT_TILE_OVERLAP', 0.2))
+DETECT_TILING_MAX_SIDE = int(os.environ.get('DETECT_TILING_MAX_SIDE', 1920))
+DETECT_TILE_MATCH_THRESHOLD = float(os.environ.get('DETECT_TILE_MATCH_THRESHOLD', 0.6))
+DETECT_ROI_REGIONS = os.environ.get('DETECT_ROI_REGIONS', '')
+
+# Video jobs (POST /api/videos/, processed by `manage.py run_video_worker`).
+# A running job whose worker sent no heartbeat for STALE_SECONDS is picked up again;
+# the previous worker notices at its next batch and stops
+VIDEO_MAX_UPLOAD_BYTES = int(os.environ.get('VIDEO_MAX_UPLOAD_BYTES', 500 * 1024 * 1024))
+VIDEO_DEFAULT_SAMPLE_FPS = float(os.environ.get('VIDEO_DEFAULT_SAMPLE_FPS', 5))
+VIDEO_JOB_STALE_SECONDS = int(os.environ.get('VIDEO_JOB_STALE_SECONDS', 300))
+
+# Server-side camera ingestion (`manage.py run_ingestion`): camera sources are
+# re-read every REFRESH_SECONDS; lost streams are retried with exponential
+# backoff of up to RECONNECT_MAX_DELAY seconds
+INGESTION_REFRESH_SECONDS = float(os.environ.get('INGESTION_REFRESH_SECONDS', 10))
+INGESTION_RECONNECT_MAX_DELAY = float(os.environ.get('INGESTION_RECONNECT_MAX_DELAY', 30))
+
+# GET /api/stats/ reports per-stage timing averages and percentiles over the
+# newest TIMING_MAX_SAMPLES detections of the last TIMING_WINDOW_DAYS days
+STATS_TIMING_WINDOW_DAYS = int(os.environ.get('STATS_TIMING_WINDOW_DAYS', 7))
+STATS_TIMING_MAX_SAMPLES = int(os.environ.get('STATS_TIMING_MAX_SAMPLES', 5000))
+
+# Prometheus metrics at GET /metrics, off by default. Scrapers authenticate with
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token only clients from
+# METRICS_ALLOWED_IPS (loopback by default) may scrape
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Inference batching: frames from all connections and REST calls are grouped
+# into one forward pass of up to MAX_BATCH_SIZE images, waiting at most MAX_WAIT_MS
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+
+# Number of inference worker processes (0 = run the model in the server process).
+# Each worker holds its own model copy and uses THREADS_PER_WORKER torch threads,
+# so WORKERS * THREADS_PER_WORKER should not exceed the available cores.
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+INFERENCE_THREADS_PER_WORKER = int(os.environ.get('INFERENCE_THREADS_PER_WORKER', 1))
+
+# Result cache for repeated frames, kept per model/threshold. Frames match by
+# exact content hash. PHASH_DISTANCE >= 0 also matches near-duplicates by
+# perceptual hash within that many bits; the cache is shared by every client of
+# the process, so this is off (-1) by default: two different images with a
+# similar layout could otherwise be served each other's detections
+FRAME_CACHE_ENABLED = os.environ.get('FRAME_CACHE_ENABLED', 'True').lower() == 'true'
+FRAME_CACHE_MAX_ENTRIES = int(os.environ.get('FRAME_CACHE_MAX_ENTRIES', 1024))
+FRAME_CACHE_MAX_BYTES = int(os.environ.get('FRAME_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+FRAME_CACHE_TTL = float(os.environ.get('FRAME_CACHE_TTL', 5.0))
+FRAME_CACHE_PHASH_DISTANCE = int(os.environ.get('FRAME_CACHE_PHASH_DISTANCE', -1))
+if FRAME_CACHE_PHASH_DISTANCE < 0:
+    FRAME_CACHE_PHASH_DISTANCE = None
+
+# Realtime sessions keep only the newest unprocessed frame and run at most
+# this many inferences concurrently per WebSocket connection
+REALTIME_MAX_IN_FLIGHT = int(os.environ.get('REALTIME_MAX_IN_FLIGHT', 1))
+
+# Streaming mode: full inference every KEYFRAME_INTERVAL frames, or when the mean
+# thumbnail difference exceeds SCENE_CHANGE_THRESHOLD (0-255); tracked in between.
+# Clients can also opt in per connection with ws/detect/?tracking=1
+REALTIME_TRACKING_ENABLED = os.environ.get('REALTIME_TRACKING_ENABLED', 'False').lower() == 'true'
+REALTIME_KEYFRAME_INTERVAL = int(os.environ.get('REALTIME_KEYFRAME_INTERVAL', 5))
+REALTIME_SCENE_CHANGE_THRESHOLD = float(os.environ.get('REALTIME_SCENE_CHANGE_THRESHOLD', 12.0))
+
+# Adaptive input resolution: a connection opened with ?latency_target_ms=N (or
+# every connection, if LATENCY_TARGET_MS > 0) steps the inference input size down
+# the ADAPTIVE_SIZES ladder while its p95 over the last ADAPTIVE_WINDOW frames is over target
+REALTIME_LATENCY_TARGET_MS = float(os.environ.get('REALTIME_LATENCY_TARGET_MS', 0))
+REALTIME_ADAPTIVE_SIZES = [int(size) for size in os.environ.get('REALTIME_ADAPTIVE_SIZES', '640,512,416,320').split(',')]
+REALTIME_ADAPTIVE_WINDOW = int(os.environ.get('REALTIME_ADAPTIVE_WINDOW', 30))
+
+# Long side of the annotated previews sent to viewers of a published stream
+# (ws/detect/?publish=<name>&thumbnails=1)
+REALTIME_THUMBNAIL_SIZE = int(os.environ.get('REALTIME_THUMBNAIL_SIZE', 320))
+
+# Realtime detections are persisted by a background write-behind queue that
+# bulk-inserts up to BATCH_SIZE frames per transaction every FLUSH_INTERVAL seconds
+DETECTION_WRITE_BEHIND_MAX_PENDING = int(os.environ.get('DETECTION_WRITE_BEHIND_MAX_PENDING', 10000))
+DETECTION_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('DETECTION_WRITE_BEHIND_BATCH_SIZE', 500))
+DETECTION_WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('DETECTION_WRITE_BEHIND_FLUSH_INTERVAL', 1.0))
 
 # Email settings (for production)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
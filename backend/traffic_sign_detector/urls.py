@@ -5,11 +5,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from detector.views import prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/', include('detector.urls')),
+    path('metrics', prometheus_metrics, name='prometheus_metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,11 +1,34 @@
 import React, { useState, useRef, useEffect, useCallback } from 'react';
 import { Camera, Square, Play, Pause, AlertCircle, Wifi, WifiOff } from 'lucide-react';
 
+// Binary frame protocol: 8-byte header (version, flags, reserved, frame id)
+// followed by the raw JPEG bytes. Replies carry the JSON result after the header.
+const PROTOCOL_VERSION = 1;
+const HEADER_SIZE = 8;
+
+const encodeFrame = async (blob, frameId) => {
+  const payload = await blob.arrayBuffer();
+  const buffer = new Uint8Array(HEADER_SIZE + payload.byteLength);
+  const view = new DataView(buffer.buffer);
+  view.setUint8(0, PROTOCOL_VERSION);
+  view.setUint8(1, 0);
+  view.setUint16(2, 0);
+  view.setUint32(4, frameId);
+  buffer.set(new Uint8Array(payload), HEADER_SIZE);
+  return buffer.buffer;
+};
+
+const decodeReply = (arrayBuffer) => {
+  const body = new Uint8Array(arrayBuffer, HEADER_SIZE);
+  return JSON.parse(new TextDecoder().decode(body));
+};
+
 const RealtimeDetection = () => {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
   const wsRef = useRef(null);
   const streamRef = useRef(null);
+  const frameIdRef = useRef(0);
   
   const [isStreaming, setIsStreaming] = useState(false);
   const [isConnected, setIsConnected] = useState(false);
@@ -24,6 +47,7 @@ const RealtimeDetection = () => {
     const wsUrl = `${protocol}//${window.location.host}/ws/detect/`;
     
     wsRef.current = new WebSocket(wsUrl);
+    wsRef.current.binaryType = 'arraybuffer';
     
     wsRef.current.onopen = () => {
       console.log('WebSocket connected');
@@ -32,7 +56,9 @@ const RealtimeDetection = () => {
     };
     
     wsRef.current.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+      const data = typeof event.data === 'string'
+        ? JSON.parse(event.data)
+        : decodeReply(event.data);
       
       if (data.type === 'detection_result') {
         setDetections(data.detections);
@@ -122,17 +148,16 @@ const RealtimeDetection = () => {
     // Draw video frame to canvas
     context.drawImage(video, 0, 0, canvas.width, canvas.height);
     
-    // Convert to base64
-    const base64Image = canvas.toDataURL('image/jpeg', 0.8);
-    
-    // Send to WebSocket
-    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-      setIsProcessing(true);
-      wsRef.current.send(JSON.stringify({
-        type: 'detect_frame',
-        image: base64Image
-      }));
-    }
+    // Encode as JPEG and send raw bytes as a binary frame
+    setIsProcessing(true);
+    canvas.toBlob(async (blob) => {
+      if (!blob || !wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) {
+        setIsProcessing(false);
+        return;
+      }
+      frameIdRef.current = (frameIdRef.current + 1) >>> 0;
+      wsRef.current.send(await encodeFrame(blob, frameIdRef.current));
+    }, 'image/jpeg', 0.8);
   }, [isConnected, isProcessing]);
 
   // Draw detection boxes on canvas